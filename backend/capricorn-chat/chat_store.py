@@ -0,0 +1,118 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Incremental reads of chat history stored one document per message.
+
+The frontend writes each message to
+chats/{user_id}/conversations/{chat_id}/messages/{seq:08d} with a
+sequence number allocated on the conversation document (messageCount).
+Contents too large to keep inline are split across
+.../bodies/{seq:08d}-{i} documents and the message carries bodyChunks.
+
+ChatHistoryStore keeps each chat's messages and the last sequence number
+read in an in-process LRU. A turn whose conversation messageCount shows
+nothing new reads no message documents; otherwise only messages past the
+cursor are fetched. A cached chat whose messageCount has dropped or
+whose createdAt has changed was cleared or recreated under the same id,
+so it is read again from the start. Chats from before the move keep their
+messages in an array on the conversation document and are read from
+there, uncached.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+
+# Conversation fields read on every turn; the legacy messages array is only read when needed
+CONVERSATION_FIELDS = ['messageCount', 'createdAt', 'contextState', 'geminiCache', 'updatedAt']
+
+class ChatHistoryStore:
+    """LRU of chat histories with a per-chat sequence cursor."""
+
+    def __init__(self, db, max_entries=256, field_filter=None):
+        if field_filter is None:
+            from google.cloud.firestore_v1.base_query import FieldFilter as field_filter
+        self.db = db
+        self.field_filter = field_filter
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def chat_ref(self, user_id, chat_id):
+        return self.db.collection('chats').document(user_id).collection('conversations').document(chat_id)
+
+    def forget(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def _resolve_bodies(self, chat_ref, documents):
+        """Reassemble contents stored out of line, fetching all their chunks in one batched read."""
+        body_refs = [
+            chat_ref.collection('bodies').document(f"{document['seq']:08d}-{index}")
+            for document in documents if document.get('bodyChunks')
+            for index in range(document['bodyChunks'])
+        ]
+        if not body_refs:
+            return
+        chunks = {snapshot.id: snapshot.to_dict().get('text', '') for snapshot in self.db.get_all(body_refs) if snapshot.exists}
+        for document in documents:
+            if document.get('bodyChunks'):
+                text = ''.join(chunks.get(f"{document['seq']:08d}-{index}", '') for index in range(document['bodyChunks']))
+                document['content'] = json.loads(text) if document.get('contentIsJson') else text
+
+    def load(self, user_id, chat_id):
+        """Return (messages, conversation_data) for a chat, reading only what changed since the last call."""
+        key = (user_id, chat_id)
+        chat_ref = self.chat_ref(user_id, chat_id)
+        chat_doc = chat_ref.get(field_paths=CONVERSATION_FIELDS)
+        if not chat_doc.exists:
+            self.forget(key)
+            return [], {}
+        chat_data = chat_doc.to_dict()
+
+        message_count = chat_data.get('messageCount')
+        if message_count is None:
+            legacy_doc = chat_ref.get(field_paths=['messages'])
+            return (legacy_doc.to_dict() or {}).get('messages', []), chat_data
+
+        created_at = chat_data.get('createdAt')
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and (message_count < entry['cursor'] + 1 or created_at != entry['created_at']):
+                # Cleared or recreated under the same id: the cached messages are not a prefix of the chat
+                self.entries.pop(key)
+                entry = None
+            if entry:
+                self.entries.move_to_end(key)
+                messages, cursor = list(entry['messages']), entry['cursor']
+            else:
+                messages, cursor = [], -1
+        if message_count <= cursor + 1:
+            return messages, chat_data
+
+        query = chat_ref.collection('messages').where(filter=self.field_filter('seq', '>', cursor)).order_by('seq')
+        documents = [snapshot.to_dict() for snapshot in query.stream()]
+        self._resolve_bodies(chat_ref, documents)
+        for document in documents:
+            cursor = max(cursor, document.pop('seq'))
+            document.pop('bodyChunks', None)
+            document.pop('contentIsJson', None)
+            messages.append(document)
+
+        with self.lock:
+            self.entries[key] = {'messages': messages, 'cursor': cursor, 'created_at': created_at}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return list(messages), chat_data
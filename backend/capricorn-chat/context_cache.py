@@ -0,0 +1,143 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Gemini cached-content handles for the stable prefix of each chat.
+
+The system prompt and the article-heavy start of a conversation are the
+same on every turn. GeminiContextCache keeps one cached-content handle per
+(user_id, chat_id), keyed by a fingerprint of that prefix:
+  - a matching, unexpired handle is reused (its TTL is extended when it is
+    close to expiring)
+  - a changed prefix deletes the old handle and creates a new one
+  - prefixes below the model's minimum cacheable size, or that failed to
+    cache, are sent uncached without retrying every turn
+
+Entries are plain dicts ({'name', 'fingerprint', 'expires_at'}) so the
+caller can persist them on the conversation for other instances to reuse.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from google.genai import types
+
+from conversation_context import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Extend a handle's TTL instead of reusing it as-is when it expires within this many seconds
+REFRESH_MARGIN = 120
+
+def prefix_fingerprint(contents):
+    digest = hashlib.sha256()
+    for content in contents:
+        digest.update(content.role.encode())
+        for part in content.parts:
+            digest.update(b"\0")
+            digest.update((part.text or "").encode())
+        digest.update(b"\1")
+    return digest.hexdigest()
+
+class GeminiContextCache:
+    """Per-chat cached-content handles with TTL tracking and prefix invalidation."""
+
+    def __init__(self, client, model, ttl=3600, min_tokens=4096, max_entries=1000):
+        self.client = client
+        self.model = model
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.failed = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _remember(self, table, key, value):
+        with self.lock:
+            table[key] = value
+            table.move_to_end(key)
+            while len(table) > self.max_entries:
+                table.popitem(last=False)
+
+    def _forget(self, key):
+        with self.lock:
+            return self.entries.pop(key, None)
+
+    def _delete(self, name):
+        try:
+            self.client.caches.delete(name=name)
+        except Exception as e:
+            logger.info(f"Could not delete cached content {name}: {str(e)}")
+
+    def get(self, key, contents, persisted=None):
+        """Return a live cache entry for this chat's prefix contents, or None to send them uncached."""
+        fingerprint = prefix_fingerprint(contents)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None and isinstance(persisted, dict) and persisted.get('name'):
+            entry = persisted
+
+        if entry and entry.get('fingerprint') == fingerprint and entry.get('expires_at', 0) > now:
+            if entry['expires_at'] - now < REFRESH_MARGIN:
+                try:
+                    self.client.caches.update(
+                        name=entry['name'],
+                        config=types.UpdateCachedContentConfig(ttl=f"{self.ttl}s"),
+                    )
+                    entry = {**entry, 'expires_at': now + self.ttl}
+                except Exception as e:
+                    logger.info(f"Could not extend cached content {entry['name']}: {str(e)}")
+                    entry = None
+            if entry:
+                self._remember(self.entries, key, entry)
+                return entry
+
+        if entry and entry.get('fingerprint') != fingerprint:
+            # History before the cached point changed; the old handle can never be used again
+            self._delete(entry['name'])
+        self._forget(key)
+
+        if sum(estimate_tokens(part.text or "") for content in contents for part in content.parts) < self.min_tokens:
+            return None
+        with self.lock:
+            if self.failed.get(key) == fingerprint:
+                return None
+
+        try:
+            cached_content = self.client.caches.create(
+                model=self.model,
+                config=types.CreateCachedContentConfig(
+                    contents=contents,
+                    display_name=f"chat-{hashlib.sha256(repr(key).encode()).hexdigest()[:16]}",
+                    ttl=f"{self.ttl}s",
+                ),
+            )
+        except Exception as e:
+            logger.warning(f"Context caching unavailable for this chat, sending the prefix uncached: {str(e)}")
+            self._remember(self.failed, key, fingerprint)
+            return None
+
+        entry = {'name': cached_content.name, 'fingerprint': fingerprint, 'expires_at': now + self.ttl}
+        self._remember(self.entries, key, entry)
+        logger.info(f"Created cached content {cached_content.name} for {len(contents)} prefix messages")
+        return entry
+
+    def invalidate(self, key):
+        """Drop a handle that failed at generation time, e.g. because it expired server-side."""
+        entry = self._forget(key)
+        if entry:
+            self._delete(entry['name'])
@@ -0,0 +1,317 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Token-budgeted conversation context for the chat function.
+
+Instead of replaying every stored message, build_context assembles:
+  - the first user message (the patient case), pinned
+  - one evidence digest per article, built from its analysis instead of
+    its full text
+  - the article and analysis passages most relevant to the question
+  - a rolling summary of older dialogue turns
+  - the most recent dialogue turns verbatim
+
+The digests and rolling summary are returned as a state dict that the
+caller persists on the conversation, so later turns only digest new
+articles and only summarize turns that have just aged out.
+"""
+
+import hashlib
+import json
+import math
+import re
+from collections import Counter
+
+# Bumped when digests change so persisted ones are rebuilt
+CONTEXT_STATE_VERSION = 2
+
+# Rough share of the token budget for each part of the context
+BUDGET_SHARES = {'case': 0.15, 'digests': 0.2, 'passages': 0.25, 'summary': 0.1}
+
+PASSAGE_CHARS = 1200
+
+STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "was", "were", "are", "from", "have", "has", "had",
+    "what", "which", "who", "how", "why", "when", "where", "does", "did", "can", "could", "would",
+    "should", "about", "into", "than", "then", "there", "their", "these", "those", "been", "being",
+    "any", "all", "not", "but", "you", "your", "our", "its", "also", "more", "most", "such",
+}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9\-+]*")
+
+def estimate_tokens(text):
+    """Approximate Gemini tokens as four characters each."""
+    return len(text) // 4 + 1
+
+def truncate_to_tokens(text, tokens):
+    max_chars = max(0, tokens * 4)
+    return text if len(text) <= max_chars else text[:max_chars].rsplit(' ', 1)[0] + " [...]"
+
+def message_text(message):
+    content = message.get('content')
+    if isinstance(content, str):
+        return content
+    return json.dumps(content) if content is not None else ""
+
+def terms(text):
+    return [term for term in TOKEN_PATTERN.findall(text.lower()) if len(term) > 2 and term not in STOPWORDS]
+
+def message_articles(message):
+    """Return the article analyses carried by a document message."""
+    content = message.get('content')
+    if isinstance(content, str):
+        try:
+            content = json.loads(content)
+        except ValueError:
+            return []
+    if not isinstance(content, dict):
+        return []
+    return [article for article in content.get('articles') or [] if isinstance(article, dict)]
+
+def article_field(article, field, metadata_field=None):
+    """Read a field of a stored article.
+
+    Document messages store the flat article dicts the frontend builds
+    (title, journal_title, type, disease, events, points, content, ...);
+    articles nesting the retrieval response's article_metadata are read
+    from there as a fallback.
+    """
+    value = article.get(field)
+    if value is None:
+        value = (article.get('article_metadata') or {}).get(metadata_field or field)
+    return value
+
+def article_key(article):
+    title = article_field(article, 'title')
+    if article.get('pmcid') or article.get('pmid') or title:
+        return str(article.get('pmcid') or article.get('pmid') or title)
+    return hashlib.sha256(json.dumps(article, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+def article_full_text(article):
+    return article.get('content') or article.get('full_article_text') or ""
+
+def article_digest(article):
+    """Condense an article analysis into a few lines of evidence, without its full text."""
+    identifiers = ", ".join(f"{label} {article[field]}" for field, label in [('pmid', 'PMID'), ('pmcid', 'PMCID')]
+                            if article.get(field))
+    lines = [f"- {article_field(article, 'title') or 'Untitled article'} ({identifiers or 'no identifier'})"]
+    source = " ".join(str(part) for part in [article_field(article, 'journal_title'), article_field(article, 'year'),
+                                              article_field(article, 'type', 'paper_type')] if part)
+    if source:
+        lines.append(f"  Source: {source}")
+    disease = article_field(article, 'disease', 'type_of_disease')
+    if disease:
+        lines.append(f"  Disease: {disease}")
+    events = [event.get('event') for event in article_field(article, 'events', 'actionable_events') or []
+              if isinstance(event, dict) and event.get('event')]
+    if events:
+        lines.append(f"  Actionable events: {', '.join(events)}")
+    drug_results = article_field(article, 'drug_results')
+    if drug_results:
+        lines.append(f"  Treatment outcomes: {'; '.join(str(result) for result in drug_results)}")
+    # The flat articles keep no study flags, but their point breakdown lists the ones that scored
+    breakdown = article_field(article, 'point_breakdown') or {}
+    study_types = [label for field, label in [
+        ('clinical_study_on_children', 'pediatric clinical study'), ('clinical_study', 'clinical study'),
+        ('case_report', 'case report'), ('series_of_case_reports', 'case series'),
+        ('mice_studies', 'mouse studies'), ('cell_studies', 'cell studies'),
+    ] if article_field(article, field) or field in breakdown]
+    if study_types:
+        lines.append(f"  Evidence: {', '.join(study_types)}")
+    points = article.get('points')
+    if points is None:
+        points = article_field(article, 'overall_points')
+    if points is not None:
+        lines.append(f"  Relevance score: {points}")
+    return "\n".join(lines)
+
+def split_passages(source, text):
+    """Split a text into paragraph-aligned passages of about PASSAGE_CHARS."""
+    passages = []
+    current = ""
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        while len(paragraph) > PASSAGE_CHARS:
+            cut = paragraph.rfind(' ', 0, PASSAGE_CHARS)
+            cut = cut if cut > 0 else PASSAGE_CHARS
+            if current:
+                passages.append((source, current))
+                current = ""
+            passages.append((source, paragraph[:cut]))
+            paragraph = paragraph[cut:].strip()
+        if current and len(current) + len(paragraph) > PASSAGE_CHARS:
+            passages.append((source, current))
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        passages.append((source, current))
+    return passages
+
+def rank_passages(question, passages, k1=1.2, b=0.75):
+    """Order (source, passage) pairs by BM25 relevance to the question."""
+    query_terms = set(terms(question))
+    if not query_terms or not passages:
+        return []
+    passage_terms = [Counter(terms(passage)) for _, passage in passages]
+    average_length = sum(sum(counts.values()) for counts in passage_terms) / len(passages) or 1
+    document_frequency = Counter(term for counts in passage_terms for term in query_terms & counts.keys())
+    scored = []
+    for index, counts in enumerate(passage_terms):
+        length = sum(counts.values())
+        score = 0.0
+        for term in query_terms & counts.keys():
+            idf = math.log(1 + (len(passages) - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+            frequency = counts[term]
+            score += idf * frequency * (k1 + 1) / (frequency + k1 * (1 - b + b * length / average_length))
+        if score > 0:
+            scored.append((score, index))
+    scored.sort(reverse=True)
+    return [passages[index] for _, index in scored]
+
+def fallback_summary(previous_summary, turns):
+    """Extractive summary used when the summarizer is unavailable."""
+    lines = [previous_summary] if previous_summary else []
+    for turn in turns:
+        speaker = "Clinician" if turn.get('role') == 'user' else "Assistant"
+        lines.append(f"{speaker}: {truncate_to_tokens(message_text(turn), 75)}")
+    return "\n".join(lines)
+
+def build_context(messages, question, state=None, token_budget=32000, summarize=None):
+    """Assemble a compact context for one chat turn.
+
+    messages are the stored conversation messages, question the new user
+    message and state the value previously returned for this conversation.
+    summarize(previous_summary, turns) folds aged-out turns into the rolling
+    summary; it defaults to an extractive fallback.
+
+    Returns (turns, state, stats): turns is a list of {'role', 'text'}
+    dicts to send after the system prompt, the leading ones flagged
+    'stable' when they do not depend on the question; state should be
+    persisted if it differs from the one passed in, and stats describes
+    what was kept.
+    """
+    state = dict(state or {})
+    if state.get('version') != CONTEXT_STATE_VERSION:
+        state = {'version': CONTEXT_STATE_VERSION}
+    digests = dict(state.get('digests') or {})
+
+    case_message = None
+    dialogue = []
+    articles = []
+    analyses = []
+    for message in messages:
+        message_type = message.get('type', 'message')
+        if message_type == 'document':
+            articles.extend(message_articles(message))
+        elif message_type == 'analysis':
+            analyses.append(message_text(message))
+        elif case_message is None and message.get('role') == 'user':
+            case_message = message
+        else:
+            dialogue.append(message)
+
+    # Evidence digests, computed once per article and reused from the persisted state
+    unique_articles = {}
+    for article in articles:
+        key = article_key(article)
+        if key not in digests:
+            digests[key] = article_digest(article)
+        unique_articles.setdefault(key, article)
+    article_keys = list(unique_articles)
+    state['digests'] = digests
+
+    case_text = truncate_to_tokens(message_text(case_message), int(token_budget * BUDGET_SHARES['case'])) if case_message else ""
+
+    digest_budget = int(token_budget * BUDGET_SHARES['digests'])
+    digest_lines = []
+    for key in article_keys:
+        if estimate_tokens("\n".join(digest_lines + [digests[key]])) > digest_budget:
+            break
+        digest_lines.append(digests[key])
+
+    passage_budget = int(token_budget * BUDGET_SHARES['passages'])
+    sources = [(f"Literature analysis {index + 1}", text) for index, text in enumerate(analyses)]
+    for key, article in unique_articles.items():
+        title = article_field(article, 'title') or key
+        sources.append((title, article_full_text(article)))
+    passages = []
+    passage_tokens = 0
+    for source, passage in rank_passages(question, [p for name, text in sources for p in split_passages(name, text)]):
+        tokens = estimate_tokens(passage)
+        if passage_tokens + tokens > passage_budget:
+            continue
+        passages.append(f"[{source}]\n{passage}")
+        passage_tokens += tokens
+
+    # Keep the newest dialogue verbatim; fold what no longer fits into the rolling summary
+    summary_budget = int(token_budget * BUDGET_SHARES['summary'])
+    fixed_tokens = estimate_tokens(case_text) + estimate_tokens("\n".join(digest_lines)) + passage_tokens
+    recent_budget = max(0, token_budget - fixed_tokens - summary_budget - estimate_tokens(question))
+    cut = len(dialogue)
+    recent_tokens = 0
+    while cut > 0 and recent_tokens + estimate_tokens(message_text(dialogue[cut - 1])) <= recent_budget:
+        cut -= 1
+        recent_tokens += estimate_tokens(message_text(dialogue[cut]))
+
+    summarized = state.get('summarized_count', 0)
+    if summarized and (summarized > len(dialogue)
+                       or dialogue[summarized - 1].get('messageId') != state.get('summarized_through')):
+        # History before the summarized point changed; start the summary over
+        summarized = 0
+        state.pop('summary', None)
+    if cut > summarized:
+        aged_out = dialogue[summarized:cut]
+        previous_summary = state.get('summary', "")
+        try:
+            summary = summarize(previous_summary, aged_out) if summarize else fallback_summary(previous_summary, aged_out)
+        except Exception:
+            summary = fallback_summary(previous_summary, aged_out)
+        state['summary'] = truncate_to_tokens(summary, summary_budget)
+        summarized = cut
+    state['summarized_count'] = summarized
+    state['summarized_through'] = dialogue[summarized - 1].get('messageId') if summarized else None
+
+    # The case and digests only change when articles arrive, so they form a stable, cacheable prefix
+    stable_sections = []
+    if case_text:
+        stable_sections.append(f"## Patient case\n{case_text}")
+    if digest_lines:
+        omitted = len(article_keys) - len(digest_lines)
+        note = f"\n({omitted} further articles omitted)" if omitted else ""
+        stable_sections.append("## Article evidence digests\n" + "\n".join(digest_lines) + note)
+    sections = []
+    if passages:
+        sections.append("## Passages relevant to the current question\n" + "\n\n".join(passages))
+    if state.get('summary'):
+        sections.append(f"## Summary of earlier discussion\n{state['summary']}")
+
+    turns = []
+    if stable_sections:
+        turns.append({'role': 'user', 'text': "\n\n".join(stable_sections), 'stable': True})
+    if sections:
+        turns.append({'role': 'user', 'text': "\n\n".join(sections)})
+    for message in dialogue[summarized:]:
+        turns.append({'role': 'user' if message.get('role') == 'user' else 'model', 'text': message_text(message)})
+
+    stats = {
+        'articles': len(article_keys),
+        'digests': len(digest_lines),
+        'passages': len(passages),
+        'summarized_turns': summarized,
+        'recent_turns': len(dialogue) - summarized,
+        'estimated_tokens': sum(estimate_tokens(turn['text']) for turn in turns),
+    }
+    return turns, state, stats
@@ -19,8 +19,15 @@ from flask import jsonify, Response, stream_with_context
 from google import genai
 from google.cloud import firestore
 import json
+import logging
 import os
 
+from chat_store import ChatHistoryStore
+from context_cache import GeminiContextCache
+from conversation_context import build_context, fallback_summary, message_text
+
+logger = logging.getLogger(__name__)
+
 # Initialize Firestore client with environment variable
 db = firestore.Client(database=os.environ.get('DATABASE_ID', 'capricorn-eu'))
 
@@ -33,16 +40,58 @@ client = genai.Client(
     location=os.environ.get('LOCATION', 'us-central1'),
 )
 
+# "compact" sends a token-budgeted context; "full" replays every stored message as before
+CHAT_CONTEXT_MODE = os.environ.get('CHAT_CONTEXT_MODE', 'compact')
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.environ.get('CHAT_CONTEXT_TOKEN_BUDGET', '32000'))
+
+CHAT_MODEL = "gemini-2.0-flash-001"
+
+# Cache the system prompt and stable start of each chat as Gemini cached content
+CHAT_CONTEXT_CACHE = os.environ.get('CHAT_CONTEXT_CACHE', 'true').lower() == 'true'
+context_cache = GeminiContextCache(
+    client,
+    CHAT_MODEL,
+    ttl=int(os.environ.get('CHAT_CACHE_TTL', '3600')),
+    min_tokens=int(os.environ.get('CHAT_CACHE_MIN_TOKENS', '4096')),
+)
+
+# Per-chat message cache with a sequence cursor, so each turn only reads new messages
+history_store = ChatHistoryStore(db, int(os.environ.get('CHAT_HISTORY_CACHE_SIZE', '256')))
+
+def get_chat_ref(user_id, chat_id):
+    return history_store.chat_ref(user_id, chat_id)
+
 def get_chat_history(user_id, chat_id):
-    """Retrieve chat history from Firestore."""
-    chat_ref = db.collection('chats').document(user_id).collection('conversations').document(chat_id)
-    chat_doc = chat_ref.get()
-    
-    if not chat_doc.exists:
-        return []
-        
-    messages = chat_doc.to_dict().get('messages', [])
-    return messages
+    """Retrieve chat history and the rest of the conversation document from Firestore."""
+    return history_store.load(user_id, chat_id)
+
+def save_chat_fields(user_id, chat_id, fields):
+    """Persist server-side chat state (compacted context, cache handle) next to the messages."""
+    try:
+        get_chat_ref(user_id, chat_id).set(fields, merge=True)
+    except Exception as e:
+        logger.warning(f"Failed to save {', '.join(fields)} for chat {chat_id}: {str(e)}")
+
+def summarize_turns(previous_summary, turns):
+    """Fold aged-out dialogue turns into the rolling summary with Gemini."""
+    transcript = "\n\n".join(
+        f"{'Clinician' if turn.get('role') == 'user' else 'Assistant'}: {message_text(turn)}" for turn in turns
+    )
+    prompt = f"""Update the running summary of a clinical discussion about a pediatric oncology case.
+Keep every clinical fact, treatment option, cited article (with PMID/PMCID) and open question; drop pleasantries.
+Respond with the updated summary only, at most 300 words.
+
+Current summary:
+{previous_summary or "(none)"}
+
+New turns:
+{transcript}"""
+    response = client.models.generate_content(
+        model=CHAT_MODEL,
+        contents=[types.Content(role="user", parts=[types.Part.from_text(text=prompt)])],
+        config=types.GenerateContentConfig(temperature=0, max_output_tokens=1024, response_modalities=["TEXT"]),
+    )
+    return response.text.strip() if response.text else fallback_summary(previous_summary, turns)
 
 def create_gemini_prompt():
     """Create the expert pediatric oncologist prompt."""
@@ -54,7 +103,7 @@ def create_gemini_prompt():
    - Extracted disease and actionable events
 
 2. A comprehensive literature analysis, including:
-   - Full text of relevant research articles
+   - Evidence digests of relevant research articles and the passages most relevant to the current question
    - Analysis of each article's relevance to the case
    - Detailed breakdown of treatment outcomes, genetic factors, and clinical significance
 
@@ -80,7 +129,7 @@ Remember:
 - Don't make claims without evidence from the provided articles
 - Focus on answering the specific question while leveraging the rich context available
 
-The conversation will include full article texts and analysis - use this information to provide detailed, evidence-based responses."""
+Earlier parts of a long discussion may appear as a summary - use it, the digests and the passages to provide detailed, evidence-based responses."""
 
 @functions_framework.http
 def chat(request):
@@ -114,24 +163,46 @@ def chat(request):
 
     try:
         # Get chat history
-        chat_history = get_chat_history(user_id, chat_id)
+        chat_history, chat_data = get_chat_history(user_id, chat_id)
+        context_state = chat_data.get('contextState')
         
-        # Create conversation history for Gemini
+        # Create conversation history for Gemini; "stable" marks the prefix that is the same every turn
         conversation = []
         
         # Add system prompt
         conversation.append({
             "role": "user",
-            "parts": [create_gemini_prompt()]
+            "parts": [create_gemini_prompt()],
+            "stable": True
         })
         
-        # Add chat history - include all messages with raw content
-        for msg in chat_history:
-            role = "user" if msg.get('role') == 'user' else "model"
-            conversation.append({
-                "role": role,
-                "parts": [msg.get('content')]
-            })
+        if CHAT_CONTEXT_MODE == 'full':
+            # Add chat history - include all messages with raw content
+            last_article_index = max(
+                (index for index, msg in enumerate(chat_history) if msg.get('type') in ('document', 'analysis')),
+                default=-1
+            )
+            for index, msg in enumerate(chat_history):
+                role = "user" if msg.get('role') == 'user' else "model"
+                conversation.append({
+                    "role": role,
+                    "parts": [message_text(msg)],
+                    "stable": index <= last_article_index
+                })
+        else:
+            # Add the compacted context: case, article digests, relevant passages, summary and recent turns
+            turns, new_state, stats = build_context(
+                chat_history, message, context_state, CHAT_CONTEXT_TOKEN_BUDGET, summarize_turns
+            )
+            logger.info(f"Compacted context for chat {chat_id}: {stats}")
+            if new_state != context_state:
+                save_chat_fields(user_id, chat_id, {'contextState': new_state})
+            for turn in turns:
+                conversation.append({
+                    "role": turn['role'],
+                    "parts": [turn['text']],
+                    "stable": turn.get('stable', False)
+                })
         
         # Add current message
         conversation.append({
@@ -139,6 +210,10 @@ def chat(request):
             "parts": [message]
         })
 
+        conversation = [msg for msg in conversation if msg["parts"][0]]
+        prefix_length = 0
+        while prefix_length < len(conversation) and conversation[prefix_length].get("stable"):
+            prefix_length += 1
 
         # Convert conversation to Gemini content format
         contents = []
@@ -176,21 +251,49 @@ def chat(request):
             ]
         )
 
+        # Reuse a cached-content handle for the stable prefix so follow-ups only pay for new tokens
+        cache_key = (user_id, chat_id)
+        cache_entry = None
+        if CHAT_CONTEXT_CACHE and prefix_length:
+            cache_entry = context_cache.get(cache_key, contents[:prefix_length], chat_data.get('geminiCache'))
+            if cache_entry and cache_entry != chat_data.get('geminiCache'):
+                save_chat_fields(user_id, chat_id, {'geminiCache': cache_entry})
+
+        attempts = []
+        if cache_entry:
+            attempts.append((
+                contents[prefix_length:],
+                generate_content_config.model_copy(update={'cached_content': cache_entry['name']})
+            ))
+        attempts.append((contents, generate_content_config))
+
         # Generate streaming response
         def generate():
-            try:
-                response = client.models.generate_content_stream(
-                    model="gemini-2.0-flash-001",
-                    contents=contents,
-                    config=generate_content_config
-                )
-                
-                for chunk in response:
-                    if chunk.text:
-                        yield f"data: {json.dumps({'text': chunk.text})}\n\n"
+            for attempt, (attempt_contents, attempt_config) in enumerate(attempts):
+                started = False
+                try:
+                    response = client.models.generate_content_stream(
+                        model=CHAT_MODEL,
+                        contents=attempt_contents,
+                        config=attempt_config
+                    )
+                    
+                    for chunk in response:
+                        if chunk.usage_metadata and chunk.usage_metadata.cached_content_token_count:
+                            logger.info(f"Chat {chat_id} reused {chunk.usage_metadata.cached_content_token_count} cached tokens")
+                        if chunk.text:
+                            started = True
+                            yield f"data: {json.dumps({'text': chunk.text})}\n\n"
+                    break
                         
-            except Exception as e:
-                yield f"data: {json.dumps({'error': str(e)})}\n\n"
+                except Exception as e:
+                    if started or attempt == len(attempts) - 1:
+                        yield f"data: {json.dumps({'error': str(e)})}\n\n"
+                        break
+                    # The cached prefix is gone or unusable; drop it and resend everything uncached
+                    logger.warning(f"Cached generation failed for chat {chat_id}, retrying uncached: {str(e)}")
+                    context_cache.invalidate(cache_key)
+                    save_chat_fields(user_id, chat_id, {'geminiCache': None})
             
             yield "data: [DONE]\n\n"
 
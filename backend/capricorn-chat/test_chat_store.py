@@ -0,0 +1,202 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+from collections import namedtuple
+
+import pytest
+
+from chat_store import ChatHistoryStore
+
+# Same fields as firestore_v1's FieldFilter, so the tests run without the SDK
+FieldFilter = namedtuple('FieldFilter', ['field_path', 'op_string', 'value'])
+
+def history_store(db, max_entries=256):
+    return ChatHistoryStore(db, max_entries, field_filter=FieldFilter)
+
+class FakeSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self.exists = data is not None
+        self.data = data
+
+    def to_dict(self):
+        return dict(self.data) if self.data is not None else None
+
+class FakeDocument:
+    def __init__(self, db, path):
+        self.db = db
+        self.path = path
+
+    def collection(self, name):
+        return FakeCollection(self.db, self.path + (name,))
+
+    def get(self, field_paths=None):
+        data = self.db.documents.get(self.path)
+        self.db.reads.append(self.path)
+        if data is not None and field_paths is not None:
+            data = {field: data[field] for field in field_paths if field in data}
+        return FakeSnapshot(self.path[-1], data)
+
+    def set(self, data):
+        self.db.documents[self.path] = dict(data)
+
+class FakeCollection:
+    OPERATORS = {'>': lambda a, b: a > b, '>=': lambda a, b: a >= b, '==': lambda a, b: a == b}
+
+    def __init__(self, db, path, filters=(), order=None):
+        self.db = db
+        self.path = path
+        self.filters = filters
+        self.order = order
+
+    def document(self, doc_id):
+        return FakeDocument(self.db, self.path + (doc_id,))
+
+    def where(self, filter):
+        return FakeCollection(self.db, self.path, self.filters + (filter,), self.order)
+
+    def order_by(self, field):
+        return FakeCollection(self.db, self.path, self.filters, field)
+
+    def stream(self):
+        matches = [(path, data) for path, data in self.db.documents.items()
+                   if path[:-1] == self.path
+                   and all(self.OPERATORS[f.op_string](data.get(f.field_path), f.value) for f in self.filters)]
+        if self.order:
+            matches.sort(key=lambda match: match[1][self.order])
+        for path, data in matches:
+            self.db.reads.append(path)
+            yield FakeSnapshot(path[-1], data)
+
+class FakeFirestore:
+    """Just enough of the Firestore client for ChatHistoryStore, recording every document read."""
+
+    def __init__(self):
+        self.documents = {}
+        self.reads = []
+
+    def collection(self, name):
+        return FakeCollection(self, (name,))
+
+    def get_all(self, refs):
+        return [ref.get() for ref in refs]
+
+def chat_path(user_id='user', chat_id='chat'):
+    return ('chats', user_id, 'conversations', chat_id)
+
+def add_message(db, seq, content, body_chunks=None, user_id='user', chat_id='chat'):
+    """Write a message the way the frontend does and bump the conversation's messageCount."""
+    path = chat_path(user_id, chat_id)
+    message = {'seq': seq, 'role': 'user', 'content': content}
+    if body_chunks:
+        text = json.dumps(content) if not isinstance(content, str) else content
+        size = -(-len(text) // body_chunks)
+        for index in range(body_chunks):
+            db.documents[path + ('bodies', f"{seq:08d}-{index}")] = {'text': text[index * size:(index + 1) * size]}
+        message.update(content=None, bodyChunks=body_chunks, contentIsJson=not isinstance(content, str))
+    db.documents[path + ('messages', f"{seq:08d}")] = message
+    conversation = db.documents.setdefault(path, {})
+    conversation['messageCount'] = seq + 1
+
+def message_reads(db):
+    return [path for path in db.reads if 'messages' in path or 'bodies' in path]
+
+@pytest.fixture
+def db():
+    return FakeFirestore()
+
+def test_missing_chat_is_empty(db):
+    assert history_store(db).load('user', 'chat') == ([], {})
+
+def test_legacy_chat_reads_the_messages_array(db):
+    db.documents[chat_path()] = {'messages': [{'role': 'user', 'content': 'hello'}], 'updatedAt': 1}
+    messages, chat_data = history_store(db).load('user', 'chat')
+    assert messages == [{'role': 'user', 'content': 'hello'}]
+    assert chat_data == {'updatedAt': 1}
+
+def test_only_new_messages_are_read(db):
+    store = history_store(db)
+    add_message(db, 0, 'first')
+    add_message(db, 1, 'second')
+    messages, chat_data = store.load('user', 'chat')
+    assert [message['content'] for message in messages] == ['first', 'second']
+    assert 'seq' not in messages[0]
+    assert chat_data == {'messageCount': 2}
+
+    db.reads.clear()
+    assert [message['content'] for message in store.load('user', 'chat')[0]] == ['first', 'second']
+    assert message_reads(db) == []
+
+    add_message(db, 2, 'third')
+    db.reads.clear()
+    assert [message['content'] for message in store.load('user', 'chat')[0]] == ['first', 'second', 'third']
+    assert message_reads(db) == [chat_path() + ('messages', '00000002')]
+
+def test_returned_messages_do_not_alias_the_cache(db):
+    store = history_store(db)
+    add_message(db, 0, 'first')
+    store.load('user', 'chat')[0].append({'content': 'not stored'})
+    assert len(store.load('user', 'chat')[0]) == 1
+
+def test_out_of_line_bodies_are_reassembled(db):
+    document = {'articles': [{'pmcid': 'PMC1', 'full_article_text': 'x' * 500}]}
+    add_message(db, 0, 'question')
+    add_message(db, 1, document, body_chunks=3)
+    add_message(db, 2, 'long text ' * 50, body_chunks=2)
+    messages, _ = history_store(db).load('user', 'chat')
+    assert messages[1]['content'] == document
+    assert messages[2]['content'] == 'long text ' * 50
+    assert all('bodyChunks' not in message and 'contentIsJson' not in message for message in messages)
+
+def test_deleted_chat_is_forgotten(db):
+    store = history_store(db)
+    add_message(db, 0, 'first')
+    store.load('user', 'chat')
+    del db.documents[chat_path()]
+    assert store.load('user', 'chat') == ([], {})
+    assert ('user', 'chat') not in store.entries
+
+def test_least_recently_used_chat_is_evicted(db):
+    store = history_store(db, max_entries=1)
+    add_message(db, 0, 'first', chat_id='a')
+    add_message(db, 0, 'first', chat_id='b')
+    store.load('user', 'a')
+    store.load('user', 'b')
+    assert list(store.entries) == [('user', 'b')]
+    db.reads.clear()
+    store.load('user', 'a')
+    assert message_reads(db) == [chat_path(chat_id='a') + ('messages', '00000000')]
+
+def test_cleared_chat_is_read_again(db):
+    store = history_store(db)
+    add_message(db, 0, 'first')
+    add_message(db, 1, 'second')
+    store.load('user', 'chat')
+    for path in [path for path in db.documents if 'messages' in path]:
+        del db.documents[path]
+    db.documents[chat_path()]['messageCount'] = 0
+    add_message(db, 0, 'fresh start')
+    assert [message['content'] for message in store.load('user', 'chat')[0]] == ['fresh start']
+
+def test_recreated_chat_is_read_again(db):
+    store = history_store(db)
+    db.documents[chat_path()] = {'createdAt': 1}
+    add_message(db, 0, 'old chat')
+    add_message(db, 1, 'old reply')
+    store.load('user', 'chat')
+    db.documents = {chat_path(): {'createdAt': 2}}
+    add_message(db, 0, 'new chat')
+    add_message(db, 1, 'new reply')
+    assert [message['content'] for message in store.load('user', 'chat')[0]] == ['new chat', 'new reply']
@@ -0,0 +1,183 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+from conversation_context import (CONTEXT_STATE_VERSION, article_digest, build_context, rank_passages,
+                                  split_passages)
+
+CASE = {'role': 'user', 'messageId': 'm0', 'content': "7 year old with relapsed KMT2A-rearranged AML after two inductions."}
+
+def article(pmid, pmcid, title, full_text, events=(), point_breakdown=None):
+    """An article as MedicalAssistantUI stores it in a document message."""
+    return {
+        'pmid': pmid,
+        'pmcid': pmcid,
+        'title': title,
+        'link': f"https://www.ncbi.nlm.nih.gov/pmc/articles/{pmcid}/",
+        'points': 80,
+        'content': full_text,
+        'journal_title': 'Blood',
+        'journal_sjr': 5.0,
+        'year': 2023,
+        'disease': 'acute myeloid leukemia',
+        'type': 'Clinical Trial',
+        'events': [{'event': event, 'matches_query': True} for event in events],
+        'drugs_tested': True,
+        'drug_results': ["Revumenib: 30% complete remission"] if events else [],
+        'point_breakdown': point_breakdown or {'journal_impact': 8.9, 'year': -10},
+        'rank': 1,
+    }
+
+ARTICLES = [
+    article('111', 'PMC1', 'Menin inhibition in KMT2A leukemia',
+            "Revumenib produced remissions in KMT2A-rearranged acute leukemia.\n\n" + "Filler methods text. " * 200,
+            events=['KMT2A rearrangement'], point_breakdown={'year': -10, 'clinical_study_on_children': 20}),
+    article('222', 'PMC2', 'FLT3 inhibitors in pediatric AML',
+            "Gilteritinib was tolerated in children with FLT3-ITD AML.\n\n" + "More filler results. " * 200),
+]
+
+DOCUMENT = {'role': 'assistant', 'type': 'document', 'messageId': 'm1', 'content': json.dumps({'articles': ARTICLES})}
+
+def dialogue(count, start=2, length=400):
+    return [{'role': 'user' if index % 2 == 0 else 'assistant', 'messageId': f"m{index}",
+             'content': f"turn {index} " + "x" * length} for index in range(start, start + count)]
+
+def test_case_and_digests_form_a_stable_prefix():
+    turns, state, stats = build_context([CASE, DOCUMENT], "Which menin inhibitor is used for KMT2A?")
+    assert turns[0]['stable'] is True
+    assert "## Patient case" in turns[0]['text'] and CASE['content'] in turns[0]['text']
+    assert "Menin inhibition in KMT2A leukemia (PMID 111, PMCID PMC1)" in turns[0]['text']
+    assert stats['articles'] == 2 and stats['digests'] == 2
+    assert state['version'] == CONTEXT_STATE_VERSION
+    assert set(state['digests']) == {'PMC1', 'PMC2'}
+
+def test_full_text_is_replaced_by_relevant_passages():
+    turns, _, stats = build_context([CASE, DOCUMENT], "Does revumenib produce remissions in KMT2A-rearranged leukemia?",
+                                   token_budget=4000)
+    text = "\n".join(turn['text'] for turn in turns)
+    assert "Revumenib produced remissions" in text
+    assert text.count("Filler methods text.") < 200
+    assert stats['passages'] >= 1
+    assert stats['estimated_tokens'] <= 4000
+
+def test_persisted_digests_are_reused():
+    state = {'version': CONTEXT_STATE_VERSION, 'digests': {'PMC1': "- cached digest for PMC1"}}
+    turns, new_state, _ = build_context([CASE, DOCUMENT], "question", state)
+    assert "- cached digest for PMC1" in turns[0]['text']
+    assert new_state['digests']['PMC1'] == "- cached digest for PMC1"
+
+def test_state_from_another_version_is_discarded():
+    state = {'version': CONTEXT_STATE_VERSION + 1, 'digests': {'PMC1': "stale"}, 'summary': "stale"}
+    _, new_state, _ = build_context([CASE, DOCUMENT], "question", state)
+    assert new_state['digests']['PMC1'] != "stale"
+    assert new_state.get('summary') != "stale"
+
+def test_old_turns_are_summarized_and_recent_turns_kept_verbatim():
+    messages = [CASE] + dialogue(20)
+    calls = []
+
+    def summarize(previous_summary, turns):
+        calls.append([turn['messageId'] for turn in turns])
+        return (previous_summary + " " if previous_summary else "") + f"summary of {len(turns)} turns"
+
+    turns, state, stats = build_context(messages, "next question", token_budget=2000, summarize=summarize)
+    assert stats['summarized_turns'] > 0 and stats['recent_turns'] > 0
+    assert stats['summarized_turns'] + stats['recent_turns'] == 20
+    assert calls == [[f"m{index}" for index in range(2, 2 + stats['summarized_turns'])]]
+    assert turns[-1]['text'] == messages[-1]['content']
+    assert "## Summary of earlier discussion" in "\n".join(turn['text'] for turn in turns)
+    assert state['summarized_through'] == f"m{1 + stats['summarized_turns']}"
+
+    # The next turn only summarizes the turns that have just aged out
+    calls.clear()
+    messages += dialogue(4, start=22)
+    _, next_state, next_stats = build_context(messages, "next question", state, token_budget=2000, summarize=summarize)
+    assert calls and calls[0][0] == f"m{2 + stats['summarized_turns']}"
+    assert next_state['summary'].startswith(state['summary'])
+    assert next_stats['summarized_turns'] + next_stats['recent_turns'] == 24
+
+def test_summary_restarts_when_earlier_history_changes():
+    messages = [CASE] + dialogue(20)
+    _, state, _ = build_context(messages, "question", token_budget=2000)
+    edited = [CASE] + [dict(message, messageId=f"edited-{message['messageId']}") for message in messages[1:]]
+    calls = []
+
+    def summarize(previous_summary, turns):
+        calls.append(previous_summary)
+        return "fresh summary"
+    _, new_state, _ = build_context(edited, "question", state, token_budget=2000, summarize=summarize)
+    assert calls == [""]
+    assert new_state['summary'] == "fresh summary"
+
+def test_failed_summarizer_falls_back_to_an_extractive_summary():
+    def summarize(previous_summary, turns):
+        raise RuntimeError("Gemini unavailable")
+    _, state, stats = build_context([CASE] + dialogue(20), "question", token_budget=2000, summarize=summarize)
+    assert stats['summarized_turns'] > 0
+    assert state['summary'].startswith("Clinician: turn 2")
+
+def test_short_conversation_is_sent_verbatim():
+    messages = [CASE] + dialogue(2, length=20)
+    turns, state, stats = build_context(messages, "question")
+    assert stats['summarized_turns'] == 0
+    assert [turn['role'] for turn in turns] == ['user', 'user', 'model']
+    assert 'summary' not in state
+
+def test_article_digest_omits_full_text():
+    digest = article_digest(ARTICLES[0])
+    assert digest.splitlines()[:3] == [
+        "- Menin inhibition in KMT2A leukemia (PMID 111, PMCID PMC1)",
+        "  Source: Blood 2023 Clinical Trial",
+        "  Disease: acute myeloid leukemia",
+    ]
+    assert "Actionable events: KMT2A rearrangement" in digest
+    assert "Treatment outcomes: Revumenib: 30% complete remission" in digest
+    assert "Evidence: pediatric clinical study" in digest
+    assert "Relevance score: 80" in digest
+    assert "Revumenib produced remissions" not in digest
+
+def test_article_digest_reads_nested_article_metadata():
+    nested = {
+        'pmcid': 'PMC3',
+        'article_metadata': {
+            'title': 'Nested analysis',
+            'journal_title': 'Leukemia',
+            'paper_type': 'Review',
+            'type_of_disease': 'ALL',
+            'actionable_events': [{'event': 'IKZF1 deletion'}],
+            'case_report': True,
+            'overall_points': 42,
+        },
+        'full_article_text': "Full text.",
+    }
+    digest = article_digest(nested)
+    assert "- Nested analysis (PMCID PMC3)" in digest
+    assert "Source: Leukemia Review" in digest
+    assert "Disease: ALL" in digest
+    assert "Actionable events: IKZF1 deletion" in digest
+    assert "Evidence: case report" in digest
+    assert "Relevance score: 42" in digest
+
+def test_passages_are_labelled_with_the_article_title():
+    turns, _, _ = build_context([CASE, DOCUMENT], "Does revumenib produce remissions in KMT2A-rearranged leukemia?")
+    assert "[Menin inhibition in KMT2A leukemia]\nRevumenib produced remissions" in turns[-1]['text']
+
+def test_rank_passages_orders_by_relevance():
+    passages = split_passages("a", "Gilteritinib in FLT3 AML.\n\nUnrelated surgical notes.\n\n") + [
+        ("b", "Revumenib and other menin inhibitors in KMT2A leukemia; menin binding.")]
+    ranked = rank_passages("menin inhibitors for KMT2A", passages)
+    assert ranked[0][0] == "b"
+    assert all("surgical" not in passage for _, passage in ranked)
+    assert rank_passages("the and for", passages) == []
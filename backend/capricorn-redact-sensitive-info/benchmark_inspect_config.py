@@ -0,0 +1,72 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Per-request DLP setup cost: dicts rebuilt every request versus prebuilt profiles.
+
+Builds the request locally without calling DLP. Usage:
+  python benchmark_inspect_config.py [--requests 2000]
+"""
+
+import argparse
+import time
+
+from google.cloud import dlp_v2
+
+import redaction_profiles
+
+TEXT = "Patient John Doe, DOB 03/14/2016, MRN 4482913, presented with relapsed KMT2A-rearranged AML."
+
+def legacy_request(project_id, text):
+    """The previous setup: rebuild the info type dicts and request dict, then convert to a proto."""
+    info_types = [{"name": name} for name in redaction_profiles.STRICT_INFO_TYPE_NAMES]
+    inspect_config = {
+        "info_types": info_types,
+        "min_likelihood": dlp_v2.Likelihood.LIKELY,
+        "include_quote": True,
+    }
+    return dlp_v2.InspectContentRequest({
+        "parent": f"projects/{project_id}",
+        "inspect_config": inspect_config,
+        "item": {"value": text},
+    })
+
+def time_per_request(build, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        build("gemini-med-lit-review", TEXT)
+    return (time.perf_counter() - start) / requests
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    legacy = time_per_request(legacy_request, args.requests)
+    prebuilt = time_per_request(redaction_profiles.inspect_request_for, args.requests)
+    legacy_size = legacy_request("gemini-med-lit-review", TEXT)._pb.ByteSize()
+    for profile in redaction_profiles.REDACTION_PROFILES:
+        request = redaction_profiles.inspect_request_for("gemini-med-lit-review", TEXT, profile)
+        print(f"{profile:>8} profile: {len(request.inspect_config.info_types):>3} info types, "
+              f"{request._pb.ByteSize():>5} request bytes")
+    template = dlp_v2.InspectContentRequest(
+        parent="projects/gemini-med-lit-review",
+        inspect_template_name="projects/gemini-med-lit-review/inspectTemplates/capricorn-strict",
+        item=dlp_v2.ContentItem(value=TEXT),
+    )
+    print(f"    template reference: {template._pb.ByteSize():>5} request bytes (legacy {legacy_size})")
+    print(f"setup per request: legacy {legacy * 1e6:.1f} us, prebuilt {prebuilt * 1e6:.1f} us "
+          f"({legacy / prebuilt:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark the offset-based redaction applier against repeated str.replace.
+
+Runs fully offline on synthetic multi-page case notes with DLP-style
+findings. Usage: python benchmark_redaction.py [--pages 1 10 50 200]
+"""
+
+import argparse
+import random
+import time
+
+from redaction import apply_redactions
+
+NOTE_TEMPLATE = (
+    "Visit note. Patient {name} (MRN {mrn}) was seen on {visit} in clinic. "
+    "Date of birth {dob}. Contact {phone}. Diagnosed with KMT2A-rearranged AML, "
+    "received induction chemotherapy with cytarabine and daunorubicin. "
+    "Bone marrow aspirate showed 12% blasts; flow cytometry positive for CD33 and CD123. "
+    "Plan: continue venetoclax and azacitidine, repeat marrow in four weeks.\n"
+)
+
+def make_case_notes(pages, paragraphs_per_page=8, seed=0):
+    """Build synthetic case notes and the findings DLP would report for them."""
+    rng = random.Random(seed)
+    names = ["John Doe", "Maria Garcia", "Wei Chen", "Amina Yusuf", "Lars Berg"]
+    parts = []
+    findings = []
+    offset = 0
+    for _ in range(pages * paragraphs_per_page):
+        values = {
+            "name": rng.choice(names),
+            "mrn": str(rng.randint(1000000, 9999999)),
+            "visit": f"{rng.randint(1, 12)}/{rng.randint(1, 28)}/2024",
+            "dob": f"{rng.randint(1, 12)}/{rng.randint(1, 28)}/20{rng.randint(10, 20)}",
+            "phone": f"555-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}",
+        }
+        paragraph = NOTE_TEMPLATE.format(**values)
+        for key, info_type in [("name", "PERSON_NAME"), ("mrn", "MEDICAL_RECORD_NUMBER"),
+                               ("dob", "DATE_OF_BIRTH"), ("phone", "PHONE_NUMBER")]:
+            start = paragraph.index(values[key])
+            findings.append({
+                "start": offset + start,
+                "end": offset + start + len(values[key]),
+                "quote": values[key],
+                "info_type": info_type,
+                "replacement": "Age: 9" if info_type == "DATE_OF_BIRTH" else "[REDACTED]",
+            })
+        parts.append(paragraph)
+        offset += len(paragraph)
+    return "".join(parts), findings
+
+def redact_with_str_replace(text, findings):
+    """The previous approach: one whole-text replace per finding."""
+    for finding in findings:
+        text = text.replace(finding["quote"], finding["replacement"])
+    return text
+
+def best_of(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 50, 200])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'pages':>6} {'chars':>9} {'findings':>9} {'str.replace ms':>15} {'offset ms':>10} {'speedup':>8}")
+    for pages in args.pages:
+        text, findings = make_case_notes(pages)
+        legacy = best_of(lambda: redact_with_str_replace(text, findings), args.repeats)
+        offset_based = best_of(lambda: apply_redactions(text, findings), args.repeats)
+        print(f"{pages:>6} {len(text):>9} {len(findings):>9} {legacy * 1000:>15.2f} "
+              f"{offset_based * 1000:>10.2f} {legacy / offset_based:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
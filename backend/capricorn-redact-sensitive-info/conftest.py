@@ -0,0 +1,67 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import importlib
+import re
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+@pytest.fixture(scope="session")
+def redaction_main():
+    """The function's main module, imported with its DLP and Gemini clients replaced so no credentials are needed."""
+    pytest.importorskip("functions_framework")
+    dlp_v2 = pytest.importorskip("google.cloud.dlp_v2")
+    genai = pytest.importorskip("google.genai")
+    with mock.patch.object(dlp_v2, "DlpServiceClient"), mock.patch.object(genai, "Client"):
+        return importlib.import_module("main")
+
+class FakeDlpClient:
+    """Stand-in for DlpServiceClient.inspect_content.
+
+    Reports every occurrence of the known (quote, info_type) pairs in the
+    inspected text, or of pattern matches, returning at most max_findings
+    of them per call and flagging the rest as truncated like DLP does.
+    """
+
+    def __init__(self, known_phi=(), pattern=None, max_findings=3000):
+        self.known_phi = known_phi
+        self.pattern = pattern
+        self.max_findings = max_findings
+        self.texts = []
+
+    def findings(self, text):
+        found = []
+        for quote, info_type in self.known_phi:
+            found.extend((info_type, quote, match.start(), match.end()) for match in re.finditer(re.escape(quote), text))
+        if self.pattern:
+            found.extend((self.pattern[1], match.group(), match.start(), match.end())
+                         for match in re.finditer(self.pattern[0], text))
+        return found
+
+    def inspect_content(self, request):
+        text = request.item.value
+        self.texts.append(text)
+        found = self.findings(text)
+        return SimpleNamespace(result=SimpleNamespace(
+            findings=[SimpleNamespace(info_type=SimpleNamespace(name=info_type), quote=quote,
+                                      location=SimpleNamespace(codepoint_range=SimpleNamespace(start=start, end=end)))
+                      for info_type, quote, start, end in found[:self.max_findings]],
+            findings_truncated=len(found) > self.max_findings,
+        ))
+
+@pytest.fixture
+def fake_dlp():
+    return FakeDlpClient
@@ -0,0 +1,59 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Local parsing of DATE_OF_BIRTH quotes and the age substituted for them.
+
+A date of birth cannot be in the future: a two-digit year that would land
+there is read as the previous century ("05/12/55" is 1955), and
+calculate_age rejects a birth date that is still in the future so the
+caller redacts it instead of reporting a negative age.
+"""
+
+import re
+from datetime import datetime
+
+# Formats tried in order when parsing a DATE_OF_BIRTH quote; US month/day order wins for ambiguous dates
+DATE_FORMATS = [
+    "%Y-%m-%d", "%Y/%m/%d", "%Y.%m.%d", "%Y%m%d",
+    "%m/%d/%Y", "%m-%d-%Y", "%m.%d.%Y", "%m/%d/%y", "%m-%d-%y",
+    "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y",
+    "%B %d, %Y", "%B %d %Y", "%b %d, %Y", "%b %d %Y", "%b. %d, %Y", "%b. %d %Y",
+    "%d %B %Y", "%d %b %Y", "%d %B, %Y", "%d %b, %Y", "%d-%b-%Y", "%d-%B-%Y",
+]
+
+def parse_date_locally(date_string, today=None):
+    """Parse a date quote into YYYY-MM-DD with a deterministic multi-format parser, or return None."""
+    today = today or datetime.now()
+    cleaned = re.sub(r'(?i)\b(born on|born|dob|d\.o\.b\.|date of birth)\b[:\s]*', ' ', date_string)
+    cleaned = re.sub(r'(?i)(\d)(st|nd|rd|th)\b', r'\1', cleaned)
+    cleaned = ' '.join(cleaned.split()).strip(' .,;:()')
+    for date_format in DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(cleaned, date_format)
+        except ValueError:
+            continue
+        # %y reads 00-68 as 2000-2068; a birth year after this one belongs to the previous century
+        if '%y' in date_format and parsed.year > today.year:
+            parsed = parsed.replace(year=parsed.year - 100)
+        return parsed.strftime("%Y-%m-%d")
+    return None
+
+def calculate_age(birth_date, today=None):
+    """Age in whole years for a YYYY-MM-DD birth date; raises ValueError for a date in the future."""
+    today = today or datetime.now()
+    birth_date = datetime.strptime(birth_date, "%Y-%m-%d")
+    if birth_date.date() > today.date():
+        raise ValueError(f"Date of birth is in the future: {birth_date:%Y-%m-%d}")
+    age = today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+    return age
@@ -0,0 +1,101 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Precision, recall and latency report for the offline PHI pre-detector.
+
+Usage:
+  python evaluate_phi_detector.py [fixtures/phi_corpus.jsonl] [--repeats 200]
+
+Each corpus line is {"text": ..., "phi": [{"quote": ..., "info_type": ...}]}.
+Local precision is the share of locally redacted spans that overlap
+annotated PHI. Coverage recall is the share of annotated PHI that is either
+redacted locally or falls inside a window sent to DLP; PHI outside both
+would leak, so this should stay at 1.0. A document with no candidates is
+sent to DLP whole, so it is covered but saves nothing.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+
+import phi_detector
+
+def load_corpus(path):
+    documents = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            document = json.loads(line)
+            gold = []
+            for phi in document["phi"]:
+                start = document["text"].index(phi["quote"])
+                gold.append((start, start + len(phi["quote"]), phi["info_type"]))
+            documents.append((document["text"], gold))
+    return documents
+
+def overlaps(start, end, ranges):
+    return any(start < range_end and range_start < end for range_start, range_end in ranges)
+
+def contains(start, end, ranges):
+    return any(range_start <= start and end <= range_end for range_start, range_end in ranges)
+
+def main():
+    default_corpus = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "phi_corpus.jsonl")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", nargs="?", default=default_corpus)
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+
+    documents = load_corpus(args.corpus)
+    local_spans = local_true = gold_total = gold_covered = full_text = 0
+    characters = characters_sent = 0
+    latencies = []
+    for text, gold in documents:
+        timings = []
+        for _ in range(args.repeats):
+            start_time = time.perf_counter()
+            high_confidence, uncertain = phi_detector.detect(text)
+            windows = phi_detector.dlp_windows(text, uncertain)
+            timings.append(time.perf_counter() - start_time)
+        latencies.append(min(timings))
+
+        gold_ranges = [(start, end) for start, end, _ in gold]
+        local_ranges = [(span['start'], span['end']) for span in high_confidence]
+        local_spans += len(local_ranges)
+        local_true += sum(overlaps(start, end, gold_ranges) for start, end in local_ranges)
+        gold_total += len(gold)
+        for start, end, info_type in gold:
+            if overlaps(start, end, local_ranges) or contains(start, end, windows):
+                gold_covered += 1
+            else:
+                print(f"MISSED {info_type}: {text[start:end]!r} in {text[:60]!r}")
+        characters += len(text)
+        characters_sent += len(phi_detector.join_windows(text, windows)[0])
+        if not uncertain:
+            full_text += 1
+
+    latencies_us = sorted(latency * 1e6 for latency in latencies)
+    print(f"documents:            {len(documents)}")
+    print(f"local precision:      {local_true / local_spans if local_spans else 1.0:.3f} ({local_true}/{local_spans})")
+    print(f"coverage recall:      {gold_covered / gold_total if gold_total else 1.0:.3f} ({gold_covered}/{gold_total})")
+    print(f"full-text DLP calls:  {full_text}/{len(documents)}")
+    print(f"characters sent:      {characters_sent}/{characters} ({characters_sent / characters:.1%})")
+    print(f"latency p50 / p95:    {statistics.median(latencies_us):.0f} / "
+          f"{latencies_us[int(0.95 * (len(latencies_us) - 1))]:.0f} us per document")
+
+if __name__ == "__main__":
+    main()
@@ -13,13 +13,22 @@
 # limitations under the License.
 
 import functions_framework
-from flask import jsonify
+from flask import jsonify, Response
 from google.cloud import dlp_v2
 from google import genai
 from google.genai import types
 import json
-import re
-from datetime import datetime
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import phi_detector
+from date_of_birth import calculate_age, parse_date_locally
+from redaction import apply_redactions, inspect_until_complete, merge_chunk_findings, split_into_chunks
+from redaction_profiles import DEFAULT_REDACTION_PROFILE, REDACTION_PROFILES, inspect_request_for, table_item
+from request_trace import log, record_dlp_call, record_finding, start_trace, submit_in_context, timed
 
 # Initialize DLP client
 dlp_client = dlp_v2.DlpServiceClient()
@@ -31,146 +40,22 @@ client = genai.Client(
     location=os.environ.get('LOCATION', 'us-central1'),
 )
 
-def get_info_types():
-    """Get list of info types to redact, including DATE_OF_BIRTH."""
-    all_types = [
-        {"name": info_type}
-       for info_type in [
-            "EMAIL_ADDRESS",
-            "STREET_ADDRESS",
-            "LOCATION",
-            "DATE_OF_BIRTH",
-            "US_SOCIAL_SECURITY_NUMBER",
-            "PASSPORT",
-            "DRIVERS_LICENSE_NUMBER",
-            "PHONE_NUMBER",
-            "FIRST_NAME",
-            "LAST_NAME",
-            "PERSON_NAME",
-            "MEDICAL_RECORD_NUMBER",
-            "CREDIT_CARD_NUMBER",
-            "CREDIT_CARD_EXPIRATION_DATE",
-            "US_PASSPORT",
-            "UK_DRIVERS_LICENSE_NUMBER",
-            "AUSTRALIA_DRIVERS_LICENSE_NUMBER",
-            "CANADA_DRIVERS_LICENSE_NUMBER",
-            "GERMANY_DRIVERS_LICENSE_NUMBER",
-            "US_DRIVERS_LICENSE_NUMBER",
-            "IRELAND_DRIVING_LICENSE_NUMBER",
-            "UK_PASSPORT",
-            "FRANCE_DRIVERS_LICENSE_NUMBER",
-            "MEXICO_CURP_NUMBER",
-            "HONG_KONG_ID_NUMBER",
-            "TAIWAN_ID_NUMBER",
-            "BRAZIL_CPF_NUMBER",
-            "ARGENTINA_DNI_NUMBER",
-            "BELGIUM_NATIONAL_ID_CARD_NUMBER",
-            "ITALY_FISCAL_CODE",
-            "POLAND_PASSPORT",
-            "SOUTH_AFRICA_ID_NUMBER",
-            "US_STATE",
-            "US_EMPLOYER_IDENTIFICATION_NUMBER",
-            "GERMANY_PASSPORT",
-            "AUSTRALIA_MEDICARE_NUMBER",
-            "POLAND_PESEL_NUMBER",
-            "SPAIN_NIE_NUMBER",
-            "ITALY_PASSPORT",
-            "US_HEALTHCARE_NPI",
-            "CANADA_SOCIAL_INSURANCE_NUMBER",
-            "FINLAND_NATIONAL_ID_NUMBER",
-            "NETHERLANDS_BSN_NUMBER",
-            "NEW_ZEALAND_NHI_NUMBER",
-            "THAILAND_NATIONAL_ID_NUMBER",
-            "AUSTRALIA_PASSPORT",
-            "PERU_DNI_NUMBER",
-            "COLOMBIA_CDC_NUMBER",
-            "DENMARK_CPR_NUMBER",
-            "SPAIN_SOCIAL_SECURITY_NUMBER",
-            "SPAIN_DRIVERS_LICENSE_NUMBER",
-            "GERMANY_SCHUFA_ID",
-            "KOREA_RRN",
-            "NEW_ZEALAND_IRD_NUMBER",
-            "CANADA_OHIP",
-            "FRANCE_NIR",
-            "INDIA_GST_INDIVIDUAL",
-            "JAPAN_INDIVIDUAL_NUMBER",
-            "SPAIN_DNI_NUMBER",
-            "INDIA_PAN_INDIVIDUAL",
-            "IRELAND_PPSN",
-            "ARMENIA_PASSPORT",
-            "FRANCE_CNI",
-            "AUSTRALIA_TAX_FILE_NUMBER",
-            "UKRAINE_PASSPORT",
-            "MEXICO_PASSPORT",
-            "NETHERLANDS_PASSPORT",
-            "CHINA_RESIDENT_ID_NUMBER",
-            "CANADA_PASSPORT",
-            "UZBEKISTAN_PASSPORT",
-            "VENEZUELA_CDI_NUMBER",
-            "PARAGUAY_CIC_NUMBER",
-            "JAPAN_PASSPORT",
-            "TAIWAN_PASSPORT",
-            "UK_TAXPAYER_REFERENCE",
-            "IRELAND_EIRCODE",
-            "US_DEA_NUMBER",
-            "PORTUGAL_CDC_NUMBER",
-            "URUGUAY_CDI_NUMBER",
-            "SPAIN_NIF_NUMBER",
-            "GERMANY_IDENTITY_CARD_NUMBER",
-            "ISRAEL_IDENTITY_CARD_NUMBER",
-            "UK_NATIONAL_HEALTH_SERVICE_NUMBER",
-            "SWEDEN_NATIONAL_ID_NUMBER",
-            "FINANCIAL_ACCOUNT_NUMBER",
-            "DOD_ID_NUMBER",
-            "CHINA_PASSPORT",
-            "SCOTLAND_COMMUNITY_HEALTH_INDEX_NUMBER",
-            "US_INDIVIDUAL_TAXPAYER_IDENTIFICATION_NUMBER",
-            "US_ADOPTION_TAXPAYER_IDENTIFICATION_NUMBER",
-            "NORWAY_NI_NUMBER",
-            "IRELAND_PASSPORT",
-            "POLAND_NATIONAL_ID_NUMBER",
-            "AZERBAIJAN_PASSPORT",
-            "JAPAN_BANK_ACCOUNT",
-            "FINANCIAL_ID",
-            "VEHICLE_IDENTIFICATION_NUMBER",
-            "MARITAL_STATUS",
-            "IMMIGRATION_STATUS",
-            "RELIGIOUS_TERM",
-            "EMPLOYMENT_STATUS",
-            "COUNTRY_DEMOGRAPHIC",
-            "GEOGRAPHIC_DATA",
-            "LOCATION_COORDINATES",
-            "GENERIC_ID",
-            "TECHNICAL_ID",
-            "DOCUMENT_TYPE/FINANCE/REGULATORY",
-            "POLAND_PASSPORT",
-            "POLITICAL_TERM",
-            "WEAK_PASSWORD_HASH",
-            "XSRF_TOKEN",
-            "DOMAIN_NAME",
-            "US_TOLLFREE_PHONE_NUMBER",
-            "IRELAND_PPSN",
-            "PORTUGAL_NIB_NUMBER",
-            "SINGAPORE_NATIONAL_REGISTRATION_ID_NUMBER",
-            "PORTUGAL_SOCIAL_SECURITY_NUMBER",
-            "UK_NATIONAL_INSURANCE_NUMBER",
-            "AMERICAN_BANKERS_CUSIP_ID",
-            "CHILE_CDI_NUMBER",
-            "US_BANK_ROUTING_MICR",
-            "KOREA_ARN",
-            "SECURITY_DATA",
-            "US_PREPARER_TAXPAYER_IDENTIFICATION_NUMBER",
-            "US_VEHICLE_IDENTIFICATION_NUMBER",
-            "FINANCIAL_ID",
-            "ICCID_NUMBER",
-            "MALE_NAME",
-            "FEMALE_NAME",
-            "ADVERTISING_ID",
-        ]
-    ]
-    return all_types
+# Run the offline pre-detector first and send DLP only the uncertain windows
+REDACTION_PREDETECT = os.environ.get('REDACTION_PREDETECT', 'false').lower() == 'true'
 
-def standardize_date(date_string):
+# Texts longer than REDACTION_CHUNK_CHARS are split on sentence boundaries and inspected in parallel
+REDACTION_CHUNK_CHARS = int(os.environ.get('REDACTION_CHUNK_CHARS', '50000'))
+REDACTION_CHUNK_OVERLAP = int(os.environ.get('REDACTION_CHUNK_OVERLAP', '200'))
+REDACTION_MAX_WORKERS = int(os.environ.get('REDACTION_MAX_WORKERS', '8'))
+
+# Batch endpoint: documents redacted concurrently, short ones packed into DLP tables
+REDACTION_BATCH_WORKERS = int(os.environ.get('REDACTION_BATCH_WORKERS', '4'))
+REDACTION_BATCH_MAX_DOCUMENTS = int(os.environ.get('REDACTION_BATCH_MAX_DOCUMENTS', '1000'))
+REDACTION_PACK_DOCUMENT_CHARS = int(os.environ.get('REDACTION_PACK_DOCUMENT_CHARS', '2000'))
+REDACTION_PACK_TABLE_CHARS = int(os.environ.get('REDACTION_PACK_TABLE_CHARS', '50000'))
+
+@lru_cache(maxsize=1024)
+def standardize_date_with_gemini(date_string):
     prompt = f"""
     Convert the following date to YYYY-MM-DD format: {date_string}
     
@@ -198,100 +83,176 @@ def standardize_date(date_string):
         raise ValueError("Invalid date format")
     return standardized_date
 
-def calculate_age(birth_date):
-    today = datetime.now()
-    birth_date = datetime.strptime(birth_date, "%Y-%m-%d")
-    age = today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
-    return age
-
-def deidentify_content(project_id, text):
-    """Deidentify sensitive content using DLP API and Gemini for date processing."""
-    if not text:
-        return text
-
-    print(f"Original text: {text}")
-
-    # Get info types for redaction
-    info_types = get_info_types()
-    print(f"Info types used for identification: {[t['name'] for t in info_types]}")
-
-    # Set up DLP API request for inspection
-    inspect_config = {
-        "info_types": info_types,
-        "min_likelihood": dlp_v2.Likelihood.LIKELY,
-        "include_quote": True,
-    }
+def standardize_date(date_string):
+    """Return the date as YYYY-MM-DD, using Gemini only for formats the local parser cannot read."""
+    standardized_date = parse_date_locally(date_string)
+    if standardized_date:
+        return standardized_date
+    log(f"Falling back to Gemini to standardize date: {date_string}")
+    return standardize_date_with_gemini(date_string)
+
+def inspect_once(project_id, text, profile=None):
+    """Run one DLP inspection; returns (findings, truncated) with findings as (info_type, quote, start, end) tuples."""
+    inspect_request = inspect_request_for(project_id, text, profile)
+    log("Calling DLP API for content inspection")
+    start_time = time.perf_counter()
+    inspect_response = dlp_client.inspect_content(request=inspect_request)
+    findings = []
+    for finding in inspect_response.result.findings:
+        codepoint_range = finding.location.codepoint_range
+        findings.append((finding.info_type.name, finding.quote, codepoint_range.start, codepoint_range.end))
+    record_dlp_call(len(text), len(findings), time.perf_counter() - start_time)
+    if inspect_response.result.findings_truncated:
+        log(f"DLP truncated the findings for {len(text)} characters; re-inspecting in halves")
+    return findings, inspect_response.result.findings_truncated
+
+def inspect_chunk(project_id, text, profile=None):
+    """Inspect text with DLP and return all its findings as (info_type, quote, start, end) tuples.
+
+    A result DLP truncated is re-inspected in halves until none is, so a
+    dense note never leaves PHI past the findings cap unredacted; raises
+    RuntimeError if that is not possible.
+    """
+    log(f"Redaction profile: {profile or DEFAULT_REDACTION_PROFILE}")
+    return inspect_until_complete(lambda part: inspect_once(project_id, part, profile), text, REDACTION_CHUNK_OVERLAP)
 
-    # Use DLP to find all instances of sensitive information
-    item = {"value": text}
-    parent = f"projects/{project_id}"
-    inspect_request = {
-        "parent": parent,
-        "inspect_config": inspect_config,
-        "item": item,
-    }
+def inspect_findings(project_id, text, profile=None, max_workers=None):
+    """Inspect text with DLP, splitting long texts into overlapping chunks inspected concurrently.
 
-    print("Calling DLP API for content inspection")
+    Chunks share the module-level DLP client, whose gRPC channel
+    multiplexes the concurrent calls, and are merged by
+    merge_chunk_findings. Each chunk goes through inspect_chunk, so a
+    chunk whose findings DLP truncated is itself split and re-inspected.
+    """
+    if len(text) <= REDACTION_CHUNK_CHARS:
+        return inspect_chunk(project_id, text, profile)
+
+    chunks = split_into_chunks(text, REDACTION_CHUNK_CHARS, REDACTION_CHUNK_OVERLAP)
+    workers = max(1, min(int(max_workers or REDACTION_MAX_WORKERS), len(chunks)))
+    log(f"Inspecting {len(text)} characters as {len(chunks)} chunks with {workers} workers")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [submit_in_context(executor, inspect_chunk, project_id, text[start:end], profile) for start, end in chunks]
+        chunk_findings = [future.result() for future in futures]
+    return merge_chunk_findings(text, chunks, chunk_findings)
+
+def inspect_table(project_id, texts, profile=None):
+    """Inspect several short documents in one DLP call by packing them into table rows.
+
+    Returns one list of (info_type, quote, start, end, source) findings per
+    document; offsets are relative to the document's own cell. Raises
+    RuntimeError if DLP truncated the findings, so callers can fall back
+    to inspecting the documents one at a time.
+    """
+    inspect_request = inspect_request_for(project_id, table_item(texts), profile)
+    log(f"Calling DLP API for {len(texts)} documents packed into one table")
+    start_time = time.perf_counter()
     inspect_response = dlp_client.inspect_content(request=inspect_request)
-
-    # Process each finding
+    if inspect_response.result.findings_truncated:
+        raise RuntimeError("DLP truncated the findings for a packed table")
+    row_findings = [[] for _ in texts]
     for finding in inspect_response.result.findings:
-        info_type = finding.info_type.name
-        quote = finding.quote
-        print(f"Found {info_type}: {quote}")
+        codepoint_range = finding.location.codepoint_range
+        for content_location in finding.location.content_locations:
+            row_index = content_location.record_location.table_location.row_index
+            row_findings[row_index].append(
+                (finding.info_type.name, finding.quote, codepoint_range.start, codepoint_range.end, 'dlp')
+            )
+    record_dlp_call(sum(len(text) for text in texts), len(inspect_response.result.findings), time.perf_counter() - start_time)
+    return row_findings
+
+def predetected_findings(project_id, text, profile=None):
+    """Redact high-confidence hits locally and send only windows around uncertain candidates to DLP.
+
+    A text with no uncertain candidates is still inspected whole: the
+    detector's dictionaries cannot prove a text free of names or places.
+    """
+    with timed('predetect'):
+        high_confidence, uncertain = phi_detector.detect(text)
+    findings = [(span['info_type'], span['quote'], span['start'], span['end'], 'local') for span in high_confidence]
+    log(f"Pre-detector: {len(high_confidence)} local findings, {len(uncertain)} uncertain candidates")
+    if not uncertain:
+        log("No uncertain candidates; sending the full text to DLP")
+
+    windows = phi_detector.dlp_windows(text, uncertain)
+    joined_text, window_table = phi_detector.join_windows(text, windows)
+    log(f"Sending {len(windows)} windows ({len(joined_text)} of {len(text)} characters) to DLP")
+    for info_type, quote, start, end in inspect_findings(project_id, joined_text, profile):
+        original_range = phi_detector.map_range(window_table, start, end)
+        if original_range is not None:
+            findings.append((info_type, quote, *original_range, 'dlp'))
+    return findings
+
+def inspect_and_redact(project_id, text, predetect=None, profile=None):
+    """Inspect text with a single DLP call and redact it locally.
+
+    With predetect (default REDACTION_PREDETECT), the offline pre-detector
+    shrinks the DLP call to the windows around its candidates. Returns (redacted_text, span_map), or
+    (None, []) if DLP fails.
+    """
+    log(f"Original text: {text}")
+    if predetect is None:
+        predetect = REDACTION_PREDETECT
+
+    try:
+        with timed('inspect'):
+            if predetect:
+                findings = predetected_findings(project_id, text, profile)
+            else:
+                findings = [(*finding, 'dlp') for finding in inspect_findings(project_id, text, profile)]
+    except Exception as e:
+        log(f"Error in deidentify_content: {str(e)}")
+        return None, []  # Return None instead of raising an exception
+    return redact_findings(text, findings)
+
+def redact_findings(text, findings):
+    """Redact (info_type, quote, start, end, source) findings from text; returns (redacted_text, span_map)."""
+    # Turn each finding into a replacement span at its codepoint offsets
+    spans = []
+    redacted_counts = Counter()
+    for info_type, quote, start, end, source in findings:
+        log(f"Found {info_type}: {quote}")
+        record_finding(info_type, start, end, source)
 
         if info_type == "DATE_OF_BIRTH":
             try:
                 standardized_date = standardize_date(quote)
                 age = calculate_age(standardized_date)
-                text = text.replace(quote, f"Age: {age}")
-                print(f"Replaced DATE_OF_BIRTH with age: {age}")
+                replacement = f"Age: {age}"
+                log(f"Replaced DATE_OF_BIRTH with age: {age}")
             except Exception as e:
-                print(f"Error processing DATE_OF_BIRTH: {str(e)}")
-                text = text.replace(quote, "[REDACTED DATE_OF_BIRTH]")
-                print(f"Redacted DATE_OF_BIRTH due to processing error")
-
-    # Set up DLP API request for deidentification of remaining sensitive information
-    deidentify_config = {
-        "info_type_transformations": {
-            "transformations": [
-                {
-                    "primitive_transformation": {
-                        "replace_config": {
-                            "new_value": {
-                                "string_value": "[REDACTED]"
-                            }
-                        }
-                    }
-                }
-            ]
-        }
-    }
-
-    deidentify_request = {
-        "parent": parent,
-        "deidentify_config": deidentify_config,
-        "inspect_config": inspect_config,
-        "item": {"value": text},
-    }
-
-    try:
-        print("Calling DLP API for content deidentification")
-        deidentify_response = dlp_client.deidentify_content(request=deidentify_request)
-        
-        print("DLP API Deidentification Response:")
-        if hasattr(deidentify_response, 'overview') and hasattr(deidentify_response.overview, 'transformed_overview'):
-            for transformation in deidentify_response.overview.transformed_overview.transformation_summaries:
-                print(f"  Info type redacted: {transformation.info_type.name}")
-                print(f"  Occurrences: {transformation.transformed_count}")
+                log(f"Error processing DATE_OF_BIRTH: {str(e)}")
+                replacement = "[REDACTED DATE_OF_BIRTH]"
+                log(f"Redacted DATE_OF_BIRTH due to processing error")
         else:
-            print("  No transformation overview available in the response.")
-        
-        print(f"Final redacted text: {deidentify_response.item.value}")
-        return deidentify_response.item.value
-    except Exception as e:
-        print(f"Error in deidentify_content: {str(e)}")
-        return None  # Return None instead of raising an exception
+            replacement = "[REDACTED]"
+            redacted_counts[info_type] += 1
+        spans.append({
+            'start': start,
+            'end': end,
+            'replacement': replacement,
+            'info_type': info_type,
+        })
+
+    with timed('apply'):
+        redacted_text, span_map = apply_redactions(text, spans)
+
+    log("Local redaction summary:")
+    if redacted_counts:
+        for info_type, count in redacted_counts.items():
+            log(f"  Info type redacted: {info_type}")
+            log(f"  Occurrences: {count}")
+    else:
+        log("  No other sensitive information redacted.")
+
+    log(f"Final redacted text: {redacted_text}")
+    return redacted_text, span_map
+
+def deidentify_content(project_id, text):
+    """Deidentify sensitive content using DLP, with ages substituted for dates of birth."""
+    if not text:
+        return text
+    redacted_text, _ = inspect_and_redact(project_id, text)
+    return redacted_text
 
 @functions_framework.http
 def redact_sensitive_info(request):
@@ -311,11 +272,6 @@ def redact_sensitive_info(request):
         'Content-Type': 'application/json'
     }
 
-    debug_info = []
-
-    def capture_print(message):
-        debug_info.append(str(message))
-
     try:
         request_json = request.get_json()
         print("Received request for redaction")
@@ -330,43 +286,210 @@ def redact_sensitive_info(request):
             print("No text provided for redaction")
             return jsonify({'error': 'No text provided'}), 400, headers
 
-        # Redirect print statements to capture_print
-        import builtins
-        original_print = builtins.print
-        builtins.print = capture_print
+        profile = request_json.get('profile')
+        if profile and profile not in REDACTION_PROFILES:
+            return jsonify({'error': f"Unknown profile: {profile}"}), 400, headers
+    except Exception as e:
+        print(f"Error in redact_sensitive_info: {str(e)}")
+        return jsonify({'error': str(e), 'debugInfo': []}), 500, headers
+
+    # Debug output goes to this request's trace, so concurrent requests never mix their logs
+    with start_trace() as trace:
+        try:
+            # Redact sensitive information using project ID from environment
+            project_id = os.environ.get('DLP_PROJECT_ID', os.environ.get('PROJECT_ID', 'gemini-med-lit-review'))
+            redacted_text, span_map = inspect_and_redact(project_id, text, request_json.get('predetect'), profile)
+
+            if redacted_text is None:
+                return jsonify({
+                    'success': False,
+                    'error': 'Failed to redact text',
+                    'debugInfo': trace.lines,
+                    'trace': trace.summary()
+                }), 500, headers
+
+            identified_info_types = trace.identified_info_types()
+            print(f"Identified info types: {identified_info_types}")
+
+            return jsonify({
+                'success': True,
+                'redactedText': redacted_text,
+                'redactedSpans': span_map,
+                'debugInfo': trace.lines,
+                'identifiedInfoTypes': identified_info_types,
+                'trace': trace.summary()
+            }), 200, headers
+
+        except Exception as e:
+            print(f"Error in redact_sensitive_info: {str(e)}")
+            return jsonify({'error': str(e), 'debugInfo': trace.lines}), 500, headers
+
+def parse_batch_documents(request, request_json):
+    """Return [(id, text, error)] from a JSON "documents" array or an NDJSON body.
+
+    Each document is a string or an object with "text" and an optional
+    "id"; a malformed entry gets an error instead of failing the batch.
+    """
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        entries = []
+        for line in request.get_data(as_text=True).splitlines():
+            if not line.strip():
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError as e:
+                entries.append(ValueError(f"Invalid JSON line: {str(e)}"))
+    else:
+        entries = (request_json or {}).get('documents') or []
+
+    documents = []
+    for index, entry in enumerate(entries):
+        if isinstance(entry, Exception):
+            documents.append((index, None, str(entry)))
+        elif isinstance(entry, str):
+            documents.append((index, entry, None if entry else 'No text provided'))
+        elif isinstance(entry, dict) and isinstance(entry.get('text'), str) and entry['text']:
+            documents.append((entry.get('id', index), entry['text'], None))
+        else:
+            documents.append((entry.get('id', index) if isinstance(entry, dict) else index, None, 'No text provided'))
+    return documents
+
+def pack_documents(documents, predetect):
+    """Group document indices into DLP calls: short documents share a table, the rest go alone."""
+    groups = []
+    current = []
+    current_chars = 0
+    for index, (_, text, error) in enumerate(documents):
+        if error:
+            continue
+        if predetect or len(text) > REDACTION_PACK_DOCUMENT_CHARS:
+            groups.append([index])
+            continue
+        if current and current_chars + len(text) > REDACTION_PACK_TABLE_CHARS:
+            groups.append(current)
+            current = []
+            current_chars = 0
+        current.append(index)
+        current_chars += len(text)
+    if current:
+        groups.append(current)
+    return groups
+
+def document_result(document_id, redacted_text, span_map, trace):
+    if redacted_text is None:
+        return {'id': document_id, 'success': False, 'error': 'Failed to redact text', 'trace': trace.summary()}
+    return {
+        'id': document_id,
+        'success': True,
+        'redactedText': redacted_text,
+        'redactedSpans': span_map,
+        'identifiedInfoTypes': trace.identified_info_types(),
+        'trace': trace.summary()
+    }
 
-        # Redact sensitive information using project ID from environment
-        project_id = os.environ.get('DLP_PROJECT_ID', os.environ.get('PROJECT_ID', 'gemini-med-lit-review'))
-        redacted_text = deidentify_content(project_id, text)
+def redact_document(project_id, document_id, text, predetect, profile):
+    with start_trace() as trace:
+        redacted_text, span_map = inspect_and_redact(project_id, text, predetect, profile)
+        return document_result(document_id, redacted_text, span_map, trace)
+
+def redact_group(project_id, documents, group, predetect, profile):
+    """Redact one group from pack_documents; returns {index: result}."""
+    if len(group) > 1:
+        texts = [documents[index][1] for index in group]
+        try:
+            row_findings = inspect_table(project_id, texts, profile)
+        except Exception as e:
+            print(f"Packed DLP call failed, redacting {len(group)} documents one at a time: {str(e)}")
+        else:
+            results = {}
+            for index, text, findings in zip(group, texts, row_findings):
+                with start_trace() as trace:
+                    redacted_text, span_map = redact_findings(text, findings)
+                    results[index] = document_result(documents[index][0], redacted_text, span_map, trace)
+            return results
+    return {
+        index: redact_document(project_id, documents[index][0], documents[index][1], predetect, profile)
+        for index in group
+    }
 
-        # Restore original print function
-        builtins.print = original_print
+def stream_batch_results(project_id, documents, predetect, profile):
+    """Yield one NDJSON line per document, in input order, as soon as its group is done."""
+    groups = pack_documents(documents, predetect)
+    executor = ThreadPoolExecutor(max_workers=max(1, REDACTION_BATCH_WORKERS))
+    try:
+        futures = [submit_in_context(executor, redact_group, project_id, documents, group, predetect, profile) for group in groups]
+        future_for_index = {index: future for future, group in zip(futures, groups) for index in group}
+        for index, (document_id, _, error) in enumerate(documents):
+            if error:
+                result = {'id': document_id, 'success': False, 'error': error}
+            else:
+                try:
+                    result = future_for_index[index].result()[index]
+                except Exception as e:
+                    result = {'id': document_id, 'success': False, 'error': str(e)}
+            yield json.dumps({'index': index, **result}) + '\n'
+    except GeneratorExit:
+        print(f"Client disconnected; cancelling queued redactions for a batch of {len(documents)} documents")
+        raise
+    finally:
+        # Drop queued groups instead of waiting for them when the client disconnects
+        executor.shutdown(wait=False, cancel_futures=True)
 
-        if redacted_text is None:
-            return jsonify({
-                'success': False,
-                'error': 'Failed to redact text',
-                'debugInfo': debug_info
-            }), 500, headers
+@functions_framework.http
+def redact_sensitive_info_batch(request):
+    """HTTP Cloud Function for redacting many documents in one request.
 
-        # Extract identified info types from debug_info
-        identified_info_types = [line.split(': ')[1] for line in debug_info if line.startswith('Found ')]
-        
-        # Print identified info types
-        print(f"Identified info types: {identified_info_types}")
+    Accepts {"documents": [...], "profile": ..., "predetect": ...} or an
+    NDJSON body (options then come from the query string) and streams back
+    one NDJSON result per document in input order. Unlike the single-text
+    endpoint, results carry no debugInfo, which would echo the originals.
+    """
+    if request.method == 'OPTIONS':
+        headers = {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': 'POST',
+            'Access-Control-Allow-Headers': 'Content-Type',
+            'Access-Control-Max-Age': '3600'
+        }
+        return ('', 204, headers)
 
-        return jsonify({
-            'success': True,
-            'redactedText': redacted_text,
-            'debugInfo': debug_info,
-            'identifiedInfoTypes': identified_info_types
-        }), 200, headers
+    headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Content-Type': 'application/json'
+    }
 
+    try:
+        request_json = None if request.mimetype in ('application/x-ndjson', 'application/jsonl') else request.get_json(silent=True)
+        options = request_json if request_json is not None else request.args
+        documents = parse_batch_documents(request, request_json)
     except Exception as e:
-        print(f"Error in redact_sensitive_info: {str(e)}")
-        # Restore original print function in case of exception
-        builtins.print = original_print
-        return jsonify({'error': str(e), 'debugInfo': debug_info}), 500, headers
+        print(f"Error in redact_sensitive_info_batch: {str(e)}")
+        return jsonify({'error': str(e)}), 400, headers
+
+    if not documents:
+        return jsonify({'error': 'No documents provided'}), 400, headers
+    if len(documents) > REDACTION_BATCH_MAX_DOCUMENTS:
+        return jsonify({'error': f"At most {REDACTION_BATCH_MAX_DOCUMENTS} documents per request"}), 400, headers
+
+    profile = options.get('profile')
+    if profile and profile not in REDACTION_PROFILES:
+        return jsonify({'error': f"Unknown profile: {profile}"}), 400, headers
+    predetect = options.get('predetect')
+    if isinstance(predetect, str):
+        predetect = predetect.lower() == 'true'
+    elif predetect is None:
+        predetect = REDACTION_PREDETECT
+
+    print(f"Received batch of {len(documents)} documents for redaction")
+    project_id = os.environ.get('DLP_PROJECT_ID', os.environ.get('PROJECT_ID', 'gemini-med-lit-review'))
+    return Response(
+        stream_batch_results(project_id, documents, predetect, profile),
+        headers={
+            'Access-Control-Allow-Origin': '*',
+            'Content-Type': 'application/x-ndjson',
+            'Cache-Control': 'no-cache'
+        }
+    )
 
 
 if __name__ == "__main__":
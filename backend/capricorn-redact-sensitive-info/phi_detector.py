@@ -0,0 +1,280 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Offline PHI pre-detector that runs before DLP.
+
+Regexes find high-confidence identifiers (emails, phone numbers, SSNs,
+labelled MRNs and dates of birth), which are redacted locally. An
+Aho-Corasick automaton over name, location and demographic dictionaries,
+plus patterns for unlabelled dates, titled names and long ID-like numbers,
+finds uncertain candidates. The candidate patterns are deliberately
+over-inclusive (capitalized words outside sentence starts, lower-case
+addresses, age and place phrases) so names and places missing from the
+dictionaries still open a window. Only windows around candidates are sent
+to DLP; a text with no candidates is sent to DLP whole, never skipped.
+
+Spans use the same dicts as redaction.apply_redactions. Extra dictionary
+terms can be loaded from PHI_DICTIONARY_DIR (names.txt, locations.txt,
+terms.txt, one entry per line).
+"""
+
+import bisect
+import os
+import re
+from collections import deque
+
+FIRST_NAMES = [
+    "james", "john", "robert", "michael", "william", "david", "richard", "joseph", "thomas", "charles",
+    "daniel", "matthew", "anthony", "mark", "steven", "paul", "andrew", "joshua", "kevin", "brian",
+    "mary", "patricia", "jennifer", "linda", "elizabeth", "barbara", "susan", "jessica", "sarah", "karen",
+    "emily", "emma", "olivia", "sophia", "isabella", "mia", "ava", "charlotte", "amelia", "harper",
+    "liam", "noah", "oliver", "elijah", "lucas", "mason", "ethan", "logan", "jacob", "aiden",
+    "maria", "jose", "juan", "carlos", "luis", "ana", "sofia", "mohammed", "ahmed", "fatima",
+    "amina", "aisha", "wei", "li", "chen", "hiroshi", "yuki", "priya", "raj", "arjun",
+    "lars", "sven", "ingrid", "pierre", "marie", "hans", "anna", "giulia", "marco", "olga",
+]
+
+LAST_NAMES = [
+    "smith", "johnson", "williams", "brown", "jones", "garcia", "miller", "davis", "rodriguez", "martinez",
+    "hernandez", "lopez", "gonzalez", "wilson", "anderson", "taylor", "moore", "jackson", "martin", "lee",
+    "thompson", "white", "harris", "clark", "lewis", "robinson", "walker", "young", "allen", "king",
+    "nguyen", "kim", "patel", "singh", "wang", "zhang", "liu", "yusuf", "berg", "muller",
+    "doe", "rossi", "dubois", "novak", "kowalski", "tanaka", "sato", "okafor", "mensah", "silva",
+]
+
+LOCATIONS = [
+    "alabama", "alaska", "arizona", "arkansas", "california", "colorado", "connecticut", "delaware",
+    "florida", "georgia", "hawaii", "idaho", "illinois", "indiana", "iowa", "kansas", "kentucky",
+    "louisiana", "maine", "maryland", "massachusetts", "michigan", "minnesota", "mississippi",
+    "missouri", "montana", "nebraska", "nevada", "new hampshire", "new jersey", "new mexico",
+    "new york", "north carolina", "north dakota", "ohio", "oklahoma", "oregon", "pennsylvania",
+    "rhode island", "south carolina", "south dakota", "tennessee", "texas", "utah", "vermont",
+    "virginia", "washington", "west virginia", "wisconsin", "wyoming",
+    "boston", "chicago", "houston", "los angeles", "san francisco", "seattle", "philadelphia",
+    "london", "paris", "berlin", "amsterdam", "madrid", "rome", "dublin", "toronto", "sydney",
+    "mumbai", "delhi", "beijing", "shanghai", "tokyo", "seoul", "mexico city", "sao paulo",
+]
+
+# Lower-case terms behind the demographic DLP info types (marital, employment, religion, immigration)
+SENSITIVE_TERMS = [
+    "married", "divorced", "widowed", "widow", "widower", "separated", "single mother", "single father",
+    "unemployed", "retired", "self-employed", "homeless",
+    "catholic", "protestant", "christian", "muslim", "jewish", "hindu", "buddhist", "sikh",
+    "jehovah's witness", "mormon",
+    "refugee", "asylum", "undocumented", "immigrant",
+]
+
+DATE = (
+    r"(?:\d{4}[-/.]\d{1,2}[-/.]\d{1,2}"
+    r"|\d{1,2}[-/.]\d{1,2}[-/.]\d{2,4}"
+    r"|(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?\s+\d{1,2}(?:st|nd|rd|th)?,?\s+\d{4}"
+    r"|\d{1,2}(?:st|nd|rd|th)?\s+(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?,?\s+\d{4})"
+)
+
+# (info_type, pattern, group) redacted locally without asking DLP
+HIGH_CONFIDENCE_PATTERNS = [
+    ("EMAIL_ADDRESS", re.compile(r"\b[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b"), 0),
+    ("US_SOCIAL_SECURITY_NUMBER", re.compile(r"(?<![\w-])\d{3}-\d{2}-\d{4}(?![\w-])"), 0),
+    ("PHONE_NUMBER", re.compile(r"(?<![\w-])(?:\+?1[\s.-]?)?(?:\(\d{3}\)\s?|\d{3}[\s.-])\d{3}[\s.-]\d{4}(?![\w-])"), 0),
+    ("MEDICAL_RECORD_NUMBER", re.compile(r"(?i)\b(?:MRN|medical record(?: number| no\.?| #)?)\s*[:#]?\s*([A-Z0-9][A-Z0-9-]{4,})\b"), 1),
+    ("DATE_OF_BIRTH", re.compile(rf"(?i)\b(?:DOB|D\.O\.B\.|date of birth|birth ?date|born(?: on)?)\s*[:\-]?\s*({DATE})"), 1),
+]
+
+# (info_type, pattern) whose matches are only candidates for DLP
+UNCERTAIN_PATTERNS = [
+    ("DATE", re.compile(rf"(?i)(?<![\w/.-]){DATE}(?![\w/-])")),
+    ("PERSON_NAME", re.compile(r"\b(?:Mr|Mrs|Ms|Miss|Dr|Prof)\.?\s+[A-Z][a-zA-Z'-]+(?:\s+[A-Z][a-zA-Z'-]+)?")),
+    ("GENERIC_ID", re.compile(r"(?<![\w.])[A-Z]{0,3}\d{6,}(?![\w.])")),
+    ("STREET_ADDRESS", re.compile(r"(?i)\b\d{1,5}\s+(?:[a-z]+\s+){1,3}(?:street|st|avenue|ave|road|rd|boulevard|blvd|lane|ln|drive|dr|court|ct|way|place|pl)\b\.?")),
+    ("AGE", re.compile(r"(?i)\b\d{1,3}[\s-]+(?:years?|yrs?|months?|weeks?|days?)[\s-]+old\b")),
+    ("LOCATION", re.compile(r"\b(?i:from|lives (?:in|at|on)|living in|resides (?:in|at)|resident of|born in|moved to|seen at|admitted to|referred from)\s+[A-Za-z][\w.'-]*(?:\s+[A-Z][\w.'-]*){0,3}")),
+]
+
+# Runs of capitalized words; a single word is a candidate unless it starts a sentence
+CAPITALIZED_RUN = re.compile(r"\b[A-Z][a-z][a-zA-Z'-]*(?:\s+[A-Z][a-z][a-zA-Z'-]*)*")
+
+# Abbreviations whose trailing period does not end a sentence
+ABBREVIATIONS = ("st.", "mt.", "ft.", "dr.", "mr.", "mrs.", "ms.", "prof.", "jr.", "sr.")
+
+def starts_sentence(text, start):
+    preceding = text[:start].rstrip()
+    if not preceding:
+        return True
+    if preceding[-1] == "." and preceding.lower().endswith(ABBREVIATIONS):
+        return False
+    return preceding[-1] in ".!?:;\"\n" or text[len(preceding):start].count("\n") > 0
+
+class AhoCorasick:
+    """Aho-Corasick automaton over lower-cased keywords.
+
+    Matches are reported only on word boundaries, so a dictionary entry is
+    never found inside a longer word.
+    """
+
+    def __init__(self, keywords):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for keyword, label in keywords:
+            self._add(keyword.lower(), label)
+        self._build()
+
+    def _add(self, keyword, label):
+        state = 0
+        for char in keyword:
+            if char not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[state][char] = len(self.goto) - 1
+            state = self.goto[state][char]
+        self.output[state].append((len(keyword), label))
+
+    def _build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def find(self, text):
+        """Yield (start, end, label) for each whole-word keyword match."""
+        lowered = text.lower()
+        state = 0
+        for index, char in enumerate(lowered):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            if not self.output[state]:
+                continue
+            end = index + 1
+            if end < len(lowered) and (lowered[end].isalnum() or lowered[end] == "'"):
+                continue
+            for length, label in self.output[state]:
+                start = end - length
+                if start > 0 and (lowered[start - 1].isalnum() or lowered[start - 1] == "'"):
+                    continue
+                yield start, end, label
+
+def load_dictionary_file(name):
+    directory = os.environ.get("PHI_DICTIONARY_DIR")
+    if not directory:
+        return []
+    path = os.path.join(directory, name)
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+def build_automaton():
+    keywords = []
+    for name in FIRST_NAMES + LAST_NAMES + load_dictionary_file("names.txt"):
+        keywords.append((name, "PERSON_NAME"))
+    for location in LOCATIONS + load_dictionary_file("locations.txt"):
+        keywords.append((location, "LOCATION"))
+    for term in SENSITIVE_TERMS + load_dictionary_file("terms.txt"):
+        keywords.append((term, "DEMOGRAPHIC_TERM"))
+    return AhoCorasick(keywords)
+
+automaton = build_automaton()
+
+def detect(text):
+    """Return (high_confidence, uncertain) span lists for the text.
+
+    High-confidence spans carry the info_type and quote that DLP would
+    report; uncertain spans only mark where DLP should look.
+    """
+    high_confidence = []
+    for info_type, pattern, group in HIGH_CONFIDENCE_PATTERNS:
+        for match in pattern.finditer(text):
+            start, end = match.span(group)
+            high_confidence.append({'start': start, 'end': end, 'info_type': info_type, 'quote': text[start:end]})
+
+    covered = sorted((span['start'], span['end']) for span in high_confidence)
+    covered_starts = [start for start, _ in covered]
+
+    def is_covered(start, end):
+        index = bisect.bisect_right(covered_starts, start) - 1
+        return index >= 0 and covered[index][1] >= end
+
+    uncertain = []
+    for info_type, pattern in UNCERTAIN_PATTERNS:
+        for match in pattern.finditer(text):
+            if not is_covered(*match.span()):
+                uncertain.append({'start': match.start(), 'end': match.end(), 'info_type': info_type})
+    for match in CAPITALIZED_RUN.finditer(text):
+        if " " not in match.group() and starts_sentence(text, match.start()):
+            continue
+        if not is_covered(*match.span()):
+            uncertain.append({'start': match.start(), 'end': match.end(), 'info_type': 'PROPER_NOUN'})
+    for start, end, label in automaton.find(text):
+        # Names and places are proper nouns; lower-case hits ("will", "may", "georgia" in prose) are skipped
+        if label != "DEMOGRAPHIC_TERM" and not text[start].isupper():
+            continue
+        if not is_covered(start, end):
+            uncertain.append({'start': start, 'end': end, 'info_type': label})
+    return high_confidence, uncertain
+
+def candidate_windows(text, uncertain, margin=40):
+    """Merge uncertain spans, padded by margin characters and widened to whole words, into windows."""
+    windows = []
+    for span in sorted(uncertain, key=lambda span: span['start']):
+        start = max(0, span['start'] - margin)
+        end = min(len(text), span['end'] + margin)
+        while start > 0 and not text[start - 1].isspace():
+            start -= 1
+        while end < len(text) and not text[end].isspace():
+            end += 1
+        if windows and start <= windows[-1][1]:
+            windows[-1][1] = max(windows[-1][1], end)
+        else:
+            windows.append([start, end])
+    return [tuple(window) for window in windows]
+
+def dlp_windows(text, uncertain, margin=40):
+    """Windows to send to DLP: those around the uncertain spans, or the whole text when there are none."""
+    if not uncertain:
+        return [(0, len(text))]
+    return candidate_windows(text, uncertain, margin)
+
+WINDOW_SEPARATOR = "\n\n"
+
+def join_windows(text, windows):
+    """Join windows into one DLP item; returns (joined_text, window_table) for map_offset."""
+    parts = []
+    window_table = []
+    joined_length = 0
+    for start, end in windows:
+        if parts:
+            parts.append(WINDOW_SEPARATOR)
+            joined_length += len(WINDOW_SEPARATOR)
+        window_table.append((joined_length, start, end - start))
+        parts.append(text[start:end])
+        joined_length += end - start
+    return ''.join(parts), window_table
+
+def map_range(window_table, start, end):
+    """Map a [start, end) range of the joined text back to the original text, or None if it spans a separator."""
+    index = bisect.bisect_right([joined_start for joined_start, _, _ in window_table], start) - 1
+    if index < 0:
+        return None
+    joined_start, original_start, length = window_table[index]
+    if end - joined_start > length:
+        return None
+    return original_start + start - joined_start, original_start + end - joined_start
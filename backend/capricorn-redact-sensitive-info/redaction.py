@@ -0,0 +1,182 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Offset-based redaction applier.
+
+Findings are spans of the original text: dicts with `start` and `end`
+codepoint offsets, the `replacement` string and the `info_type`. They are
+sorted, overlapping spans are merged, and the output is built in one
+linear pass, so each finding replaces exactly the occurrence DLP located.
+
+split_into_chunks cuts long documents on sentence boundaries, with
+overlapping windows, so they can be inspected in parallel, and
+merge_chunk_findings maps the chunks' findings back onto the document.
+inspect_until_complete re-inspects a text in halves whenever DLP reports
+that it truncated the findings, so no PHI past the cap goes unredacted.
+"""
+
+import bisect
+import re
+
+REDACTED = "[REDACTED]"
+
+# End of a sentence or line; a chunk may end right after one of these
+SENTENCE_BOUNDARY = re.compile(r'[.!?;]["\')\]]*\s+|\n+')
+
+def merge_spans(spans):
+    """Sort spans by offset and merge overlapping ones.
+
+    A merged span keeps a shared replacement when all its parts agree, or
+    the replacement of a part that covers the whole merged range (such as
+    an age substituted for a date of birth); otherwise it falls back to
+    the generic [REDACTED] marker so no fragment of the original leaks.
+    """
+    merged = []
+    for span in sorted(spans, key=lambda span: (span['start'], -span['end'])):
+        if merged and span['start'] < merged[-1]['end']:
+            group = merged[-1]
+            group['end'] = max(group['end'], span['end'])
+            group['parts'].append(span)
+        else:
+            merged.append({'start': span['start'], 'end': span['end'], 'parts': [span]})
+
+    result = []
+    for group in merged:
+        parts = group['parts']
+        replacements = {part['replacement'] for part in parts}
+        if len(replacements) == 1:
+            replacement = parts[0]['replacement']
+        else:
+            covering = [part for part in parts if part['start'] == group['start'] and part['end'] == group['end']]
+            replacement = covering[0]['replacement'] if covering else REDACTED
+        info_types = []
+        for part in parts:
+            if part.get('info_type') and part['info_type'] not in info_types:
+                info_types.append(part['info_type'])
+        result.append({
+            'start': group['start'],
+            'end': group['end'],
+            'replacement': replacement,
+            'info_types': info_types,
+        })
+    return result
+
+def apply_redactions(text, spans):
+    """Apply spans to the text in one pass.
+
+    Returns (redacted_text, span_map). Each span map entry gives the
+    original range, the matching range in the redacted text, the
+    replacement and the info types, so a UI can highlight redactions
+    without ever seeing the original values.
+    """
+    parts = []
+    span_map = []
+    position = 0
+    output_length = 0
+    for span in merge_spans(spans):
+        start = max(span['start'], position)
+        end = min(span['end'], len(text))
+        if start >= end:
+            continue
+        parts.append(text[position:start])
+        output_length += start - position
+        parts.append(span['replacement'])
+        span_map.append({
+            'original_start': start,
+            'original_end': end,
+            'redacted_start': output_length,
+            'redacted_end': output_length + len(span['replacement']),
+            'replacement': span['replacement'],
+            'info_types': span['info_types'],
+        })
+        output_length += len(span['replacement'])
+        position = end
+    parts.append(text[position:])
+    return ''.join(parts), span_map
+
+def split_into_chunks(text, max_chars, overlap):
+    """Split text into (start, end) ranges of at most max_chars.
+
+    Chunks end on the last sentence boundary that fits, falling back to
+    whitespace and then a hard cut. Each chunk after the first starts
+    overlap characters (snapped forward to a boundary) before the previous
+    one ended, so an entity cut by a hard split is seen whole by its
+    neighbour.
+    """
+    if max_chars <= 2 * overlap:
+        raise ValueError("max_chars must be more than twice the overlap")
+    boundaries = [match.end() for match in SENTENCE_BOUNDARY.finditer(text)]
+
+    def last_boundary(low, high):
+        index = bisect.bisect_right(boundaries, high) - 1
+        if index >= 0 and boundaries[index] > low:
+            return boundaries[index]
+        space = text.rfind(' ', low + 1, high)
+        return space + 1 if space > low else None
+
+    def first_boundary(low, high):
+        index = bisect.bisect_left(boundaries, low)
+        if index < len(boundaries) and boundaries[index] < high:
+            return boundaries[index]
+        space = text.find(' ', low, high)
+        return space + 1 if space >= 0 and space + 1 < high else low
+
+    chunks = []
+    start = 0
+    while len(text) - start > max_chars:
+        limit = start + max_chars
+        end = last_boundary(start + overlap, limit) or limit
+        chunks.append((start, end))
+        start = first_boundary(end - overlap, end)
+    chunks.append((start, len(text)))
+    return chunks
+
+def merge_chunk_findings(text, chunks, chunk_findings):
+    """Map per-chunk (info_type, quote, start, end) findings to offsets in text.
+
+    A finding touching a chunk's interior cut is dropped because the
+    overlapping neighbour sees it whole; exact duplicates from the
+    overlaps are reported once.
+    """
+    findings = []
+    seen = set()
+    for (chunk_start, chunk_end), results in zip(chunks, chunk_findings):
+        for info_type, quote, start, end in results:
+            start += chunk_start
+            end += chunk_start
+            if (start == chunk_start and chunk_start > 0) or (end == chunk_end and chunk_end < len(text)):
+                continue
+            if (info_type, start, end) in seen:
+                continue
+            seen.add((info_type, start, end))
+            findings.append((info_type, quote, start, end))
+    return findings
+
+def inspect_until_complete(inspect, text, overlap):
+    """Run inspect(text) -> (findings, truncated), splitting the text until no result is truncated.
+
+    DLP caps the findings one call returns and flags the result as
+    truncated; the PHI past the cap would go unredacted. A truncated text
+    is split into overlapping halves, each inspected the same way. Raises
+    RuntimeError if a text too short to split is still truncated, so the
+    caller fails closed instead of returning partial findings.
+    """
+    findings, truncated = inspect(text)
+    if not truncated:
+        return findings
+    if len(text) < 2 or len(text) <= 4 * overlap:
+        raise RuntimeError(f"DLP truncated the findings for {len(text)} characters that cannot be split further")
+    chunks = split_into_chunks(text, len(text) // 2 + overlap, overlap)
+    chunk_findings = [inspect_until_complete(inspect, text[start:end], overlap) for start, end in chunks]
+    return merge_chunk_findings(text, chunks, chunk_findings)
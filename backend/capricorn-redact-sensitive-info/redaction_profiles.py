@@ -0,0 +1,229 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Redaction profiles built once at import.
+
+Each profile is a validated, deduplicated list of DLP InfoType protos
+wrapped in a prebuilt InspectConfig, so a request only wraps its text in
+a ContentItem. REDACTION_PROFILE picks the default profile; requests may
+choose another by name. When REDACTION_INSPECT_TEMPLATE names a stored
+DLP inspect template (which must enable include_quote), requests for the
+default profile reference it instead of sending the info type list.
+"""
+
+import os
+import re
+
+from google.cloud import dlp_v2
+
+# Info types redacted by the strict profile
+STRICT_INFO_TYPE_NAMES = [
+    "EMAIL_ADDRESS",
+    "STREET_ADDRESS",
+    "LOCATION",
+    "DATE_OF_BIRTH",
+    "US_SOCIAL_SECURITY_NUMBER",
+    "PASSPORT",
+    "DRIVERS_LICENSE_NUMBER",
+    "PHONE_NUMBER",
+    "FIRST_NAME",
+    "LAST_NAME",
+    "PERSON_NAME",
+    "MEDICAL_RECORD_NUMBER",
+    "CREDIT_CARD_NUMBER",
+    "CREDIT_CARD_EXPIRATION_DATE",
+    "US_PASSPORT",
+    "UK_DRIVERS_LICENSE_NUMBER",
+    "AUSTRALIA_DRIVERS_LICENSE_NUMBER",
+    "CANADA_DRIVERS_LICENSE_NUMBER",
+    "GERMANY_DRIVERS_LICENSE_NUMBER",
+    "US_DRIVERS_LICENSE_NUMBER",
+    "IRELAND_DRIVING_LICENSE_NUMBER",
+    "UK_PASSPORT",
+    "FRANCE_DRIVERS_LICENSE_NUMBER",
+    "MEXICO_CURP_NUMBER",
+    "HONG_KONG_ID_NUMBER",
+    "TAIWAN_ID_NUMBER",
+    "BRAZIL_CPF_NUMBER",
+    "ARGENTINA_DNI_NUMBER",
+    "BELGIUM_NATIONAL_ID_CARD_NUMBER",
+    "ITALY_FISCAL_CODE",
+    "POLAND_PASSPORT",
+    "SOUTH_AFRICA_ID_NUMBER",
+    "US_STATE",
+    "US_EMPLOYER_IDENTIFICATION_NUMBER",
+    "GERMANY_PASSPORT",
+    "AUSTRALIA_MEDICARE_NUMBER",
+    "POLAND_PESEL_NUMBER",
+    "SPAIN_NIE_NUMBER",
+    "ITALY_PASSPORT",
+    "US_HEALTHCARE_NPI",
+    "CANADA_SOCIAL_INSURANCE_NUMBER",
+    "FINLAND_NATIONAL_ID_NUMBER",
+    "NETHERLANDS_BSN_NUMBER",
+    "NEW_ZEALAND_NHI_NUMBER",
+    "THAILAND_NATIONAL_ID_NUMBER",
+    "AUSTRALIA_PASSPORT",
+    "PERU_DNI_NUMBER",
+    "COLOMBIA_CDC_NUMBER",
+    "DENMARK_CPR_NUMBER",
+    "SPAIN_SOCIAL_SECURITY_NUMBER",
+    "SPAIN_DRIVERS_LICENSE_NUMBER",
+    "GERMANY_SCHUFA_ID",
+    "KOREA_RRN",
+    "NEW_ZEALAND_IRD_NUMBER",
+    "CANADA_OHIP",
+    "FRANCE_NIR",
+    "INDIA_GST_INDIVIDUAL",
+    "JAPAN_INDIVIDUAL_NUMBER",
+    "SPAIN_DNI_NUMBER",
+    "INDIA_PAN_INDIVIDUAL",
+    "IRELAND_PPSN",
+    "ARMENIA_PASSPORT",
+    "FRANCE_CNI",
+    "AUSTRALIA_TAX_FILE_NUMBER",
+    "UKRAINE_PASSPORT",
+    "MEXICO_PASSPORT",
+    "NETHERLANDS_PASSPORT",
+    "CHINA_RESIDENT_ID_NUMBER",
+    "CANADA_PASSPORT",
+    "UZBEKISTAN_PASSPORT",
+    "VENEZUELA_CDI_NUMBER",
+    "PARAGUAY_CIC_NUMBER",
+    "JAPAN_PASSPORT",
+    "TAIWAN_PASSPORT",
+    "UK_TAXPAYER_REFERENCE",
+    "IRELAND_EIRCODE",
+    "US_DEA_NUMBER",
+    "PORTUGAL_CDC_NUMBER",
+    "URUGUAY_CDI_NUMBER",
+    "SPAIN_NIF_NUMBER",
+    "GERMANY_IDENTITY_CARD_NUMBER",
+    "ISRAEL_IDENTITY_CARD_NUMBER",
+    "UK_NATIONAL_HEALTH_SERVICE_NUMBER",
+    "SWEDEN_NATIONAL_ID_NUMBER",
+    "FINANCIAL_ACCOUNT_NUMBER",
+    "DOD_ID_NUMBER",
+    "CHINA_PASSPORT",
+    "SCOTLAND_COMMUNITY_HEALTH_INDEX_NUMBER",
+    "US_INDIVIDUAL_TAXPAYER_IDENTIFICATION_NUMBER",
+    "US_ADOPTION_TAXPAYER_IDENTIFICATION_NUMBER",
+    "NORWAY_NI_NUMBER",
+    "IRELAND_PASSPORT",
+    "POLAND_NATIONAL_ID_NUMBER",
+    "AZERBAIJAN_PASSPORT",
+    "JAPAN_BANK_ACCOUNT",
+    "FINANCIAL_ID",
+    "VEHICLE_IDENTIFICATION_NUMBER",
+    "MARITAL_STATUS",
+    "IMMIGRATION_STATUS",
+    "RELIGIOUS_TERM",
+    "EMPLOYMENT_STATUS",
+    "COUNTRY_DEMOGRAPHIC",
+    "GEOGRAPHIC_DATA",
+    "LOCATION_COORDINATES",
+    "GENERIC_ID",
+    "TECHNICAL_ID",
+    "DOCUMENT_TYPE/FINANCE/REGULATORY",
+    "POLITICAL_TERM",
+    "WEAK_PASSWORD_HASH",
+    "XSRF_TOKEN",
+    "DOMAIN_NAME",
+    "US_TOLLFREE_PHONE_NUMBER",
+    "PORTUGAL_NIB_NUMBER",
+    "SINGAPORE_NATIONAL_REGISTRATION_ID_NUMBER",
+    "PORTUGAL_SOCIAL_SECURITY_NUMBER",
+    "UK_NATIONAL_INSURANCE_NUMBER",
+    "AMERICAN_BANKERS_CUSIP_ID",
+    "CHILE_CDI_NUMBER",
+    "US_BANK_ROUTING_MICR",
+    "KOREA_ARN",
+    "SECURITY_DATA",
+    "US_PREPARER_TAXPAYER_IDENTIFICATION_NUMBER",
+    "US_VEHICLE_IDENTIFICATION_NUMBER",
+    "ICCID_NUMBER",
+    "MALE_NAME",
+    "FEMALE_NAME",
+    "ADVERTISING_ID",
+]
+
+# Direct identifiers only, for the minimal profile
+MINIMAL_INFO_TYPE_NAMES = [
+    "PERSON_NAME",
+    "FIRST_NAME",
+    "LAST_NAME",
+    "DATE_OF_BIRTH",
+    "EMAIL_ADDRESS",
+    "PHONE_NUMBER",
+    "STREET_ADDRESS",
+    "MEDICAL_RECORD_NUMBER",
+    "US_SOCIAL_SECURITY_NUMBER",
+    "US_HEALTHCARE_NPI",
+    "PASSPORT",
+    "DRIVERS_LICENSE_NUMBER",
+    "CREDIT_CARD_NUMBER",
+]
+
+INFO_TYPE_NAME = re.compile(r'^[A-Z0-9_]+(/[A-Z0-9_]+)*$')
+
+def build_info_types(names):
+    """Return deduplicated InfoType protos in order; raises ValueError on a malformed name."""
+    info_types = []
+    seen = set()
+    for name in names:
+        if not INFO_TYPE_NAME.match(name):
+            raise ValueError(f"Invalid DLP info type name: {name!r}")
+        if name not in seen:
+            seen.add(name)
+            info_types.append(dlp_v2.InfoType(name=name))
+    return info_types
+
+def build_inspect_config(names):
+    return dlp_v2.InspectConfig(
+        info_types=build_info_types(names),
+        min_likelihood=dlp_v2.Likelihood.LIKELY,
+        include_quote=True,
+    )
+
+# Inspect configs built once at import, selectable per request with "profile"
+REDACTION_PROFILES = {
+    'strict': build_inspect_config(STRICT_INFO_TYPE_NAMES),
+    'minimal': build_inspect_config(MINIMAL_INFO_TYPE_NAMES),
+}
+DEFAULT_REDACTION_PROFILE = os.environ.get('REDACTION_PROFILE', 'strict')
+if DEFAULT_REDACTION_PROFILE not in REDACTION_PROFILES:
+    raise ValueError(f"Unknown REDACTION_PROFILE: {DEFAULT_REDACTION_PROFILE}")
+
+# Optional stored inspect template (projects/.../inspectTemplates/...) sent instead of the default profile's config
+REDACTION_INSPECT_TEMPLATE = os.environ.get('REDACTION_INSPECT_TEMPLATE')
+
+def get_info_types(profile=None):
+    """Get the names of the info types a profile redacts, including DATE_OF_BIRTH."""
+    return [info_type.name for info_type in REDACTION_PROFILES[profile or DEFAULT_REDACTION_PROFILE].info_types]
+
+def table_item(texts):
+    """Pack texts into a one-column DLP table, one row per document."""
+    return dlp_v2.ContentItem(table=dlp_v2.Table(
+        headers=[dlp_v2.FieldId(name='text')],
+        rows=[dlp_v2.Table.Row(values=[dlp_v2.Value(string_value=text)]) for text in texts],
+    ))
+
+def inspect_request_for(project_id, content, profile=None):
+    """Build the DLP request for a text or ContentItem around a prebuilt config or the stored inspect template."""
+    profile = profile or DEFAULT_REDACTION_PROFILE
+    item = content if isinstance(content, dlp_v2.ContentItem) else dlp_v2.ContentItem(value=content)
+    parent = f"projects/{project_id}"
+    if REDACTION_INSPECT_TEMPLATE and profile == DEFAULT_REDACTION_PROFILE:
+        return dlp_v2.InspectContentRequest(parent=parent, inspect_template_name=REDACTION_INSPECT_TEMPLATE, item=item)
+    return dlp_v2.InspectContentRequest(parent=parent, inspect_config=REDACTION_PROFILES[profile], item=item)
@@ -0,0 +1,114 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Per-request trace collection for the redaction service.
+
+Each request installs a RedactionTrace in a context variable. log() and the
+record_* helpers write to the current request's trace, so concurrent
+requests on one instance never mix their debug output. Outside a request
+(the __main__ test run) log() falls back to print.
+
+Worker threads do not inherit context variables; submit work with
+submit_in_context so it records into the submitting request's trace.
+"""
+
+import contextvars
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+current_trace = contextvars.ContextVar('redaction_trace', default=None)
+
+class RedactionTrace:
+    """Debug lines, findings, timings and DLP call summaries for one request."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.lines = []
+        self.findings = []
+        self.timings = defaultdict(float)
+        self.dlp_calls = []
+
+    def log(self, message):
+        with self.lock:
+            self.lines.append(str(message))
+
+    def add_finding(self, info_type, start, end, source):
+        with self.lock:
+            self.findings.append({'info_type': info_type, 'start': start, 'end': end, 'source': source})
+
+    def add_dlp_call(self, characters, findings, seconds):
+        with self.lock:
+            self.dlp_calls.append({'characters': characters, 'findings': findings, 'seconds': seconds})
+
+    def add_timing(self, name, seconds):
+        with self.lock:
+            self.timings[name] += seconds
+
+    def identified_info_types(self):
+        with self.lock:
+            return [finding['info_type'] for finding in sorted(self.findings, key=lambda finding: finding['start'])]
+
+    def summary(self):
+        with self.lock:
+            return {
+                'timingsMs': {name: round(seconds * 1000, 2) for name, seconds in self.timings.items()},
+                'dlpCalls': len(self.dlp_calls),
+                'dlpCharacters': sum(call['characters'] for call in self.dlp_calls),
+                'dlpMs': round(sum(call['seconds'] for call in self.dlp_calls) * 1000, 2),
+                'findings': len(self.findings),
+            }
+
+@contextmanager
+def start_trace():
+    """Install a fresh trace for the current request and yield it."""
+    trace = RedactionTrace()
+    token = current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        current_trace.reset(token)
+
+def log(message):
+    trace = current_trace.get()
+    if trace is None:
+        print(message)
+    else:
+        trace.log(message)
+
+def record_finding(info_type, start, end, source='dlp'):
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add_finding(info_type, start, end, source)
+
+def record_dlp_call(characters, findings, seconds):
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add_dlp_call(characters, findings, seconds)
+
+@contextmanager
+def timed(name):
+    """Add the duration of the block to the current trace's timing for name."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace = current_trace.get()
+        if trace is not None:
+            trace.add_timing(name, time.perf_counter() - start)
+
+def submit_in_context(executor, fn, *args):
+    """Submit fn to the executor running in a copy of the caller's context."""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
@@ -0,0 +1,66 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from datetime import datetime
+
+import pytest
+
+from date_of_birth import calculate_age, parse_date_locally
+
+TODAY = datetime(2025, 6, 1)
+
+@pytest.mark.parametrize("quote, expected", [
+    ("1990-03-22", "1990-03-22"),
+    ("born on 1990-03-22", "1990-03-22"),
+    ("DOB: 03/14/2016", "2016-03-14"),
+    ("March 3rd, 2012", "2012-03-03"),
+    ("3 March 2012", "2012-03-03"),
+    ("Sept. 3, 2012", None),
+    ("31/12/2019", "2019-12-31"),
+    ("not a date", None),
+])
+def test_parse_date_locally(quote, expected):
+    assert parse_date_locally(quote, TODAY) == expected
+
+@pytest.mark.parametrize("quote, expected", [
+    ("05/12/55", "1955-05-12"),
+    ("DOB: 03/04/50", "1950-03-04"),
+    ("01-02-68", "1968-01-02"),
+    ("01/02/69", "1969-01-02"),
+    ("05/12/24", "2024-05-12"),
+    ("05/12/25", "2025-05-12"),
+    ("05/12/26", "1926-05-12"),
+])
+def test_two_digit_years_never_land_in_the_future(quote, expected):
+    assert parse_date_locally(quote, TODAY) == expected
+
+def test_two_digit_leap_day_moves_back_a_century():
+    assert parse_date_locally("02/29/28", TODAY) == "1928-02-29"
+
+def test_four_digit_future_year_is_kept_for_the_age_check():
+    assert parse_date_locally("12/05/2030", TODAY) == "2030-12-05"
+
+@pytest.mark.parametrize("birth_date, expected", [
+    ("2020-06-01", 5),
+    ("2020-06-02", 4),
+    ("2025-06-01", 0),
+    ("1955-05-12", 70),
+])
+def test_calculate_age(birth_date, expected):
+    assert calculate_age(birth_date, TODAY) == expected
+
+@pytest.mark.parametrize("birth_date", ["2030-12-05", "2025-06-02"])
+def test_calculate_age_rejects_future_dates(birth_date):
+    with pytest.raises(ValueError):
+        calculate_age(birth_date, TODAY)
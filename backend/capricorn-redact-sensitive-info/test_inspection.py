@@ -0,0 +1,41 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+EMAIL = (r"\S+@example\.org", "EMAIL_ADDRESS")
+
+def dense_note(count):
+    return " ".join(f"Contact {index} is pat{index}@example.org today." for index in range(count))
+
+def test_truncated_findings_are_reinspected(redaction_main, fake_dlp, monkeypatch):
+    client = fake_dlp(pattern=EMAIL, max_findings=20)
+    monkeypatch.setattr(redaction_main, "dlp_client", client)
+    text = dense_note(60)
+    redacted_text, span_map = redaction_main.inspect_and_redact("project", text, predetect=False)
+    assert "@example.org" not in redacted_text
+    assert len(span_map) == 60
+    assert len(client.texts) > 1
+
+def test_truncated_chunks_of_a_long_text_are_reinspected(redaction_main, fake_dlp, monkeypatch):
+    client = fake_dlp(pattern=EMAIL, max_findings=20)
+    monkeypatch.setattr(redaction_main, "dlp_client", client)
+    monkeypatch.setattr(redaction_main, "REDACTION_CHUNK_CHARS", 3000)
+    text = dense_note(200)
+    findings = redaction_main.inspect_findings("project", text)
+    assert sorted(quote for _, quote, _, _ in findings) == sorted(f"pat{index}@example.org" for index in range(200))
+    assert all(text[start:end] == quote for _, quote, start, end in findings)
+    assert max(len(inspected) for inspected in client.texts) <= 3000
+
+def test_truncation_that_cannot_be_split_fails_closed(redaction_main, fake_dlp, monkeypatch):
+    monkeypatch.setattr(redaction_main, "dlp_client", fake_dlp(pattern=EMAIL, max_findings=0))
+    assert redaction_main.inspect_and_redact("project", dense_note(3), predetect=False) == (None, [])
@@ -0,0 +1,115 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+
+import pytest
+
+import phi_detector
+from evaluate_phi_detector import contains, load_corpus, overlaps
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "phi_corpus.jsonl")
+
+def quotes(text, spans):
+    return [text[span['start']:span['end']] for span in spans]
+
+def predetect_and_redact(redaction_main, text):
+    """Redact text through main.predetected_findings, the code path REDACTION_PREDETECT enables."""
+    return redaction_main.redact_findings(text, redaction_main.predetected_findings("project", text))[0]
+
+@pytest.mark.parametrize("text, gold", load_corpus(CORPUS))
+def test_corpus_phi_is_redacted_locally_or_sent_to_dlp(text, gold):
+    high_confidence, uncertain = phi_detector.detect(text)
+    windows = phi_detector.dlp_windows(text, uncertain)
+    local_ranges = [(span['start'], span['end']) for span in high_confidence]
+    for start, end, _ in gold:
+        assert overlaps(start, end, local_ranges) or contains(start, end, windows), text[start:end]
+
+def test_high_confidence_identifiers_are_redacted_locally():
+    text = "Email jane@example.org, call 555-123-4567, SSN 123-45-6789, MRN: AB12345, DOB: 03/14/2016."
+    high_confidence, _ = phi_detector.detect(text)
+    assert {(span['info_type'], span['quote']) for span in high_confidence} == {
+        ("EMAIL_ADDRESS", "jane@example.org"),
+        ("PHONE_NUMBER", "555-123-4567"),
+        ("US_SOCIAL_SECURITY_NUMBER", "123-45-6789"),
+        ("MEDICAL_RECORD_NUMBER", "AB12345"),
+        ("DATE_OF_BIRTH", "03/14/2016"),
+    }
+
+def test_out_of_dictionary_names_and_places_are_candidates():
+    text = "Xavier Quinn, a 7 year old from Fresno, was seen at St. Jude with relapsed AML."
+    _, uncertain = phi_detector.detect(text)
+    found = quotes(text, uncertain)
+    assert "Xavier Quinn" in found
+    assert "Fresno" in found
+    assert "7 year old" in found
+
+def test_lower_case_address_is_a_candidate():
+    text = "Patient Keanu Reeves lives at 12 elm street, Springfield."
+    _, uncertain = phi_detector.detect(text)
+    found = quotes(text, uncertain)
+    assert "12 elm street" in found
+    assert "Springfield" in found
+    assert any("Keanu Reeves" in quote for quote in found)
+
+def test_sentence_initial_word_alone_is_not_a_candidate():
+    _, uncertain = phi_detector.detect("Bone marrow showed blasts. Plan: azacitidine.")
+    assert uncertain == []
+
+def test_dictionary_words_in_prose_are_not_candidates():
+    _, uncertain = phi_detector.detect("the rash may resolve and she will return if it does.")
+    assert uncertain == []
+
+def test_text_without_candidates_is_sent_to_dlp_whole():
+    text = "lives with grandparents; the rash began after ibuprofen."
+    assert phi_detector.detect(text) == ([], [])
+    assert phi_detector.dlp_windows(text, []) == [(0, len(text))]
+
+def test_text_without_candidates_is_still_redacted(redaction_main, fake_dlp, monkeypatch):
+    text = "dx relapsed aml; mom ulani kekumu says fever since tuesday."
+    client = fake_dlp([("ulani kekumu", "PERSON_NAME")])
+    monkeypatch.setattr(redaction_main, "dlp_client", client)
+    assert phi_detector.detect(text) == ([], [])
+    assert predetect_and_redact(redaction_main, text) == "dx relapsed aml; mom [REDACTED] says fever since tuesday."
+    assert client.texts == [text]
+
+def test_windows_map_findings_back_to_the_original_text(redaction_main, fake_dlp, monkeypatch):
+    filler = "Peripheral smear with circulating blasts and no other findings today. " * 3
+    text = filler + "Referred by Dr. Okafor for review. " + filler
+    client = fake_dlp([("Dr. Okafor", "PERSON_NAME")])
+    monkeypatch.setattr(redaction_main, "dlp_client", client)
+    redacted = predetect_and_redact(redaction_main, text)
+    assert "Okafor" not in redacted
+    assert "Referred by [REDACTED] for review." in redacted
+    assert len(client.texts) == 1 and len(client.texts[0]) < len(text)
+
+def test_high_confidence_identifiers_are_found_locally(redaction_main, fake_dlp, monkeypatch):
+    text = "Email jane@example.org or call 555-123-4567 about her fever."
+    monkeypatch.setattr(redaction_main, "dlp_client", fake_dlp())
+    findings = redaction_main.predetected_findings("project", text)
+    assert {(info_type, quote, source) for info_type, quote, _, _, source in findings} == {
+        ("EMAIL_ADDRESS", "jane@example.org", "local"),
+        ("PHONE_NUMBER", "555-123-4567", "local"),
+    }
+    assert predetect_and_redact(redaction_main, text) == "Email [REDACTED] or call [REDACTED] about her fever."
+
+def test_map_range_rejects_ranges_across_a_separator():
+    text = "Dr. Okafor " + "x " * 100 + "Dr. Berg"
+    _, uncertain = phi_detector.detect(text)
+    windows = phi_detector.candidate_windows(text, uncertain, margin=5)
+    assert len(windows) == 2
+    joined_text, window_table = phi_detector.join_windows(text, windows)
+    first_end = len(text[windows[0][0]:windows[0][1]])
+    assert phi_detector.map_range(window_table, 0, 3) == (windows[0][0], windows[0][0] + 3)
+    assert phi_detector.map_range(window_table, first_end - 1, first_end + 3) is None
@@ -0,0 +1,112 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+
+import pytest
+
+from redaction import (REDACTED, apply_redactions, inspect_until_complete, merge_chunk_findings, merge_spans,
+                       split_into_chunks)
+
+def span(start, end, replacement=REDACTED, info_type="PERSON_NAME"):
+    return {'start': start, 'end': end, 'replacement': replacement, 'info_type': info_type}
+
+def test_apply_redactions_replaces_only_the_located_occurrence():
+    text = "Anna saw Anna."
+    redacted, span_map = apply_redactions(text, [span(9, 13)])
+    assert redacted == "Anna saw [REDACTED]."
+    assert span_map == [{
+        'original_start': 9, 'original_end': 13,
+        'redacted_start': 9, 'redacted_end': 19,
+        'replacement': REDACTED, 'info_types': ['PERSON_NAME'],
+    }]
+
+def test_span_map_offsets_point_into_the_redacted_text():
+    text = "Call 555-123-4567 or mail a@b.org today."
+    redacted, span_map = apply_redactions(text, [span(26, 33, info_type="EMAIL_ADDRESS"),
+                                                 span(5, 17, info_type="PHONE_NUMBER")])
+    assert redacted == "Call [REDACTED] or mail [REDACTED] today."
+    for entry in span_map:
+        assert redacted[entry['redacted_start']:entry['redacted_end']] == entry['replacement']
+
+def test_overlapping_spans_merge_into_one_redaction():
+    text = "Dr. Lars Berg called."
+    redacted, span_map = apply_redactions(text, [span(0, 13), span(4, 8, info_type="FIRST_NAME")])
+    assert redacted == "[REDACTED] called."
+    assert len(span_map) == 1
+    assert set(span_map[0]['info_types']) == {"PERSON_NAME", "FIRST_NAME"}
+
+def test_merged_span_keeps_a_replacement_that_covers_it():
+    spans = [span(4, 14, "Age: 9", "DATE_OF_BIRTH"), span(7, 9, info_type="DATE")]
+    [merged] = merge_spans(spans)
+    assert merged['replacement'] == "Age: 9"
+
+def test_merged_span_with_conflicting_replacements_falls_back_to_redacted():
+    spans = [span(0, 6, "Age: 9", "DATE_OF_BIRTH"), span(4, 10, "Age: 3", "DATE_OF_BIRTH")]
+    [merged] = merge_spans(spans)
+    assert merged['replacement'] == REDACTED
+
+def test_no_spans_leave_the_text_unchanged():
+    assert apply_redactions("nothing here", []) == ("nothing here", [])
+
+def test_chunks_cover_the_text_with_overlap_and_end_on_sentences():
+    text = " ".join(f"Sentence number {index} is here." for index in range(200))
+    chunks = split_into_chunks(text, 500, 50)
+    assert chunks[0][0] == 0 and chunks[-1][1] == len(text)
+    for (_, previous_end), (start, end) in zip(chunks, chunks[1:]):
+        assert start < previous_end
+        assert end - start <= 500
+    for _, end in chunks[:-1]:
+        assert text[end - 2:end] == ". "
+
+def test_chunk_overlap_must_leave_room():
+    with pytest.raises(ValueError):
+        split_into_chunks("text", 100, 50)
+
+def capped_inspector(max_findings):
+    """Stand-in for DLP that finds emails but returns at most max_findings of them, flagging the rest as truncated."""
+    calls = []
+
+    def inspect(text):
+        calls.append(len(text))
+        matches = [("EMAIL_ADDRESS", match.group(), match.start(), match.end())
+                   for match in re.finditer(r"\S+@example\.org", text)]
+        return matches[:max_findings], len(matches) > max_findings
+    return inspect, calls
+
+def test_merge_chunk_findings_drops_cut_and_duplicate_findings():
+    text = "a" * 100
+    chunks = [(0, 60), (40, 100)]
+    chunk_findings = [[("X", "q", 10, 20), ("X", "q", 50, 60)], [("X", "q", 10, 20), ("X", "q", 30, 40)]]
+    assert merge_chunk_findings(text, chunks, chunk_findings) == [("X", "q", 10, 20), ("X", "q", 50, 60), ("X", "q", 70, 80)]
+
+def test_untruncated_findings_are_returned_from_one_call():
+    inspect, calls = capped_inspector(10)
+    text = "Contact pat1@example.org today."
+    assert inspect_until_complete(inspect, text, 20) == [("EMAIL_ADDRESS", "pat1@example.org", 8, 24)]
+    assert calls == [len(text)]
+
+def test_truncated_findings_are_reinspected_until_complete():
+    text = " ".join(f"Contact number {index} is pat{index}@example.org today." for index in range(40))
+    inspect, calls = capped_inspector(6)
+    findings = inspect_until_complete(inspect, text, 50)
+    expected = [("EMAIL_ADDRESS", match.group(), match.start(), match.end())
+                for match in re.finditer(r"\S+@example\.org", text)]
+    assert sorted(findings, key=lambda finding: finding[2]) == expected
+    assert len(calls) > 1
+
+def test_truncation_that_cannot_be_split_fails_closed():
+    inspect, _ = capped_inspector(0)
+    with pytest.raises(RuntimeError):
+        inspect_until_complete(inspect, "Mail pat@example.org now.", 20)
@@ -0,0 +1,172 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Process-wide pacing and 429 backoff for Gemini calls.
+
+Each function is deployed from its own directory, so this module is
+copied verbatim into every function that calls Gemini
+(med-lit-retrieve-full-articles, medical-lit-final-analysis and
+extract-medical-info) and configured the same way through GEMINI_RPM,
+GEMINI_TPM, GEMINI_RETRY_DEADLINE, GEMINI_CIRCUIT_THRESHOLD and
+GEMINI_CIRCUIT_COOLDOWN. Keep the copies identical;
+test_gemini_rate_limiter.py checks that they are.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class RateLimitExceeded(Exception):
+    """Raised when a Gemini call cannot be made before its retry deadline."""
+
+def is_rate_limit_error(error):
+    """True for a 429 / RESOURCE_EXHAUSTED error, judged by its status code rather than its message text."""
+    code = getattr(error, 'code', None)
+    if callable(code):
+        # grpc errors expose code() returning a StatusCode
+        code = code()
+    if code == 429:
+        return True
+    return 'RESOURCE_EXHAUSTED' in (getattr(error, 'status', None), getattr(code, 'name', None))
+
+class TokenBucket:
+    """Thread-safe token bucket that refills `capacity` units per minute."""
+
+    def __init__(self, capacity):
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def reserve(self, amount):
+        """Take `amount` units and return the seconds to wait before they may be used."""
+        amount = min(amount, self.capacity)
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens -= amount
+            return 0 if self.tokens >= 0 else -self.tokens * 60 / self.capacity
+
+    def adjust(self, amount):
+        """Charge (positive) or refund (negative) units after the fact."""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+class GeminiRateLimiter:
+    """Process-wide pacing for Gemini calls.
+
+    Every call reserves one request and its estimated input tokens from the
+    RPM/TPM buckets before it is sent. 429 RESOURCE_EXHAUSTED errors are
+    retried with full-jitter exponential backoff until the retry deadline,
+    and repeated 429s open a circuit breaker that holds back all callers for
+    a cooldown period instead of letting them stampede the quota. A rejected
+    call consumed no quota, so its reservation is refunded and each retry
+    reserves again like a new call.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute, retry_deadline=300,
+                 base_delay=2, max_delay=60, failure_threshold=5, cooldown=30):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.retry_deadline = retry_deadline
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.open_until = 0
+        self.lock = threading.Lock()
+
+    def _acquire(self, estimated_tokens, deadline):
+        # Hold off while the circuit breaker is open
+        with self.lock:
+            open_until = self.open_until
+        now = time.monotonic()
+        if open_until > now:
+            if open_until > deadline:
+                raise RateLimitExceeded("Gemini circuit breaker is open")
+            time.sleep(open_until - now)
+
+        wait = max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+        if time.monotonic() + wait > deadline:
+            # Give the reservation back so other callers are not penalized
+            self.requests.adjust(-1)
+            self.tokens.adjust(-estimated_tokens)
+            raise RateLimitExceeded(f"Gemini rate limit budget exhausted for the next {wait:.1f} seconds")
+        if wait > 0:
+            logger.info(f"Rate limiter pacing Gemini call for {wait:.1f} seconds")
+            time.sleep(wait)
+
+    def _record_throttle(self):
+        with self.lock:
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.failure_threshold:
+                self.open_until = time.monotonic() + self.cooldown
+                self.consecutive_failures = 0
+                logger.warning(f"Opening Gemini circuit breaker for {self.cooldown} seconds after repeated 429s")
+
+    def _record_success(self):
+        with self.lock:
+            self.consecutive_failures = 0
+
+    def call(self, fn, estimated_tokens=0):
+        """Invoke `fn` within the rate limits, retrying 429s until the retry deadline."""
+        deadline = time.monotonic() + self.retry_deadline
+        attempt = 0
+        while True:
+            self._acquire(estimated_tokens, deadline)
+            try:
+                response = fn()
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    raise
+                attempt += 1
+                self.requests.adjust(-1)
+                self.tokens.adjust(-estimated_tokens)
+                self._record_throttle()
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+                if time.monotonic() + delay > deadline:
+                    raise RateLimitExceeded(f"Gemini still rate limited after {attempt} attempts") from e
+                logger.warning(f"Received RESOURCE_EXHAUSTED error. Attempt {attempt}. Waiting {delay:.1f} seconds before retry...")
+                time.sleep(delay)
+                continue
+
+            self._record_success()
+            # Settle the token estimate against the actual usage reported by Gemini
+            usage = getattr(response, 'usage_metadata', None)
+            actual_tokens = getattr(usage, 'total_token_count', None) if usage else None
+            if actual_tokens:
+                self.tokens.adjust(actual_tokens - estimated_tokens)
+            return response
+
+def estimate_tokens(text):
+    """Rough token estimate used to reserve TPM budget before a call (~4 characters per token)."""
+    return len(text) // 4 + 1
+
+# Shared by every request thread in this process; GEMINI_RPM and GEMINI_TPM are the instance's share of the quota
+gemini_rate_limiter = GeminiRateLimiter(
+    requests_per_minute=int(os.environ.get('GEMINI_RPM', '60')),
+    tokens_per_minute=int(os.environ.get('GEMINI_TPM', '4000000')),
+    retry_deadline=float(os.environ.get('GEMINI_RETRY_DEADLINE', '300')),
+    failure_threshold=int(os.environ.get('GEMINI_CIRCUIT_THRESHOLD', '5')),
+    cooldown=float(os.environ.get('GEMINI_CIRCUIT_COOLDOWN', '30')),
+)
@@ -2,8 +2,15 @@ import functions_framework
 from flask import jsonify, request
 from google import genai
 from google.genai import types
+import hashlib
+import json
 import logging
 import os
+import threading
+import time
+from collections import OrderedDict
+
+from gemini_rate_limiter import estimate_tokens, gemini_rate_limiter
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -16,13 +23,314 @@ client = genai.Client(
     location=os.environ.get('LOCATION', 'global'),
 )
 
+MODEL = "gemini-2.0-flash-001"
+
+# Extraction results are cached by a hash of the model and full prompt (prompt plus redacted case text)
+EXTRACTION_CACHE_SIZE = int(os.environ.get('EXTRACTION_CACHE_SIZE', '1000'))
+
+# "auto" runs an ungrounded pass first and only grounds low-confidence answers; "always" or "never" pin one tier
+EXTRACTION_GROUNDING_MODES = ('auto', 'always', 'never')
+EXTRACTION_GROUNDING = os.environ.get('EXTRACTION_GROUNDING', 'auto').strip().lower()
+if EXTRACTION_GROUNDING not in EXTRACTION_GROUNDING_MODES:
+    logger.error(f"Invalid EXTRACTION_GROUNDING {EXTRACTION_GROUNDING!r} (expected one of "
+                 f"{', '.join(EXTRACTION_GROUNDING_MODES)}); using 'auto'")
+    EXTRACTION_GROUNDING = 'auto'
+EXTRACTION_CONFIDENCE_THRESHOLD = float(os.environ.get('EXTRACTION_CONFIDENCE_THRESHOLD', '0.7'))
+
+SAFETY_SETTINGS = [
+    types.SafetySetting(
+        category="HARM_CATEGORY_HATE_SPEECH",
+        threshold="OFF"
+    ),
+    types.SafetySetting(
+        category="HARM_CATEGORY_DANGEROUS_CONTENT",
+        threshold="OFF"
+    ),
+    types.SafetySetting(
+        category="HARM_CATEGORY_SEXUALLY_EXPLICIT",
+        threshold="OFF"
+    ),
+    types.SafetySetting(
+        category="HARM_CATEGORY_HARASSMENT",
+        threshold="OFF"
+    )
+]
+
+EVENT_CATEGORIES = [
+    "mutation", "fusion", "immunophenotype", "disease_status", "therapy",
+    "disease_location", "response", "resistance", "other",
+]
+
+EVENTS_SCHEMA = types.Schema(
+    type=types.Type.ARRAY,
+    items=types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "event": types.Schema(type=types.Type.STRING),
+            "category": types.Schema(type=types.Type.STRING, enum=EVENT_CATEGORIES),
+        },
+        required=["event", "category"],
+    ),
+)
+
+# Self-assessment fields the ungrounded pass reports so the caller can decide whether to ground
+ASSESSMENT_PROPERTIES = {
+    "confidence": types.Schema(type=types.Type.NUMBER),
+    "unrecognized_terms": types.Schema(type=types.Type.ARRAY, items=types.Schema(type=types.Type.STRING)),
+}
+
+def response_schema(extraction_type, assessed):
+    properties = {}
+    if extraction_type in ('disease', 'combined'):
+        properties["disease"] = types.Schema(type=types.Type.STRING)
+    if extraction_type in ('events', 'combined'):
+        properties["events"] = EVENTS_SCHEMA
+    if assessed:
+        properties.update(ASSESSMENT_PROPERTIES)
+    return types.Schema(type=types.Type.OBJECT, properties=properties, required=list(properties))
+
+ASSESSMENT_INSTRUCTIONS = (
+    "Also set \"confidence\" to a number from 0 to 1 for how sure you are that the answer is complete and "
+    "correct from the case notes alone, and list in \"unrecognized_terms\" any gene, variant, drug, protocol "
+    "or trial names in the case notes that you do not recognize."
+)
+
+class ExtractionCache:
+    """In-process LRU of extraction results keyed by a hash of the request prompt."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(extraction_type, prompt):
+        return hashlib.sha256(f"{MODEL}\0{extraction_type}\0{prompt}".encode()).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0,
+                "entries": len(self.entries)
+            }
+
+extraction_cache = ExtractionCache(EXTRACTION_CACHE_SIZE)
+
+class TierMetrics:
+    """Per-tier call latencies and how often the ungrounded pass was good enough on its own."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tiers = {}
+        self.fast_accepted = 0
+        self.escalations = {}
+
+    def record_call(self, tier, seconds, failed=False):
+        with self.lock:
+            tier_stats = self.tiers.setdefault(tier, {"calls": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            tier_stats["calls"] += 1
+            tier_stats["errors"] += int(failed)
+            tier_stats["total_seconds"] += seconds
+            tier_stats["max_seconds"] = max(tier_stats["max_seconds"], seconds)
+
+    def record_decision(self, reason):
+        """reason is None when the ungrounded answer was returned, otherwise why it was grounded."""
+        with self.lock:
+            if reason is None:
+                self.fast_accepted += 1
+            else:
+                self.escalations[reason] = self.escalations.get(reason, 0) + 1
+
+    def stats(self):
+        with self.lock:
+            decisions = self.fast_accepted + sum(self.escalations.values())
+            return {
+                "tiers": {
+                    tier: {
+                        "calls": tier_stats["calls"],
+                        "errors": tier_stats["errors"],
+                        "average_ms": round(tier_stats["total_seconds"] * 1000 / tier_stats["calls"], 1),
+                        "max_ms": round(tier_stats["max_seconds"] * 1000, 1),
+                    }
+                    for tier, tier_stats in self.tiers.items()
+                },
+                "fast_accepted": self.fast_accepted,
+                "fast_hit_rate": self.fast_accepted / decisions if decisions else 0,
+                "escalations": dict(self.escalations),
+                "confidence_threshold": EXTRACTION_CONFIDENCE_THRESHOLD,
+            }
+
+tier_metrics = TierMetrics()
+
+def combined_prompt(disease_prompt, events_prompt, text):
+    """Ask for the disease and the actionable events in one prompt."""
+    disease_prompt = disease_prompt.rstrip().removesuffix("Case notes:").rstrip()
+    return (
+        f"## Task 1: Disease\n{disease_prompt}\n\n"
+        f"## Task 2: Actionable events\n{events_prompt.rstrip()}\n\n"
+        "Answer both tasks for the case notes below. Put the disease from task 1 in \"disease\" and each "
+        "actionable event from task 2, with its category, as an item of \"events\".\n\n"
+        f"Case notes:\n{text}"
+    )
+
+def parse_events(result):
+    """Parse events from the quote-separated format of the single events extraction."""
+    return [event.strip(' "\'') for event in result.split('"') if event.strip(' "\'')]
+
+def parse_json_text(result):
+    """Parse a JSON answer, tolerating the code fence grounded responses sometimes wrap it in."""
+    result = result.strip()
+    if result.startswith("```"):
+        result = result.split("\n", 1)[1] if "\n" in result else ""
+        result = result.rsplit("```", 1)[0]
+    return json.loads(result)
+
+def normalize_result(data, extraction_type):
+    """Shape a structured answer into the response format of the extraction type."""
+    event_details = []
+    seen = set()
+    for item in data.get('events') or []:
+        event = (item.get('event') or '').strip() if isinstance(item, dict) else str(item).strip()
+        if event and event not in seen:
+            seen.add(event)
+            category = item.get('category') if isinstance(item, dict) else None
+            event_details.append({'event': event, 'category': category or 'other'})
+    output = {
+        "disease": (data.get('disease') or '').strip(),
+        "events": [detail['event'] for detail in event_details],
+    }
+    if extraction_type != 'disease':
+        output["event_details"] = event_details
+    return output
+
+def generation_config(grounded, extraction_type):
+    """The grounded tier answers in free text, since structured output cannot be combined with Google Search."""
+    if grounded:
+        return types.GenerateContentConfig(
+            temperature=1,
+            top_p=0.95,
+            candidate_count=1,
+            max_output_tokens=8192,
+            response_modalities=["TEXT"],
+            safety_settings=SAFETY_SETTINGS,
+            tools=[types.Tool(google_search=types.GoogleSearch())],
+        )
+    return types.GenerateContentConfig(
+        temperature=0,
+        candidate_count=1,
+        max_output_tokens=8192,
+        response_mime_type="application/json",
+        response_schema=response_schema(extraction_type, assessed=EXTRACTION_GROUNDING == 'auto'),
+        safety_settings=SAFETY_SETTINGS,
+    )
+
+def generate(tier, prompt, config):
+    start = time.perf_counter()
+    try:
+        response = gemini_rate_limiter.call(lambda: client.models.generate_content(
+            model=MODEL,
+            contents=[types.Content(role="user", parts=[{"text": prompt}])],
+            config=config,
+        ), estimate_tokens(prompt))
+        result = response.text.strip()
+    except Exception:
+        tier_metrics.record_call(tier, time.perf_counter() - start, failed=True)
+        raise
+    tier_metrics.record_call(tier, time.perf_counter() - start)
+    return result
+
+def fast_extraction(extraction_type, prompt):
+    """Ungrounded, deterministic structured pass. Returns (output, escalation reason or None)."""
+    if EXTRACTION_GROUNDING == 'auto':
+        prompt = f"{prompt}\n\n{ASSESSMENT_INSTRUCTIONS}"
+    data = json.loads(generate('fast', prompt, generation_config(False, extraction_type)))
+    output = normalize_result(data, extraction_type)
+
+    reason = None
+    if EXTRACTION_GROUNDING == 'auto':
+        confidence = data.get('confidence')
+        if (extraction_type != 'events' and not output["disease"]) or (extraction_type != 'disease' and not output["events"]):
+            reason = 'empty_result'
+        elif not isinstance(confidence, (int, float)) or confidence < EXTRACTION_CONFIDENCE_THRESHOLD:
+            reason = 'low_confidence'
+        elif [term for term in data.get('unrecognized_terms') or [] if str(term).strip()]:
+            reason = 'unrecognized_terms'
+    return output, reason
+
+def grounded_extraction(extraction_type, prompt):
+    if extraction_type == 'combined':
+        result = generate('grounded', (
+            f"{prompt}\n\nRespond with only a JSON object of the form "
+            "{\"disease\": \"...\", \"events\": [{\"event\": \"...\", \"category\": \"...\"}]}, where category is one of "
+            f"{', '.join(EVENT_CATEGORIES)}."
+        ), generation_config(True, extraction_type))
+        return normalize_result(parse_json_text(result), extraction_type)
+
+    result = generate('grounded', prompt, generation_config(True, extraction_type))
+    if extraction_type == 'disease':
+        return {"disease": result, "events": []}
+    return {"disease": "", "events": parse_events(result)}
+
+def run_extraction(extraction_type, prompt):
+    """Return (output, tier), grounding only when the fast pass is not trusted."""
+    if EXTRACTION_GROUNDING == 'always':
+        return grounded_extraction(extraction_type, prompt), 'grounded'
+
+    fast_output = None
+    try:
+        fast_output, reason = fast_extraction(extraction_type, prompt)
+    except Exception as e:
+        if EXTRACTION_GROUNDING == 'never':
+            raise
+        logger.warning(f"Ungrounded {extraction_type} extraction failed, grounding instead: {str(e)}")
+        reason = 'fast_error'
+
+    if EXTRACTION_GROUNDING == 'never':
+        return fast_output, 'fast'
+    tier_metrics.record_decision(reason)
+    if reason is None:
+        return fast_output, 'fast'
+
+    logger.info(f"Grounding {extraction_type} extraction: {reason}")
+    try:
+        return grounded_extraction(extraction_type, prompt), 'grounded'
+    except Exception as e:
+        if fast_output is None:
+            raise
+        logger.warning(f"Grounded {extraction_type} extraction failed, returning the ungrounded answer: {str(e)}")
+        return fast_output, 'fast'
+
 @functions_framework.http
 def extract_medical_info(request):
     # Enable CORS
     if request.method == 'OPTIONS':
         headers = {
             'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Methods': 'POST',
+            'Access-Control-Allow-Methods': 'GET, POST',
             'Access-Control-Allow-Headers': 'Content-Type',
             'Access-Control-Max-Age': '3600'
         }
@@ -30,6 +338,14 @@ def extract_medical_info(request):
 
     headers = {'Access-Control-Allow-Origin': '*'}
 
+    # GET exposes per-tier latency, fast-pass hit rate and cache counters for tuning the threshold
+    if request.method == 'GET':
+        return jsonify({
+            'grounding': EXTRACTION_GROUNDING,
+            'tiers': tier_metrics.stats(),
+            'extraction_cache': extraction_cache.stats()
+        }), 200, headers
+
     try:
         request_json = request.get_json()
         if not request_json:
@@ -39,11 +355,16 @@ def extract_medical_info(request):
         extraction_type = request_json.get('extraction_type', 'disease')  # Default to disease
         specialty = request_json.get('specialty', 'oncology')  # Default to oncology
         prompt_content = request_json.get('prompt_content')
+        disease_prompt_content = request_json.get('disease_prompt_content')
+        events_prompt_content = request_json.get('events_prompt_content')
 
         if not text:
             return jsonify({'error': 'Missing text field'}), 400, headers
-            
-        if not prompt_content:
+
+        if extraction_type == 'combined':
+            if not disease_prompt_content or not events_prompt_content:
+                return jsonify({'error': 'Missing disease_prompt_content or events_prompt_content'}), 400, headers
+        elif not prompt_content:
             return jsonify({'error': 'Missing prompt_content'}), 400, headers
 
         # Combine prompt with text
@@ -51,75 +372,21 @@ def extract_medical_info(request):
             prompt = f"{prompt_content}\n\nCase notes:\n{text}"
         elif extraction_type == 'events':
             prompt = f"{prompt_content}\n\nCase input:\n{text}"
+        elif extraction_type == 'combined':
+            prompt = combined_prompt(disease_prompt_content, events_prompt_content, text)
         else:
             return jsonify({'error': f'Unsupported extraction type: {extraction_type}'}), 400, headers
 
-        # Create content for Gemini
-        contents = [
-            types.Content(
-                role="user",
-                parts=[{"text": prompt}]
-            )
-        ]
-
-        # Configure Gemini model
-        model = "gemini-2.0-flash-001"
-        tools = [types.Tool(google_search=types.GoogleSearch())]
-        generate_content_config = types.GenerateContentConfig(
-            temperature=1,
-            top_p=0.95,
-            candidate_count=1,
-            max_output_tokens=8192,
-            response_modalities=["TEXT"],
-            safety_settings=[
-                types.SafetySetting(
-                    category="HARM_CATEGORY_HATE_SPEECH",
-                    threshold="OFF"
-                ),
-                types.SafetySetting(
-                    category="HARM_CATEGORY_DANGEROUS_CONTENT",
-                    threshold="OFF"
-                ),
-                types.SafetySetting(
-                    category="HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                    threshold="OFF"
-                ),
-                types.SafetySetting(
-                    category="HARM_CATEGORY_HARASSMENT",
-                    threshold="OFF"
-                )
-            ],
-            tools=tools,
-        )
+        cache_key = extraction_cache.key(extraction_type, prompt)
+        cached = extraction_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Returning cached {extraction_type} extraction")
+            return jsonify({"result": cached["result"], "tier": cached["tier"], "cached": True}), 200, headers
 
-        # Generate response using Gemini
-        response = client.models.generate_content(
-            model=model,
-            contents=contents,
-            config=generate_content_config,
-        )
+        output, tier = run_extraction(extraction_type, prompt)
 
-        result = response.text.strip()
-        
-        # Format the result based on extraction type
-        if extraction_type == 'disease':
-            output = {
-                "result": {
-                    "disease": result,
-                    "events": []
-                }
-            }
-        elif extraction_type == 'events':
-            # Parse the events from quote-separated format
-            events = [event.strip(' "\'') for event in result.split('"') if event.strip(' "\'')]
-            output = {
-                "result": {
-                    "disease": "",
-                    "events": events
-                }
-            }
-            
-        return jsonify(output), 200, headers
+        extraction_cache.put(cache_key, {"result": output, "tier": tier})
+        return jsonify({"result": output, "tier": tier, "cached": False}), 200, headers
 
     except Exception as e:
         logger.error(f"Error processing request: {str(e)}")
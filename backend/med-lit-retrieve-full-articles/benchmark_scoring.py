@@ -0,0 +1,91 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Check score_batch against calculate_points and compare their speed.
+
+Scores synthetic article metadata with every weight profile, fails if any
+total, total type or breakdown differs, then times re-scoring the same
+articles with every profile. Usage:
+  python benchmark_scoring.py [--articles 5000] [--seed 0]
+"""
+
+import argparse
+import random
+import sys
+import time
+
+from scoring import SCORING_PROFILES, ScoringColumns, calculate_points, score_batch, score_columns
+
+PAPER_TYPES = ['Clinical Trial', 'Review', 'Case Report', 'Original Research', 'systematic review', '', None]
+YEARS = [2024, '2019', '1998', 2025, 'n/a', None, '', 2010.0]
+
+def synthetic_metadata(rng):
+    metadata = {
+        'journal_title': rng.choice(['Blood', 'J Clin Oncol', 'Leukemia', '']),
+        'journal_sjr': rng.choice([0, 0.4, 2.917, 13.5, 106094.0, '5.2', None]),
+        'year': rng.choice(YEARS),
+        'paper_type': rng.choice(PAPER_TYPES),
+        'actionable_events': [{'event': f"event {index}", 'matches_query': rng.random() < 0.4}
+                              for index in range(rng.randint(0, 6))],
+    }
+    for field in ['disease_match', 'pediatric_focus', 'drugs_tested', 'treatment_shown', 'cell_studies',
+                  'mice_studies', 'case_report', 'series_of_case_reports', 'clinical_study',
+                  'clinical_study_on_children', 'novelty']:
+        metadata[field] = rng.random() < 0.3
+    return metadata
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    metadatas = [synthetic_metadata(rng) for _ in range(args.articles)]
+    profiles = list(SCORING_PROFILES) + [{'journal_impact': 1.5, 'year': -2.5, 'disease_match': 80}]
+    current_year = 2025
+
+    mismatches = 0
+    for profile in profiles:
+        totals, breakdowns = score_batch(metadatas, profile, current_year)
+        for metadata, total, breakdown in zip(metadatas, totals, breakdowns):
+            expected_total, expected_breakdown = calculate_points(metadata, profile=profile, current_year=current_year)
+            if (total != expected_total or type(total) is not type(expected_total)
+                    or list(breakdown.items()) != list(expected_breakdown.items())):
+                mismatches += 1
+    print(f"{len(profiles)} profiles x {args.articles} articles: {mismatches} mismatches")
+
+    start = time.perf_counter()
+    for profile in profiles:
+        for metadata in metadatas:
+            calculate_points(metadata, profile=profile, current_year=current_year)
+    scalar = time.perf_counter() - start
+    start = time.perf_counter()
+    columns = ScoringColumns(metadatas)
+    build = time.perf_counter() - start
+    start = time.perf_counter()
+    for profile in profiles:
+        score_columns(columns, profile, current_year)
+    batch = time.perf_counter() - start
+    start = time.perf_counter()
+    for profile in profiles:
+        score_columns(columns, profile, current_year, breakdowns=False)
+    totals_only = time.perf_counter() - start
+    print(f"{len(profiles)} profiles: scalar {scalar * 1000:.1f} ms; batch {build * 1000:.1f} ms to build columns once, then "
+          f"{batch * 1000:.1f} ms with breakdowns ({scalar / (build + batch):.1f}x), "
+          f"{totals_only * 1000:.1f} ms totals only ({scalar / (build + totals_only):.1f}x)")
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
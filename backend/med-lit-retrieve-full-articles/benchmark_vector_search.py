@@ -0,0 +1,137 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Recall-versus-latency benchmark of the local vector index against BigQuery VECTOR_SEARCH.
+
+Usage:
+  python benchmark_vector_search.py <index_dir> <queries.txt> [--top-k 15] [--nprobe 4 8 16 32]
+
+queries.txt holds one events text per block, separated by blank lines.
+BigQuery results are the ground truth; recall@k is the share of BigQuery's
+top-k PMCIDs that the local index also returns.
+
+The nprobe table times index.search alone. With --end-to-end the service's
+own run_vector_search and run_local_vector_search are also timed, including
+query embedding and content fetches, once with a cold query embedding
+cache and once warm, so the local path is compared with the one it replaces.
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+from google.cloud import bigquery
+
+from local_vector_search import LocalVectorIndex
+
+def bigquery_search(client, events_text, top_k):
+    """Run VECTOR_SEARCH and return (PMCIDs, query embedding, seconds)."""
+    project_id = os.environ.get('BIGQUERY_PROJECT_ID', 'wz-data-catalog-demo')
+    pmid_dataset = os.environ.get('PMID_DATASET', 'pubmed')
+    query = f"""
+    SELECT base.name AS PMCID, distance, query.ml_generate_embedding_result AS query_embedding
+    FROM VECTOR_SEARCH(
+        TABLE `{project_id}.{pmid_dataset}.pmid_embed_nonzero_metadata`,
+        'ml_generate_embedding_result',
+        (SELECT ml_generate_embedding_result
+         FROM ML.GENERATE_EMBEDDING(
+             MODEL `{project_id}.{pmid_dataset}.textembed`,
+             (SELECT @query_text AS content)
+         )),
+        top_k => {int(top_k)}
+    )
+    ORDER BY distance
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ScalarQueryParameter('query_text', 'STRING', events_text)]
+    )
+    start = time.perf_counter()
+    rows = list(client.query(query, job_config=job_config).result())
+    elapsed = time.perf_counter() - start
+    return [row['PMCID'] for row in rows], list(rows[0]['query_embedding']) if rows else None, elapsed
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def time_retrieval(retrieve, queries, top_k, cache):
+    """Time retrieve(events_text, top_k) over the queries with a cold and then a warm query embedding cache."""
+    cold = []
+    warm = []
+    for events_text in queries:
+        cache.entries.clear()
+        for latencies in (cold, warm):
+            start = time.perf_counter()
+            retrieve(events_text, top_k)
+            latencies.append(time.perf_counter() - start)
+    return cold, warm
+
+def end_to_end(index_dir, queries, top_k):
+    """Compare the service's BigQuery and local retrieval paths, end to end."""
+    os.environ['LOCAL_INDEX_DIR'] = index_dir
+    import main as service
+
+    print(f"{'retrieval':>10} {'cold p50 ms':>12} {'cold p95 ms':>12} {'warm p50 ms':>12} {'warm p95 ms':>12}")
+    for name, retrieve in [('bigquery', service.run_vector_search), ('local', service.run_local_vector_search)]:
+        cold, warm = time_retrieval(retrieve, queries, top_k, service.query_embedding_cache)
+        print(f"{name:>10} {statistics.median(cold) * 1000:>12.0f} {percentile(cold, 0.95) * 1000:>12.0f} "
+              f"{statistics.median(warm) * 1000:>12.0f} {percentile(warm, 0.95) * 1000:>12.0f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('index_dir')
+    parser.add_argument('queries')
+    parser.add_argument('--top-k', type=int, default=15)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[4, 8, 16, 32, 64])
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--end-to-end', action='store_true',
+                        help="also time run_vector_search against run_local_vector_search, embedding and content included")
+    args = parser.parse_args()
+
+    with open(args.queries) as f:
+        queries = [block.strip() for block in f.read().split('\n\n') if block.strip()]
+
+    client = bigquery.Client(project=os.environ.get('BIGQUERY_PROJECT_ID', 'wz-data-catalog-demo'))
+    index = LocalVectorIndex(args.index_dir)
+    print(f"Local index: {len(index)} rows, {index.manifest['quantization']}, {index.manifest['nlist']} lists")
+
+    ground_truth = []
+    bigquery_latencies = []
+    for events_text in queries:
+        pmcids, embedding, elapsed = bigquery_search(client, events_text, args.top_k)
+        if embedding is not None:
+            ground_truth.append((set(pmcids), embedding))
+            bigquery_latencies.append(elapsed)
+    print(f"BigQuery VECTOR_SEARCH: p50 {statistics.median(bigquery_latencies) * 1000:.0f} ms, "
+          f"p95 {percentile(bigquery_latencies, 0.95) * 1000:.0f} ms over {len(ground_truth)} queries")
+
+    print(f"{'nprobe':>8} {'recall@' + str(args.top_k):>10} {'p50 ms':>8} {'p95 ms':>8}")
+    for nprobe in args.nprobe:
+        recalls = []
+        latencies = []
+        for expected, embedding in ground_truth:
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                hits = index.search(embedding, args.top_k, nprobe)
+                latencies.append(time.perf_counter() - start)
+            recalls.append(len(expected & {hit['PMCID'] for hit in hits}) / len(expected))
+        print(f"{nprobe:>8} {statistics.mean(recalls):>10.3f} "
+              f"{statistics.median(latencies) * 1000:>8.2f} {percentile(latencies, 0.95) * 1000:>8.2f}")
+
+    if args.end_to_end:
+        end_to_end(args.index_dir, queries, args.top_k)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Journal SJR lookup backed by a versioned on-disk snapshot.
+
+The snapshot is a header, fixed-size records sorted by normalized title and
+a UTF-8 string blob. JournalSnapshot reads it in place from a memory map:
+opening it parses only the header, and an exact title lookup is a binary
+search that decodes the few records it touches. JournalIndex adds ISSN,
+abbreviation and fuzzy matching on top; the indexes those need are built
+from the snapshot on the first lookup that needs them, never at import.
+"""
+
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+# Words ignored when matching abbreviated journal titles (e.g. "J Clin Oncol")
+JOURNAL_STOPWORDS = {'the', 'of', 'and', 'for', 'in', 'on', 'at'}
+
+# Snapshot layout: header, fixed-size records sorted by normalized title, then a UTF-8 string blob
+JOURNAL_SNAPSHOT_MAGIC = b'SJRSNAP'
+JOURNAL_SNAPSHOT_FORMAT = 1
+JOURNAL_SNAPSHOT_HEADER = struct.Struct('<7sBqI')  # magic, format, created_at, record count
+JOURNAL_SNAPSHOT_RECORD = struct.Struct('<dII')    # sjr, blob offset, blob length
+JOURNAL_SNAPSHOT_SEPARATOR = '\x1f'
+
+def normalize_journal_title(title):
+    """Lowercase, strip accents and punctuation, and collapse whitespace for journal matching."""
+    title = unicodedata.normalize('NFKD', title or '').encode('ascii', 'ignore').decode('ascii').lower()
+    title = re.sub(r'[^a-z0-9]+', ' ', title.replace('&', ' and ')).strip()
+    if title.startswith('the '):
+        title = title[4:]
+    return title
+
+def normalize_issn(issn):
+    """Reduce an ISSN such as '1527-7755' or '15277755' to its 8 significant characters."""
+    issn = re.sub(r'[^0-9X]', '', str(issn or '').upper())
+    return issn if len(issn) == 8 else None
+
+def journal_words(normalized_title):
+    return [word for word in normalized_title.split() if word not in JOURNAL_STOPWORDS]
+
+def journal_trigrams(normalized_title):
+    padded = f"  {normalized_title} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def encode_journal_snapshot(records, created_at=None):
+    """Encode (title, sjr, issns) records as snapshot bytes.
+
+    Records are expected in descending SJR order, as BigQuery returns them.
+    A normalized title keeps only its first record, so duplicates resolve to
+    the highest score. The normalized titles are stored alongside the
+    originals so lookups never normalize snapshot entries.
+    """
+    created_at = int(created_at or time.time())
+    unique = {}
+    for title, sjr, issns, *_ in records:
+        normalized = normalize_journal_title(title)
+        if normalized and normalized not in unique:
+            unique[normalized] = (title, sjr, issns)
+    blob = bytearray()
+    index = bytearray()
+    for normalized in sorted(unique):
+        title, sjr, issns = unique[normalized]
+        issns = ','.join(issn.strip() for issn in issns if issn.strip())
+        entry = JOURNAL_SNAPSHOT_SEPARATOR.join((title, normalized, issns)).encode('utf-8')
+        index += JOURNAL_SNAPSHOT_RECORD.pack(sjr, len(blob), len(entry))
+        blob += entry
+    header = JOURNAL_SNAPSHOT_HEADER.pack(JOURNAL_SNAPSHOT_MAGIC, JOURNAL_SNAPSHOT_FORMAT, created_at, len(unique))
+    return bytes(header + index + blob)
+
+def write_journal_snapshot(path, records, created_at=None):
+    """Write (title, sjr, issns) records to a versioned snapshot file, replacing `path` atomically."""
+    data = encode_journal_snapshot(records, created_at)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return JOURNAL_SNAPSHOT_HEADER.unpack_from(data, 0)[2]
+
+class JournalSnapshot:
+    """Read-only view of snapshot bytes (usually a memory map); records are decoded on access."""
+
+    def __init__(self, buf):
+        magic, snapshot_format, created_at, count = JOURNAL_SNAPSHOT_HEADER.unpack_from(buf, 0)
+        if magic != JOURNAL_SNAPSHOT_MAGIC or snapshot_format != JOURNAL_SNAPSHOT_FORMAT:
+            raise ValueError("Unsupported journal snapshot format")
+        self.buf = buf
+        self.created_at = created_at
+        self.count = count
+        self.blob_start = JOURNAL_SNAPSHOT_HEADER.size + count * JOURNAL_SNAPSHOT_RECORD.size
+        if len(buf) < self.blob_start:
+            raise ValueError("Truncated journal snapshot")
+
+    @classmethod
+    def open(cls, path):
+        """Memory-map a snapshot file; the map stays valid after the file is closed."""
+        with open(path, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return cls(buf)
+        except Exception:
+            buf.close()
+            raise
+
+    @classmethod
+    def from_records(cls, records, created_at=None):
+        return cls(encode_journal_snapshot(records, created_at))
+
+    def __len__(self):
+        return self.count
+
+    def sjr(self, idx):
+        return JOURNAL_SNAPSHOT_RECORD.unpack_from(self.buf, JOURNAL_SNAPSHOT_HEADER.size + idx * JOURNAL_SNAPSHOT_RECORD.size)[0]
+
+    def record(self, idx):
+        """Return (title, normalized title, sjr, issns) for the record at idx."""
+        sjr, offset, length = JOURNAL_SNAPSHOT_RECORD.unpack_from(
+            self.buf, JOURNAL_SNAPSHOT_HEADER.size + idx * JOURNAL_SNAPSHOT_RECORD.size)
+        start = self.blob_start + offset
+        title, normalized, issns = self.buf[start:start + length].decode('utf-8').split(JOURNAL_SNAPSHOT_SEPARATOR)
+        return title, normalized, sjr, issns.split(',') if issns else []
+
+    def find(self, normalized):
+        """Binary search for a normalized title; returns its record index or None."""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.record(middle)[1] < normalized:
+                low = middle + 1
+            else:
+                high = middle
+        return low if low < self.count and self.record(low)[1] == normalized else None
+
+class JournalIndex:
+    """Journal resolver over a JournalSnapshot.
+
+    Titles are resolved by normalized exact match, then ISSN, then NLM-style
+    abbreviations (each abbreviated word is a prefix of the full word), and
+    finally by trigram similarity for misspelled or reworded titles. Exact
+    matches binary-search the snapshot; the ISSN, abbreviation and trigram
+    indexes are built on the first lookup that needs them.
+    """
+
+    def __init__(self, snapshot=None, fuzzy_threshold=0.6):
+        self.snapshot = snapshot if snapshot is not None else JournalSnapshot.from_records([], 0)
+        self.fuzzy_threshold = fuzzy_threshold
+        self.by_issn = None
+        self.by_initials = None
+        self.by_trigram = None
+        self.trigram_counts = None
+        self.index_lock = threading.Lock()
+        self.resolve = lru_cache(maxsize=4096)(self._resolve)
+
+    @classmethod
+    def from_records(cls, records, fuzzy_threshold=0.6):
+        return cls(JournalSnapshot.from_records(records), fuzzy_threshold)
+
+    def __len__(self):
+        return len(self.snapshot)
+
+    def _key_indexes(self):
+        with self.index_lock:
+            if self.by_issn is None:
+                by_issn = {}
+                by_initials = defaultdict(list)
+                # Visit titles by descending SJR so an ISSN or abbreviation shared by several
+                # journals resolves to the highest-ranked one, as it did in BigQuery order
+                records = [self.snapshot.record(idx) for idx in range(len(self.snapshot))]
+                for idx in sorted(range(len(records)), key=lambda idx: -records[idx][2]):
+                    _, normalized, _, issns = records[idx]
+                    for issn in issns:
+                        key = normalize_issn(issn)
+                        if key:
+                            by_issn.setdefault(key, idx)
+                    words = journal_words(normalized)
+                    if words:
+                        by_initials[''.join(word[0] for word in words)].append(idx)
+                self.by_initials = by_initials
+                self.by_issn = by_issn
+        return self.by_issn, self.by_initials
+
+    def _trigram_index(self):
+        with self.index_lock:
+            if self.by_trigram is None:
+                by_trigram = defaultdict(list)
+                counts = []
+                for idx in range(len(self.snapshot)):
+                    trigrams = journal_trigrams(self.snapshot.record(idx)[1])
+                    counts.append(len(trigrams))
+                    for gram in trigrams:
+                        by_trigram[gram].append(idx)
+                self.trigram_counts = counts
+                self.by_trigram = by_trigram
+        return self.by_trigram, self.trigram_counts
+
+    def _match_abbreviation(self, normalized):
+        words = journal_words(normalized)
+        if not words:
+            return None
+        _, by_initials = self._key_indexes()
+        for idx in by_initials.get(''.join(word[0] for word in words), []):
+            full_words = journal_words(self.snapshot.record(idx)[1])
+            if len(full_words) == len(words) and all(full.startswith(word) for word, full in zip(words, full_words)):
+                return idx
+        return None
+
+    def _match_fuzzy(self, normalized):
+        by_trigram, trigram_counts = self._trigram_index()
+        trigrams = journal_trigrams(normalized)
+        shared = Counter()
+        for gram in trigrams:
+            shared.update(by_trigram.get(gram, ()))
+        best_idx, best_score = None, 0
+        for idx, count in shared.items():
+            score = count / (len(trigrams) + trigram_counts[idx] - count)
+            if score > best_score:
+                best_idx, best_score = idx, score
+        return best_idx if best_score >= self.fuzzy_threshold else None
+
+    def _resolve(self, journal_title, issn=None):
+        """Return (sjr, matched title, match method) for a journal, or (0, None, None) if unknown."""
+        normalized = normalize_journal_title(journal_title)
+        idx, method = (self.snapshot.find(normalized) if normalized else None), 'exact'
+        if idx is None and normalize_issn(issn):
+            idx, method = self._key_indexes()[0].get(normalize_issn(issn)), 'issn'
+        if idx is None and normalized:
+            idx, method = self._match_abbreviation(normalized), 'abbreviation'
+        if idx is None and normalized:
+            idx, method = self._match_fuzzy(normalized), 'fuzzy'
+        if idx is None:
+            return 0, None, None
+        title, _, sjr, _ = self.snapshot.record(idx)
+        return sjr, title, method
+
+    def exact_sjr(self, journal_title):
+        """SJR for an exact normalized title match only; used to spot journal names in article text."""
+        normalized = normalize_journal_title(journal_title)
+        idx = self.snapshot.find(normalized) if normalized else None
+        return self.snapshot.sjr(idx) if idx is not None else 0
@@ -0,0 +1,271 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Local vector search over an exported, memory-mapped PubMed embedding matrix.
+
+An index directory holds:
+  manifest.json     format version, dimension, quantization and IVF settings
+  embeddings.npy    (N, D) float16 or int8 matrix, rows grouped by IVF list
+  scales.npy        (N,) float32 per-row scales (int8 quantization only)
+  centroids.npy     (nlist, D) float32 IVF centroids
+  list_offsets.npy  (nlist + 1,) int64 start row of each IVF list
+  pmcids.npy        (N,) PMCIDs in the same row order
+  pmids.npy         (N,) PMIDs in the same row order
+  contents.bin      zlib-compressed article texts in the same row order (--with-content only)
+  content_offsets.npy (N + 1,) int64 byte offset of each row's text in contents.bin
+
+The manifest also names the Vertex AI embedding model behind the table's
+embeddings (--embedding-model), so queries can be embedded without a
+BigQuery job; with contents exported too, a search needs no BigQuery at all.
+
+Build one from BigQuery with:
+  python local_vector_search.py export <index_dir> [--quantization int8|float16] [--nlist N]
+      [--with-content] [--embedding-model text-embedding-005]
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+import zlib
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT = 1
+
+class LocalVectorIndex:
+    """IVF index over a memory-mapped embedding matrix.
+
+    Distances are Euclidean, matching the VECTOR_SEARCH default, so results
+    can be compared directly with BigQuery.
+    """
+
+    def __init__(self, index_dir, nprobe=None):
+        with open(os.path.join(index_dir, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('format') != INDEX_FORMAT:
+            raise ValueError(f"Unsupported local vector index format in {index_dir}")
+        self.embeddings = np.load(os.path.join(index_dir, 'embeddings.npy'), mmap_mode='r')
+        self.scales = None
+        if self.manifest['quantization'] == 'int8':
+            self.scales = np.load(os.path.join(index_dir, 'scales.npy'), mmap_mode='r')
+        self.centroids = np.load(os.path.join(index_dir, 'centroids.npy'))
+        self.list_offsets = np.load(os.path.join(index_dir, 'list_offsets.npy'))
+        self.pmcids = np.load(os.path.join(index_dir, 'pmcids.npy'), mmap_mode='r')
+        self.pmids = np.load(os.path.join(index_dir, 'pmids.npy'), mmap_mode='r')
+        self.has_content = bool(self.manifest.get('content'))
+        if self.has_content:
+            self.content_offsets = np.load(os.path.join(index_dir, 'content_offsets.npy'), mmap_mode='r')
+            self.contents = np.memmap(os.path.join(index_dir, 'contents.bin'), dtype=np.uint8, mode='r')
+        self.dimension = self.manifest['dimension']
+        self.nprobe = nprobe or self.manifest['nprobe']
+
+    def __len__(self):
+        return self.embeddings.shape[0]
+
+    def content(self, row):
+        """Return the exported article text for a row."""
+        start, end = int(self.content_offsets[row]), int(self.content_offsets[row + 1])
+        return zlib.decompress(self.contents[start:end].tobytes()).decode('utf-8')
+
+    def _rows(self, start, end):
+        block = np.asarray(self.embeddings[start:end], dtype=np.float32)
+        if self.scales is not None:
+            block *= self.scales[start:end, None]
+        return block
+
+    def search(self, query_embedding, top_k=15, nprobe=None, with_content=False):
+        """Return the top_k nearest articles as dicts with PMCID, PMID and distance, plus content if asked."""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        centroid_distances = ((self.centroids - query) ** 2).sum(axis=1)
+        probe = np.argsort(centroid_distances)[:nprobe or self.nprobe]
+
+        candidate_rows = []
+        candidate_distances = []
+        for list_id in probe:
+            start, end = int(self.list_offsets[list_id]), int(self.list_offsets[list_id + 1])
+            if start == end:
+                continue
+            block = self._rows(start, end)
+            candidate_rows.append(np.arange(start, end))
+            candidate_distances.append(((block - query) ** 2).sum(axis=1))
+        if not candidate_rows:
+            return []
+
+        rows = np.concatenate(candidate_rows)
+        distances = np.concatenate(candidate_distances)
+        k = min(top_k, len(rows))
+        best = np.argpartition(distances, k - 1)[:k]
+        best = best[np.argsort(distances[best])]
+        hits = []
+        for i in best:
+            hit = {
+                "PMCID": str(self.pmcids[rows[i]]),
+                "PMID": str(self.pmids[rows[i]]),
+                "distance": float(np.sqrt(distances[i]))
+            }
+            if with_content:
+                hit["content"] = self.content(int(rows[i]))
+            hits.append(hit)
+        return hits
+
+def kmeans(vectors, nlist, iterations=20, seed=0):
+    """Plain Lloyd's k-means used to train the IVF centroids on a sample of rows."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = assign_lists(vectors, centroids)
+        for list_id in range(nlist):
+            members = vectors[assignments == list_id]
+            # Re-seed empty lists from a random vector so every list stays usable
+            centroids[list_id] = members.mean(axis=0) if len(members) else vectors[rng.integers(len(vectors))]
+    return centroids
+
+def assign_lists(vectors, centroids, chunk_size=8192):
+    """Assign each vector to its nearest centroid, in chunks to bound memory."""
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk_size):
+        chunk = np.asarray(vectors[start:start + chunk_size], dtype=np.float32)
+        distances = centroid_norms[None, :] - 2 * chunk @ centroids.T
+        assignments[start:start + chunk_size] = distances.argmin(axis=1)
+    return assignments
+
+def export_index(index_dir, table, project_id=None, quantization='int8', nlist=None, nprobe=None,
+                 sample_size=100000, iterations=20, page_size=10000, with_content=False, embedding_model=None):
+    """Export embeddings (and optionally contents) from BigQuery and build a quantized IVF index in `index_dir`."""
+    from google.cloud import bigquery
+
+    os.makedirs(index_dir, exist_ok=True)
+    client = bigquery.Client(project=project_id)
+    query = f"""
+    SELECT name AS PMCID, CAST(PMID AS STRING) AS PMID, ml_generate_embedding_result AS embedding
+           {', content' if with_content else ''}
+    FROM `{table}`
+    """
+    rows = client.query(query).result(page_size=page_size)
+    total_rows = rows.total_rows
+
+    # First pass: stream rows into a float32 scratch matrix on disk
+    raw_path = os.path.join(index_dir, 'raw_embeddings.npy')
+    raw_contents_path = os.path.join(index_dir, 'raw_contents.bin')
+    raw = None
+    pmcids = []
+    pmids = []
+    raw_content_offsets = [0]
+    raw_contents = open(raw_contents_path, 'wb') if with_content else None
+    for i, row in enumerate(rows):
+        if raw is None:
+            raw = np.lib.format.open_memmap(raw_path, mode='w+', dtype=np.float32, shape=(total_rows, len(row['embedding'])))
+        raw[i] = row['embedding']
+        pmcids.append(row['PMCID'])
+        pmids.append(row['PMID'] or '')
+        if raw_contents:
+            raw_content_offsets.append(raw_content_offsets[-1] + raw_contents.write(zlib.compress((row['content'] or '').encode('utf-8'))))
+    if raw_contents:
+        raw_contents.close()
+    if raw is None:
+        raise ValueError(f"No embeddings found in {table}")
+    raw.flush()
+    logger.info(f"Exported {total_rows} embeddings of dimension {raw.shape[1]}")
+
+    # Train IVF centroids on a sample and group rows by list so each list is a contiguous slice
+    nlist = nlist or max(1, int(np.sqrt(total_rows)))
+    nprobe = nprobe or max(1, nlist // 8)
+    rng = np.random.default_rng(0)
+    sample = np.asarray(raw[np.sort(rng.choice(total_rows, min(sample_size, total_rows), replace=False))])
+    centroids = kmeans(sample, min(nlist, len(sample)), iterations)
+    assignments = assign_lists(raw, centroids)
+    order = np.argsort(assignments, kind='stable')
+    list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=len(centroids)))])
+
+    # Second pass: write the quantized matrix in list order
+    dtype = np.int8 if quantization == 'int8' else np.float16
+    embeddings = np.lib.format.open_memmap(os.path.join(index_dir, 'embeddings.npy'), mode='w+', dtype=dtype, shape=raw.shape)
+    scales = np.empty(total_rows, dtype=np.float32)
+    for start in range(0, total_rows, page_size):
+        block = np.asarray(raw[order[start:start + page_size]], dtype=np.float32)
+        if quantization == 'int8':
+            block_scales = np.abs(block).max(axis=1) / 127
+            block_scales[block_scales == 0] = 1
+            scales[start:start + len(block)] = block_scales
+            embeddings[start:start + len(block)] = np.round(block / block_scales[:, None]).astype(np.int8)
+        else:
+            embeddings[start:start + len(block)] = block.astype(np.float16)
+    embeddings.flush()
+    del raw, embeddings
+    os.remove(raw_path)
+
+    # Contents are rewritten in the same list order so a row's text sits next to its neighbours'
+    if with_content:
+        content_offsets = np.zeros(total_rows + 1, dtype=np.int64)
+        with open(raw_contents_path, 'rb') as source, open(os.path.join(index_dir, 'contents.bin'), 'wb') as target:
+            for position, row in enumerate(order):
+                source.seek(raw_content_offsets[row])
+                content_offsets[position + 1] = content_offsets[position] + target.write(
+                    source.read(raw_content_offsets[row + 1] - raw_content_offsets[row]))
+        os.remove(raw_contents_path)
+        np.save(os.path.join(index_dir, 'content_offsets.npy'), content_offsets)
+
+    if quantization == 'int8':
+        np.save(os.path.join(index_dir, 'scales.npy'), scales)
+    np.save(os.path.join(index_dir, 'centroids.npy'), centroids.astype(np.float32))
+    np.save(os.path.join(index_dir, 'list_offsets.npy'), list_offsets.astype(np.int64))
+    np.save(os.path.join(index_dir, 'pmcids.npy'), np.array(pmcids)[order])
+    np.save(os.path.join(index_dir, 'pmids.npy'), np.array(pmids)[order])
+    with open(os.path.join(index_dir, 'manifest.json'), 'w') as f:
+        json.dump({
+            "format": INDEX_FORMAT,
+            "source_table": table,
+            "created_at": int(time.time()),
+            "rows": total_rows,
+            "dimension": int(centroids.shape[1]),
+            "quantization": quantization,
+            "nlist": int(len(centroids)),
+            "nprobe": int(nprobe),
+            "content": bool(with_content),
+            "embedding_model": embedding_model
+        }, f, indent=2)
+    logger.info(f"Wrote local vector index with {len(centroids)} lists to {index_dir}")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Build a local vector index from the BigQuery embedding table.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export_parser = subparsers.add_parser('export')
+    export_parser.add_argument('index_dir')
+    export_parser.add_argument('--quantization', choices=['int8', 'float16'], default='int8')
+    export_parser.add_argument('--nlist', type=int)
+    export_parser.add_argument('--nprobe', type=int)
+    export_parser.add_argument('--with-content', action='store_true',
+                               help="also export article contents so searches need no BigQuery job")
+    export_parser.add_argument('--embedding-model',
+                               help="Vertex AI model behind the table's embeddings, used to embed queries")
+    args = parser.parse_args()
+
+    project_id = os.environ.get('BIGQUERY_PROJECT_ID', 'wz-data-catalog-demo')
+    pmid_dataset = os.environ.get('PMID_DATASET', 'pubmed')
+    export_index(
+        args.index_dir,
+        f'{project_id}.{pmid_dataset}.pmid_embed_nonzero_metadata',
+        project_id=project_id,
+        quantization=args.quantization,
+        nlist=args.nlist,
+        nprobe=args.nprobe,
+        with_content=args.with_content,
+        embedding_model=args.embedding_model,
+    )
@@ -3,46 +3,360 @@ from flask import jsonify, request, Response
 from google import genai
 from google.genai import types
 from google.cloud import bigquery
+import hashlib
 import json
 import logging
 import time
-import math
 import os
-from datetime import datetime
+import sqlite3
+import sys
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+
+from gemini_rate_limiter import RateLimitExceeded, estimate_tokens, gemini_rate_limiter
+from journals import JournalIndex, JournalSnapshot, write_journal_snapshot
+from prescreen import prescreen_candidates
+from scoring import calculate_points, resolve_scoring_profile, score_batch
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Global variable to store journal impact data
-journal_impact_data = {}
+# Substituted for {journal_context} in methodologies that still carry the old SJR table placeholder
+JOURNAL_CONTEXT_NOTE = "Journal SJR scores are resolved by the server from the extracted journal title. Report journal_sjr as 0."
 
-def fetch_journal_impact_data():
-    """Fetch journal impact data from BigQuery and store in memory."""
-    global journal_impact_data
+# Journal resolver over the installed snapshot (empty until one is loaded)
+journal_index = JournalIndex()
+
+# On-disk journal snapshot: a bundled copy shipped with the deployment and a local cache refreshed in the background
+JOURNAL_SNAPSHOT_BUNDLED = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'journal_impact_snapshot.bin')
+JOURNAL_SNAPSHOT_PATH = os.environ.get('JOURNAL_SNAPSHOT_PATH', '/tmp/journal_impact_snapshot.bin')
+JOURNAL_SNAPSHOT_TTL = int(os.environ.get('JOURNAL_SNAPSHOT_TTL', str(24 * 3600)))
+JOURNAL_SNAPSHOT_RETRY = 300
+
+# Unix time the installed journal data was produced (0 when nothing is loaded)
+journal_snapshot_created_at = 0
+
+def install_journal_snapshot(snapshot):
+    """Swap in a new journal index; readers see either the old or the new version."""
+    global journal_index, journal_snapshot_created_at
+    journal_index = JournalIndex(snapshot)
+    journal_snapshot_created_at = snapshot.created_at
+
+def load_journal_snapshot():
+    """Install the newest readable snapshot from local cache or the deployment bundle."""
+    newest = None
+    for path in (JOURNAL_SNAPSHOT_PATH, JOURNAL_SNAPSHOT_BUNDLED):
+        if not os.path.exists(path):
+            continue
+        try:
+            start = time.monotonic()
+            snapshot = JournalSnapshot.open(path)
+            logger.info(f"Opened {len(snapshot)} journal records from {path} in {(time.monotonic() - start) * 1000:.1f} ms")
+        except Exception as e:
+            logger.error(f"Error reading journal snapshot {path}: {str(e)}")
+            continue
+        if newest is None or snapshot.created_at > newest.created_at:
+            newest = snapshot
+    if newest:
+        install_journal_snapshot(newest)
+    return newest is not None
+
+# Number of articles analyzed concurrently by stream_response, and the most a request may ask for with max_workers
+ANALYSIS_MAX_WORKERS = int(os.environ.get('ANALYSIS_MAX_WORKERS', '4'))
+ANALYSIS_MAX_WORKERS_LIMIT = int(os.environ.get('ANALYSIS_MAX_WORKERS_LIMIT', '8'))
+
+# Gemini model used for per-article analysis (part of the analysis cache key)
+GEMINI_MODEL = "gemini-2.0-flash-001"
+
+class MemoryAnalysisCache:
+    """In-process LRU cache of article analyses with a per-entry TTL."""
+
+    def __init__(self, max_entries=1000, ttl=7 * 24 * 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return json.loads(value)
+
+    def get_many(self, keys):
+        found = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.time() + self.ttl, json.dumps(value))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+class SQLiteAnalysisCache:
+    """Local-disk analysis cache; expired entries are dropped and the least recently used are pruned."""
+
+    def __init__(self, path, max_entries=10000, ttl=7 * 24 * 3600, table='analyses'):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.table = table
+        self.local = threading.local()
+        self._connection().execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT, expires_at REAL, accessed_at REAL)"
+        )
+
+    def _connection(self):
+        # sqlite3 connections cannot be shared across threads, so keep one per worker thread
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self.local.connection = connection
+        return connection
+
+    def get(self, key):
+        connection = self._connection()
+        row = connection.execute(f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if row[1] < now:
+            connection.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            return None
+        connection.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def get_many(self, keys):
+        connection = self._connection()
+        now = time.time()
+        found = {}
+        keys = list(keys)
+        # Stay well under SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ", ".join("?" * len(batch))
+            rows = connection.execute(
+                f"SELECT key, value FROM {self.table} WHERE key IN ({placeholders}) AND expires_at >= ?", (*batch, now)
+            ).fetchall()
+            found.update((key, json.loads(value)) for key, value in rows)
+            connection.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key IN ({placeholders})", (now, *batch))
+        return found
+
+    def set(self, key, value):
+        connection = self._connection()
+        now = time.time()
+        connection.execute(
+            f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), now + self.ttl, now),
+        )
+        connection.execute(f"DELETE FROM {self.table} WHERE expires_at < ?", (now,))
+        connection.execute(
+            f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+class FirestoreAnalysisCache:
+    """Analysis cache shared across instances in a Firestore collection.
+
+    Entries carry an `expires_at` timestamp, which can also back a Firestore TTL policy.
+    """
+
+    def __init__(self, collection='analysis_cache', ttl=7 * 24 * 3600):
+        from google.cloud import firestore
+        self.db = firestore.Client(database=os.environ.get('DATABASE_ID', '(default)'))
+        self.collection = self.db.collection(collection)
+        self.ttl = ttl
+
+    def get(self, key):
+        doc = self.collection.document(key).get()
+        if not doc.exists:
+            return None
+        data = doc.to_dict()
+        if data['expires_at'] < datetime.now(timezone.utc):
+            return None
+        return json.loads(data['value'])
+
+    def get_many(self, keys):
+        now = datetime.now(timezone.utc)
+        snapshots = self.db.get_all([self.collection.document(key) for key in keys])
+        return {
+            snapshot.id: json.loads(snapshot.get('value'))
+            for snapshot in snapshots
+            if snapshot.exists and snapshot.get('expires_at') >= now
+        }
+
+    def set(self, key, value):
+        self.collection.document(key).set({
+            'value': json.dumps(value),
+            'expires_at': datetime.now(timezone.utc) + timedelta(seconds=self.ttl),
+        })
+
+class RedisAnalysisCache:
+    """Analysis cache shared across instances in Redis (or Memorystore), using native key expiry."""
+
+    def __init__(self, url, ttl=7 * 24 * 3600, prefix='analysis'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(f"{self.prefix}:{key}")
+        return json.loads(value) if value else None
+
+    def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = self.client.mget([f"{self.prefix}:{key}" for key in keys])
+        return {key: json.loads(value) for key, value in zip(keys, values) if value}
+
+    def set(self, key, value):
+        self.client.set(f"{self.prefix}:{key}", json.dumps(value), ex=int(self.ttl))
+
+def create_analysis_cache(sessions=False):
+    """Build the analysis cache selected by ANALYSIS_CACHE_BACKEND (memory, sqlite, firestore, redis or none).
+
+    With sessions, build the separate store for retrieval sessions on the same
+    backend, with its own size (SESSION_STORE_MAX_ENTRIES) and TTL
+    (SESSION_STORE_TTL), so sessions never evict analyses.
+    """
+    backend = os.environ.get('ANALYSIS_CACHE_BACKEND', 'memory').lower()
+    if sessions:
+        ttl = int(os.environ.get('SESSION_STORE_TTL', str(24 * 3600)))
+        max_entries = int(os.environ.get('SESSION_STORE_MAX_ENTRIES', '1000'))
+    else:
+        ttl = int(os.environ.get('ANALYSIS_CACHE_TTL', str(7 * 24 * 3600)))
+        max_entries = int(os.environ.get('ANALYSIS_CACHE_MAX_ENTRIES', '1000'))
+    try:
+        if backend == 'none':
+            return None
+        if backend == 'sqlite':
+            return SQLiteAnalysisCache(os.environ.get('ANALYSIS_CACHE_PATH', '/tmp/analysis_cache.sqlite3'), max_entries, ttl,
+                                       'sessions' if sessions else 'analyses')
+        if backend == 'firestore':
+            collection = os.environ.get('ANALYSIS_CACHE_COLLECTION', 'analysis_cache')
+            return FirestoreAnalysisCache(f"{collection}_sessions" if sessions else collection, ttl)
+        if backend == 'redis':
+            return RedisAnalysisCache(os.environ['ANALYSIS_CACHE_REDIS_URL'], ttl, 'session' if sessions else 'analysis')
+        return MemoryAnalysisCache(max_entries, ttl)
+    except Exception as e:
+        logger.error(f"Error initializing {backend} analysis cache, falling back to memory: {str(e)}")
+        return MemoryAnalysisCache(max_entries, ttl)
+
+analysis_cache = create_analysis_cache()
+
+# Retrieval sessions for /rerank: (PMCID, cache key) lists kept apart from the analyses they point to
+session_store = create_analysis_cache(sessions=True)
+
+def analysis_cache_key(pmcid, disease=None, events_text=None, methodology_content=None, model=GEMINI_MODEL):
+    """Content-addressed key for one article analyzed against one patient context and methodology."""
+    payload = json.dumps([pmcid, disease or '', events_text or '', methodology_content or '', model])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def get_cached_analyses(keys):
+    """Return {key: analysis} for the keys found in one batched cache read; cache failures never fail the request."""
+    if analysis_cache is None or not keys:
+        return {}
+    try:
+        return analysis_cache.get_many(keys)
+    except Exception as e:
+        logger.error(f"Error reading analysis cache: {str(e)}")
+        return {}
+
+def get_session(session_id):
+    """Return a stored session's (PMCID, cache key) pairs, or None if it is unknown or expired."""
+    if session_store is None:
+        return None
+    try:
+        session = session_store.get(session_id)
+    except Exception as e:
+        logger.error(f"Error reading session store: {str(e)}")
+        return None
+    return [tuple(entry) for entry in session['articles']] if session else None
+
+def store_session(session_id, entries):
+    """Remember which cached analyses a retrieval produced, as (PMCID, cache key) pairs, for later re-ranking."""
+    if session_store is None:
+        return
+    try:
+        session_store.set(session_id, {'articles': [list(entry) for entry in entries]})
+    except Exception as e:
+        logger.error(f"Error writing session store: {str(e)}")
+
+def store_cached_analysis(key, analysis):
+    """Cache an analysis without its full article text, which is re-attached from BigQuery on a hit."""
+    if analysis_cache is None:
+        return
+    try:
+        analysis_cache.set(key, {k: v for k, v in analysis.items() if k != 'full_article_text'})
+    except Exception as e:
+        logger.error(f"Error writing analysis cache: {str(e)}")
+
+def query_journal_records():
+    """Query the SJR table in BigQuery and return (title, sjr, issns) records with valid scores."""
     project_id = os.environ.get('GENAI_PROJECT_ID', 'gemini-med-lit-review')
     journal_dataset = os.environ.get('JOURNAL_DATASET', 'journal_rank')
     query = f"""
     SELECT
       `title`,
-      `sjr`
+      `sjr`,
+      `issn`
     FROM
       `{project_id}.{journal_dataset}.scimagojr_2023`
     ORDER BY 
       sjr DESC
     """
+    query_job = bq_client.query(query)
+    return [
+        (row['title'], float(row['sjr']), (row['issn'] or '').split(','))
+        for row in query_job.result()
+        if row['sjr'] is not None
+    ]
+
+def fetch_journal_impact_data():
+    """Fetch journal impact data from BigQuery, persist it as a snapshot and install it."""
     try:
-        query_job = bq_client.query(query)
-        results = query_job.result()
-        
-        # Convert to dictionary for faster lookups, handling None values
-        journal_impact_data = {}
-        for row in results:
-            if row['sjr'] is not None:
-                journal_impact_data[row['title']] = float(row['sjr'])
-        logger.info(f"Loaded {len(journal_impact_data)} journal impact records with valid SJR scores")
+        records = query_journal_records()
+        created_at = int(time.time())
+        try:
+            write_journal_snapshot(JOURNAL_SNAPSHOT_PATH, records, created_at)
+            snapshot = JournalSnapshot.open(JOURNAL_SNAPSHOT_PATH)
+        except OSError as e:
+            logger.error(f"Error writing journal snapshot: {str(e)}")
+            snapshot = JournalSnapshot.from_records(records, created_at)
+        install_journal_snapshot(snapshot)
+        logger.info(f"Loaded {len(snapshot)} journal impact records with valid SJR scores")
+        return True
     except Exception as e:
         logger.error(f"Error fetching journal impact data: {str(e)}")
+        return False
+
+def refresh_journal_impact_data():
+    """Background loop that re-fetches journal data once the installed snapshot is older than the TTL."""
+    while True:
+        age = time.time() - journal_snapshot_created_at
+        if age < JOURNAL_SNAPSHOT_TTL:
+            time.sleep(JOURNAL_SNAPSHOT_TTL - age)
+            continue
+        if not fetch_journal_impact_data():
+            time.sleep(JOURNAL_SNAPSHOT_RETRY)
 
 # Initialize clients
 client = genai.Client(
@@ -52,141 +366,22 @@ client = genai.Client(
 )
 bq_client = bigquery.Client(project=os.environ.get('BIGQUERY_PROJECT_ID', 'wz-data-catalog-demo'))
 
-def normalize_journal_score(sjr):
-    """Normalize journal SJR score to points between 0-25 to align with other scoring metrics."""
-    if not sjr:
-        return 0
-    # Use log scale to handle large range of SJR values (0 to 106094)
-    # Add 1 to avoid log(0)
-    # Multiply by 5 to align with other point values (5, 10, 15, 25)
-    normalized = math.log(sjr + 1) * 5
-    # Cap at 25 points to match the scale of other point calculations
-    return min(normalized, 25)
-
-def calculate_points(metadata, query_disease=None):
-    """Calculate points based on article metadata and return both total and breakdown."""
-    points = 0
-    breakdown = {}
-    
-    # Journal impact points
-    if metadata.get('journal_title') and metadata.get('journal_sjr'):
-        journal_title = metadata['journal_title']
-        sjr = float(metadata['journal_sjr'])
-        if sjr > 0:
-            impact_points = normalize_journal_score(sjr)
-            points += impact_points
-            breakdown['journal_impact'] = impact_points
-            logger.info(f"Journal '{journal_title}' has SJR {sjr}, awarded {impact_points:.2f} points")
-        else:
-            logger.info(f"Journal '{journal_title}' has no SJR score")
-    
-    # Year-based points: -5 points per year difference from current year
-    current_year = datetime.now().year
-    if metadata.get('year'):
-        try:
-            article_year = int(metadata.get('year'))
-            year_diff = current_year - article_year
-            year_points = -5 * year_diff
-            points += year_points
-            breakdown['year'] = year_points
-        except (ValueError, TypeError):
-            # If year is not a valid integer, skip year-based points
-            pass
-    
-    # Disease Match: +50 points
-    if metadata.get('disease_match'):
-        points += 50
-        breakdown['disease_match'] = 50
-    
-    # Pediatric Focus: +20 points
-    if metadata.get('pediatric_focus'):
-        points += 20
-        breakdown['pediatric_focus'] = 20
-    
-    # Paper Type: +40 points for clinical trial, -5 points for review
-    paper_type = metadata.get('paper_type', '').lower()
-    if 'clinical trial' in paper_type:
-        points += 40
-        breakdown['paper_type'] = 40
-    elif 'review' in paper_type:
-        points -= 5
-        breakdown['paper_type'] = -5
-    
-    # Actionable Events: +15 points per matched event
-    actionable_events = metadata.get('actionable_events', [])
-    matched_events = sum(1 for event in actionable_events if event.get('matches_query', False))
-    if matched_events > 0:
-        event_points = matched_events * 15
-        points += event_points
-        breakdown['actionable_events'] = event_points
-    
-    # Drugs Tested: +5 points
-    if metadata.get('drugs_tested'):
-        points += 5
-        breakdown['drugs_tested'] = 5
-    
-    # Drug Results: +50 points for actual positive treatment shown
-    if metadata.get('treatment_shown'):
-        points += 50
-        breakdown['treatment_shown'] = 50
-    
-    # Cell Studies: +5 points
-    if metadata.get('cell_studies'):
-        points += 5
-        breakdown['cell_studies'] = 5
-    
-    # Mice Studies: +10 points
-    if metadata.get('mice_studies'):
-        points += 10
-        breakdown['mice_studies'] = 10
-    
-    # Case Report: +5 points
-    if metadata.get('case_report'):
-        points += 5
-        breakdown['case_report'] = 5
-    
-    # Series of Case Reports: +10 points
-    if metadata.get('series_of_case_reports'):
-        points += 10
-        breakdown['series_of_case_reports'] = 10
-    
-    # Clinical Study: +15 points
-    if metadata.get('clinical_study'):
-        points += 15
-        breakdown['clinical_study'] = 15
-    
-    # Clinical Study on Children: +20 points
-    if metadata.get('clinical_study_on_children'):
-        points += 20
-        breakdown['clinical_study_on_children'] = 20
-    
-    # Novelty: +10 points
-    if metadata.get('novelty'):
-        points += 10
-        breakdown['novelty'] = 10
-    
-    return points, breakdown
+# Load journal data from disk at import. Without a snapshot, block on the first BigQuery load rather than
+# score (and cache) articles against an empty index; the background refresher handles later refreshes
+if not load_journal_snapshot():
+    logger.info("No journal snapshot found; loading journal impact data from BigQuery")
+    fetch_journal_impact_data()
+threading.Thread(target=refresh_journal_impact_data, name='journal-refresher', daemon=True).start()
 
 def create_gemini_prompt(article_text, pmid, methodology_content=None, disease=None, events_text=None):
     # Add disease and events context to the prompt if provided
     disease_context = f"\nThe patient's disease is: {disease}\n" if disease else ""
     events_context = f"\nThe patient's actionable events are: {events_text}\n" if events_text else ""
     
-    # Create journal context string
-    journal_context = ""
-    for title, sjr in journal_impact_data.items():
-        journal_context += f"- {title}: {sjr}\n"
-
     # Default methodology if none provided
     if not methodology_content:
         methodology_content = f"""You are an expert pediatric oncologist and you are the chair of the International Leukemia Tumor Board. Your goal is to evaluate full research articles related to oncology, especially those concerning pediatric leukemia, to identify potential advancements in treatment and understanding of the disease.{disease_context}{events_context}
 
-Journal Impact Data (SJR scores):
-The following is a list of journal titles and their SJR scores. When extracting the journal title from the article, find the best matching title from this list and use its SJR score. If no match is found, use 0 as the SJR score.
-
-Journal Titles and Scores:
-{journal_context}
-
 <Article>
 {article_text}
 </Article>
@@ -201,22 +396,23 @@ As an expert oncologist:
 
 Please analyze the article and provide a JSON response with the following structure:
 
-{
-  "article_metadata": {
+{{
+  "article_metadata": {{
     "title": "...",
     "year": "...",
-    "journal_title": "...",  // Extract the journal title from the article
-    "journal_sjr": 0,        // Look up the SJR score from the provided list. Use the score of the best matching journal title, or 0 if no match found
+    "journal_title": "...",  // Extract the full journal title from the article, exactly as printed
+    "journal_issn": "...",   // ISSN printed on the article, or "" if none
+    "journal_sjr": 0,        // Always 0; the SJR score is looked up after extraction
     "disease_focus": true/false,
     "pediatric_focus": true/false,
     "type_of_disease": "...",
     "disease_match": true/false,      // Set to true if article's disease is relevant to patient's condition
     "paper_type": "...",
     "actionable_events": [
-      {
+      {{
         "event": "...",
         "matches_query": true/false   // Set to true if this event matches any of the patient's actionable events
-      }
+      }}
     ],
     "drugs_tested": true/false,
     "drug_results": ["...", "..."],   // List of treatment outcomes
@@ -228,8 +424,8 @@ Please analyze the article and provide a JSON response with the following struct
     "clinical_study": true/false,
     "clinical_study_on_children": true/false,
     "novelty": true/false
-  }
-}
+  }}
+}}
 
 Important: The response must be valid JSON and follow this exact structure. Do not include any explanatory text, markdown formatting, or code blocks. Return only the raw JSON object."""
 
@@ -241,20 +437,29 @@ Important: The response must be valid JSON and follow this exact structure. Do n
     prompt = prompt.replace("{article_text}", article_text)
     prompt = prompt.replace("{disease}", disease if disease else "")
     prompt = prompt.replace("{events}", events_text if events_text else "")
-    prompt = prompt.replace("{journal_context}", journal_context)
+    prompt = prompt.replace("{journal_context}", JOURNAL_CONTEXT_NOTE)
     
     # Log the final prompt
     logger.info(f"Final prompt with article inserted:\n{prompt}")
     
     return prompt
 
-def analyze_with_gemini(article_text, pmid, methodology_content=None, disease=None, events_text=None):
+def resolve_journal_sjr(metadata):
+    """Set metadata['journal_sjr'] from the installed journal index and the extracted journal title or ISSN."""
+    sjr, matched_title, match_method = journal_index.resolve(metadata.get('journal_title') or '', metadata.get('journal_issn'))
+    metadata['journal_sjr'] = sjr
+    if matched_title:
+        logger.info(f"Resolved journal '{metadata.get('journal_title')}' to '{matched_title}' ({match_method}), SJR {sjr}")
+    return sjr
+
+def analyze_with_gemini(article_text, pmid, methodology_content=None, disease=None, events_text=None,
+                        scoring_profile=None):
     # Create prompt with JSON-only instruction
     prompt = create_gemini_prompt(article_text, pmid, methodology_content, disease, events_text)
     prompt += "\n\nIMPORTANT: Return ONLY the raw JSON object. Do not include any explanatory text, markdown formatting, or code blocks. The response should start with '{' and end with '}' with no other characters before or after."
     
     # Configure Gemini
-    model = "gemini-2.0-flash-001"
+    model = GEMINI_MODEL
     generate_content_config = types.GenerateContentConfig(
         temperature=0,
         top_p=0.95,
@@ -270,29 +475,15 @@ def analyze_with_gemini(article_text, pmid, methodology_content=None, disease=No
     # Create content with prompt
     contents = [types.Content(role="user", parts=[{"text": prompt}])]
     
-    # Initialize retry parameters
-    base_delay = 5  # Start with 5 seconds
-    attempt = 0
-    
-    while True:  # Keep trying indefinitely
-        try:
-            response = client.models.generate_content(
-                model=model,
-                contents=contents,
-                config=generate_content_config,
-            )
-            break  # If successful, break out of the retry loop
-        except Exception as e:
-            error_str = str(e)
-            if "429 RESOURCE_EXHAUSTED" in error_str:
-                attempt += 1
-                # Calculate exponential backoff delay with a maximum of 5 minutes
-                delay = min(base_delay * (2 ** (attempt - 1)), 300)  # Cap at 300 seconds (5 minutes)
-                print(f"Received RESOURCE_EXHAUSTED error. Attempt {attempt}. Waiting {delay} seconds before retry...")
-                time.sleep(delay)
-            else:
-                # If it's not a 429 error, raise immediately
-                raise
+    # Pace the call through the shared limiter; 429s are retried up to the retry deadline
+    response = gemini_rate_limiter.call(
+        lambda: client.models.generate_content(
+            model=model,
+            contents=contents,
+            config=generate_content_config,
+        ),
+        estimate_tokens(prompt),
+    )
     
     try:
         # Log Gemini's raw response with clear markers
@@ -337,7 +528,7 @@ def analyze_with_gemini(article_text, pmid, methodology_content=None, disease=No
                 return None
                 
             metadata = analysis['article_metadata']
-            required_fields = ['title', 'journal_title', 'journal_sjr', 'disease_focus', 'type_of_disease', 'paper_type', 'actionable_events']
+            required_fields = ['title', 'journal_title', 'disease_focus', 'type_of_disease', 'paper_type', 'actionable_events']
             for field in required_fields:
                 if field not in metadata:
                     logger.error(f"Invalid JSON structure - missing {field}")
@@ -352,9 +543,12 @@ def analyze_with_gemini(article_text, pmid, methodology_content=None, disease=No
             metadata = analysis['article_metadata']
             # Store PMID if available, but we'll use PMCID for links
             metadata['PMID'] = pmid
+
+            # Resolve the journal's SJR score locally from the extracted title
+            resolve_journal_sjr(metadata)
             
             # Calculate points with disease information
-            points, point_breakdown = calculate_points(metadata, disease)
+            points, point_breakdown = calculate_points(metadata, disease, scoring_profile)
             metadata['overall_points'] = points
             metadata['point_breakdown'] = point_breakdown
             
@@ -367,45 +561,298 @@ def analyze_with_gemini(article_text, pmid, methodology_content=None, disease=No
         logger.error(f"Error analyzing article with Gemini: {str(e)}")
         return None
 
-def create_bq_query(events_text, num_articles=15):
+class QueryEmbeddingCache:
+    """In-process LRU of query embeddings keyed by events text, with hit/miss counters."""
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def normalize(events_text):
+        """Collapse whitespace only: the embedding model sees case and event order, so texts differing in them never share a key."""
+        return ' '.join((events_text or '').split())
+
+    def get(self, events_text):
+        key = self.normalize(events_text)
+        with self.lock:
+            embedding = self.entries.get(key)
+            if embedding is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return embedding
+
+    def set(self, events_text, embedding):
+        key = self.normalize(events_text)
+        with self.lock:
+            self.entries[key] = embedding
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0,
+                "entries": len(self.entries)
+            }
+
+query_embedding_cache = QueryEmbeddingCache(int(os.environ.get('QUERY_EMBEDDING_CACHE_SIZE', '1000')))
+
+# Weight profile used to score articles when a request does not name one (see scoring.SCORING_PROFILES)
+SCORING_PROFILE = os.environ.get('SCORING_PROFILE', 'default')
+
+# Two-stage retrieval: how many vector hits to prescreen (0 analyzes exactly num_articles), how many articles
+# reaching PRESCREEN_MIN_POINTS end analysis early (0 never stops early) and the prescreen's distance weight
+PRESCREEN_CANDIDATES = int(os.environ.get('PRESCREEN_CANDIDATES', '0'))
+PRESCREEN_TARGET_ARTICLES = int(os.environ.get('PRESCREEN_TARGET_ARTICLES', '0'))
+PRESCREEN_MIN_POINTS = float(os.environ.get('PRESCREEN_MIN_POINTS', '80'))
+PRESCREEN_DISTANCE_WEIGHT = float(os.environ.get('PRESCREEN_DISTANCE_WEIGHT', '50'))
+
+# Retrieval backend: BigQuery VECTOR_SEARCH, or a local memory-mapped index exported by local_vector_search.py
+RETRIEVAL_BACKEND = os.environ.get('RETRIEVAL_BACKEND', 'bigquery')
+LOCAL_INDEX_DIR = os.environ.get('LOCAL_INDEX_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vector_index'))
+LOCAL_INDEX_NPROBE = int(os.environ.get('LOCAL_INDEX_NPROBE', '0')) or None
+# Vertex AI model that embeds queries for the local index; defaults to the one named in its manifest
+LOCAL_EMBEDDING_MODEL = os.environ.get('LOCAL_EMBEDDING_MODEL')
+local_vector_index = None
+local_vector_index_lock = threading.Lock()
+
+def get_pubmed_tables():
+    """Return the fully qualified PubMed embedding table and embedding model names."""
     project_id = os.environ.get('BIGQUERY_PROJECT_ID', 'wz-data-catalog-demo')
     pmid_dataset = os.environ.get('PMID_DATASET', 'pubmed')
     # Use the pre-joined table from the same project/dataset
-    pubmed_table = f'{project_id}.{pmid_dataset}.pmid_embed_nonzero_metadata'
-    embedding_model = f'{project_id}.{pmid_dataset}.textembed'
-    
-    return f"""
-    DECLARE query_text STRING;
-    SET query_text = \"\"\"
-    {events_text}
-    \"\"\";
+    return f'{project_id}.{pmid_dataset}.pmid_embed_nonzero_metadata', f'{project_id}.{pmid_dataset}.textembed'
+
+def create_bq_query(events_text, num_articles=15, query_embedding=None):
+    """Build the VECTOR_SEARCH query and its parameters.
+
+    With a cached `query_embedding` the vector is passed as an ARRAY<FLOAT64>
+    parameter and no embedding model call is made. Otherwise the events text
+    is embedded inline and the query embedding is returned with the results
+    so it can be cached.
+    """
+    pubmed_table, embedding_model = get_pubmed_tables()
 
+    if query_embedding is not None:
+        query = f"""
+    SELECT base.name AS PMCID, base.PMID, base.content, distance
+    FROM VECTOR_SEARCH(
+        TABLE `{pubmed_table}`,
+        'ml_generate_embedding_result',
+        (SELECT @query_embedding AS ml_generate_embedding_result),
+        top_k => {int(num_articles)}
+    )
+    ORDER BY distance
+    """
+        return query, [bigquery.ArrayQueryParameter('query_embedding', 'FLOAT64', query_embedding)]
+
+    query = f"""
     WITH vector_results AS (
-        SELECT base.name AS PMCID, base.PMID, base.content, distance 
+        SELECT base.name AS PMCID, base.PMID, base.content, distance,
+               query.ml_generate_embedding_result AS query_embedding
         FROM VECTOR_SEARCH(
             TABLE `{pubmed_table}`, 
             'ml_generate_embedding_result', 
             (SELECT ml_generate_embedding_result 
              FROM ML.GENERATE_EMBEDDING(
                  MODEL `{embedding_model}`, 
-                 (SELECT query_text AS content)
+                 (SELECT @query_text AS content)
              )), 
-            top_k => {num_articles}
+            top_k => {int(num_articles)}
         )
     )
     SELECT * FROM vector_results
     ORDER BY distance
     """
+    return query, [bigquery.ScalarQueryParameter('query_text', 'STRING', events_text)]
+
+def run_vector_search(events_text, num_articles=15):
+    """Return the top vector search hits for the events text, reusing cached query embeddings."""
+    query_embedding = query_embedding_cache.get(events_text)
+    query, query_parameters = create_bq_query(events_text, num_articles, query_embedding)
+    query_job = bq_client.query(query, job_config=bigquery.QueryJobConfig(query_parameters=query_parameters))
+    results = list(query_job.result())
+    if query_embedding is None and results and results[0].get('query_embedding'):
+        query_embedding_cache.set(events_text, list(results[0]['query_embedding']))
+    logger.info(f"Query embedding cache: {query_embedding_cache.stats()}")
+    return results
+
+def get_local_vector_index():
+    """Load the local vector index on first use; the matrix itself stays memory-mapped."""
+    global local_vector_index
+    with local_vector_index_lock:
+        if local_vector_index is None:
+            from local_vector_search import LocalVectorIndex
+            local_vector_index = LocalVectorIndex(LOCAL_INDEX_DIR, LOCAL_INDEX_NPROBE)
+            logger.info(f"Loaded local vector index with {len(local_vector_index)} articles from {LOCAL_INDEX_DIR}")
+    return local_vector_index
+
+def embed_events_text(events_text, embedding_model=None):
+    """Return the query embedding for the events text from cache or the Vertex AI embedding endpoint.
+
+    Without an embedding model the text is embedded by a BigQuery
+    ML.GENERATE_EMBEDDING job instead, which costs a job's startup latency.
+    """
+    query_embedding = query_embedding_cache.get(events_text)
+    if query_embedding is not None:
+        return query_embedding
+    if embedding_model:
+        response = client.models.embed_content(model=embedding_model, contents=events_text)
+        query_embedding = list(response.embeddings[0].values)
+    else:
+        _, bq_embedding_model = get_pubmed_tables()
+        query = f"""
+        SELECT ml_generate_embedding_result
+        FROM ML.GENERATE_EMBEDDING(MODEL `{bq_embedding_model}`, (SELECT @query_text AS content))
+        """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ScalarQueryParameter('query_text', 'STRING', events_text)]
+        )
+        rows = list(bq_client.query(query, job_config=job_config).result())
+        query_embedding = list(rows[0]['ml_generate_embedding_result'])
+    query_embedding_cache.set(events_text, query_embedding)
+    return query_embedding
+
+def fetch_article_contents(pmcids):
+    """Fetch PMID and full content for the given PMCIDs in one parameterized query."""
+    pubmed_table, _ = get_pubmed_tables()
+    query = f"""
+    SELECT name AS PMCID, PMID, content
+    FROM `{pubmed_table}`
+    WHERE name IN UNNEST(@pmcids)
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ArrayQueryParameter('pmcids', 'STRING', list(pmcids))]
+    )
+    return {row['PMCID']: row for row in bq_client.query(query, job_config=job_config).result()}
+
+def run_local_vector_search(events_text, num_articles=15):
+    """Rank articles with the local index and return its top hits with their content.
+
+    Queries are embedded by the Vertex AI endpoint and, when the index was
+    exported with its contents, the whole search runs without BigQuery;
+    otherwise the content of just the top hits is fetched in one query.
+    """
+    index = get_local_vector_index()
+    start = time.monotonic()
+    query_embedding = embed_events_text(events_text, LOCAL_EMBEDDING_MODEL or index.manifest.get('embedding_model'))
+    if len(query_embedding) != index.dimension:
+        raise ValueError(f"Query embedding has {len(query_embedding)} dimensions, the local index {index.dimension}")
+    embedded = time.monotonic()
+    hits = index.search(query_embedding, int(num_articles), with_content=index.has_content)
+    logger.info(f"Local vector search returned {len(hits)} hits in {(time.monotonic() - embedded) * 1000:.1f} ms "
+                f"after {(embedded - start) * 1000:.1f} ms embedding the query")
+    if index.has_content:
+        return hits
+    contents = fetch_article_contents([hit['PMCID'] for hit in hits])
+    results = []
+    for hit in hits:
+        row = contents.get(hit['PMCID'])
+        if row is None:
+            logger.warning(f"No content found for PMCID: {hit['PMCID']}")
+            continue
+        results.append({**hit, 'PMID': row['PMID'], 'content': row['content']})
+    return results
+
+def retrieve_articles(events_text, num_articles=15, retrieval_backend=None):
+    """Dispatch to the configured retrieval backend, falling back to BigQuery if the local index fails."""
+    if (retrieval_backend or RETRIEVAL_BACKEND) == 'local':
+        try:
+            return run_local_vector_search(events_text, num_articles)
+        except Exception as e:
+            logger.error(f"Local vector search failed, falling back to BigQuery: {str(e)}")
+    return run_vector_search(events_text, num_articles)
+
+def analyze_article(row, methodology_content=None, disease=None, events_text=None, cache_key=None,
+                    scoring_profile=None):
+    """Analyze a single vector search hit with Gemini, attach its PMCID and PMC link, and cache the result."""
+    pmcid = row['PMCID']  # This is PMCID from the query result
+    pmid = row['PMID']   # This is PMID from the query result
+    content = row['content']
+
+    # Log article details before analysis
+    logger.info(f"Processing article:\nPMCID: {pmcid}\nPMID: {pmid}\nContent length: {len(content)}\nFirst 200 chars: {content[:200]}")
 
-def stream_response(events_text, methodology_content=None, disease=None, num_articles=15):
+    # Pass PMID for analysis but we'll use PMCID for links
+    analysis = analyze_with_gemini(content, pmid, methodology_content, disease, events_text, scoring_profile)
+    if analysis and 'article_metadata' in analysis:
+        # Add PMCID to metadata and generate PMC link
+        analysis['article_metadata']['PMCID'] = pmcid
+        analysis['article_metadata']['link'] = f'https://www.ncbi.nlm.nih.gov/pmc/articles/{pmcid}/'
+        # An analysis scored against an empty journal index (BigQuery unreachable at cold start) is not cached
+        if cache_key and len(journal_index):
+            store_cached_analysis(cache_key, analysis)
+    return analysis
+
+def create_article_event(idx, completed, total_articles, analysis):
+    """Build the NDJSON article_analysis event, tagged with the article's original rank."""
+    return json.dumps({
+        "type": "article_analysis",
+        "data": {
+            "progress": {
+                "article_number": idx,
+                "completed_articles": completed,
+                "total_articles": total_articles
+            },
+            "analysis": analysis
+        }
+    }) + "\n"
+
+def stream_response(events_text, methodology_content=None, disease=None, num_articles=15, max_workers=None,
+                    retrieval_backend=None, scoring_profile=None, candidate_articles=None, target_articles=None,
+                    min_points=None):
+    """Stream article analyses as NDJSON.
+
+    With candidate_articles above num_articles, that many vector hits are
+    prescreened on cheap signals and only the best num_articles are analyzed.
+    With target_articles, analysis stops once that many articles reach
+    min_points.
+    """
     try:
-        # Execute BigQuery
-        # Execute BigQuery and log results
-        query = create_bq_query(events_text, num_articles)
-        query_job = bq_client.query(query)
-        results = list(query_job.result())
+        candidate_articles = int(candidate_articles or 0)
+        target_articles = int(target_articles or 0)
+        min_points = PRESCREEN_MIN_POINTS if min_points is None else float(min_points)
+        two_stage = candidate_articles > int(num_articles)
+
+        # Execute vector search
+        results = retrieve_articles(events_text, candidate_articles if two_stage else num_articles, retrieval_backend)
+        cache_keys = [analysis_cache_key(row['PMCID'], disease, events_text, methodology_content) for row in results]
+
+        if two_stage:
+            # Stage one: rank every candidate on cheap signals and keep the best num_articles for full analysis
+            estimates = prescreen_candidates(
+                results, events_text, disease, resolve_scoring_profile(scoring_profile), journal_index.exact_sjr,
+                distance_weight=PRESCREEN_DISTANCE_WEIGHT,
+            )
+            order = sorted(range(len(results)), key=lambda index: estimates[index][0], reverse=True)[:int(num_articles)]
+            for rank, index in enumerate(order, 1):
+                logger.info(f"Prescreen #{rank} {results[index]['PMCID']}: {estimates[index][0]:.1f} {estimates[index][1]}")
+            logger.info(f"Prescreened {len(results)} candidates down to {len(order)} for full analysis")
+            total_candidates = len(results)
+            results = [results[index] for index in order]
+            cache_keys = [cache_keys[index] for index in order]
         total_articles = len(results)
-        
+
+        # Points are not part of the cache key; rescore cached analyses for this request's profile and the current
+        # year, against the journal index installed now rather than the one the analysis was first scored with
+        cached = {}
+        for cache_key, analysis in get_cached_analyses(cache_keys).items():
+            if 'article_metadata' in analysis:
+                metadata = analysis['article_metadata']
+                resolve_journal_sjr(metadata)
+                metadata['overall_points'], metadata['point_breakdown'] = calculate_points(metadata, disease, scoring_profile)
+                cached[cache_key] = analysis
+
         # Get array of PMCIDs from BigQuery results and stream immediately
         retrieved_pmcids = [row['PMCID'] for row in results]
         print(f"Retrieved PMCIDs: {retrieved_pmcids}")
@@ -418,72 +865,97 @@ def stream_response(events_text, methodology_content=None, disease=None, num_art
             }
         }) + "\n"
 
+        # The session records each article's cache key so its analyses can be re-ranked without Gemini
+        session_id = uuid.uuid4().hex
+        store_session(session_id, zip(retrieved_pmcids, cache_keys))
+
         # Stream initial metadata
+        initial_metadata = {
+            "total_articles": total_articles,
+            "current_article": 0,
+            "status": "processing",
+            "session_id": session_id
+        }
+        if two_stage:
+            initial_metadata["candidate_articles"] = total_candidates
         yield json.dumps({
             "type": "metadata",
-            "data": {
-                "total_articles": total_articles,
-                "current_article": 0,
-                "status": "processing"
-            }
+            "data": initial_metadata
         }) + "\n"
 
-        # Process each article
-        for idx, row in enumerate(results, 1):
-            pmcid = row['PMCID']  # This is PMCID from the query result
-            pmid = row['PMID']   # This is PMID from the query result
-            content = row['content']
-            
-            # Log article details before analysis
-            logger.info(f"Processing article:\nPMCID: {pmcid}\nPMID: {pmid}\nContent length: {len(content)}\nFirst 200 chars: {content[:200]}")
-            
-            # Add delay between articles
-            if idx > 1:  # Don't delay for first article
-                logger.info("Waiting 5 seconds before next analysis...")
-                time.sleep(5)
-            
-            # Analyze with Gemini and prepare complete response object
-            try:
-                # Pass PMID for analysis but we'll use PMCID for links
-                analysis = analyze_with_gemini(content, pmid, methodology_content, disease, events_text)
-                if analysis and 'article_metadata' in analysis:
-                    # Add PMCID to metadata and generate PMC link
-                    analysis['article_metadata']['PMCID'] = pmcid
-                    analysis['article_metadata']['link'] = f'https://www.ncbi.nlm.nih.gov/pmc/articles/{pmcid}/'
-                    # Create complete response object
-                    response_obj = {
-                        "type": "article_analysis",
-                        "data": {
-                            "progress": {
+        # Serve cached analyses immediately; only cache misses go to Gemini
+        completed = 0
+        high_scoring = 0
+        pending = []
+        for idx, (row, cache_key) in enumerate(zip(results, cache_keys), 1):
+            analysis = cached.get(cache_key)
+            if analysis:
+                logger.info(f"Analysis cache hit for PMCID: {row['PMCID']}")
+                analysis['full_article_text'] = row['content']
+                completed += 1
+                high_scoring += analysis['article_metadata']['overall_points'] >= min_points
+                yield create_article_event(idx, completed, total_articles, analysis)
+            else:
+                pending.append((idx, row, cache_key))
+
+        target_reached = bool(target_articles) and high_scoring >= target_articles
+        stopped_early = target_reached and bool(pending)
+        if stopped_early:
+            logger.info(f"{high_scoring} cached articles reach {min_points} points; skipping {len(pending)} analyses")
+            pending = []
+
+        # Analyze the rest on a bounded worker pool and stream each result as soon as it finishes
+        workers = max(1, min(int(max_workers or ANALYSIS_MAX_WORKERS), ANALYSIS_MAX_WORKERS_LIMIT, len(pending) or 1))
+        logger.info(f"Analyzing {len(pending)} of {total_articles} articles with {workers} workers")
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            futures = {}
+            for idx, row, cache_key in pending:
+                future = executor.submit(analyze_article, row, methodology_content, disease, events_text, cache_key,
+                                         scoring_profile)
+                futures[future] = (idx, row['PMCID'])
+
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+                idx, pmcid = futures[future]
+                completed += 1
+                try:
+                    analysis = future.result()
+                    if analysis and 'article_metadata' in analysis:
+                        # Send complete JSON object with newline
+                        yield create_article_event(idx, completed, total_articles, analysis)
+                        high_scoring += analysis['article_metadata']['overall_points'] >= min_points
+                        if target_articles and high_scoring >= target_articles and not target_reached:
+                            # Enough strong articles: drop queued analyses, but stream the ones already running
+                            target_reached = True
+                            cancelled = sum(other.cancel() for other in futures if not other.done())
+                            stopped_early = cancelled > 0
+                            logger.info(f"{high_scoring} articles reach {min_points} points; cancelled {cancelled} queued analyses")
+                    else:
+                        logger.error(f"Failed to analyze article PMCID: {pmcid}")
+                        error_obj = {
+                            "type": "error",
+                            "data": {
+                                "message": f"Failed to analyze article PMCID: {pmcid}",
                                 "article_number": idx,
                                 "total_articles": total_articles
-                            },
-                            "analysis": analysis
+                            }
                         }
-                    }
-                    # Send complete JSON object with newline
-                    yield json.dumps(response_obj) + "\n"
-                else:
-                    logger.error(f"Failed to analyze article PMCID: {row['PMCID']}")
-                    error_obj = {
+                        yield json.dumps(error_obj) + "\n"
+                except Exception as e:
+                    logger.error(f"Error processing article PMCID: {pmcid}: {str(e)}")
+                    yield json.dumps({
                         "type": "error",
                         "data": {
-                            "message": f"Failed to analyze article PMCID: {row['PMCID']}",
+                            "message": f"Error processing article PMCID: {pmcid}: {str(e)}",
                             "article_number": idx,
                             "total_articles": total_articles
                         }
-                    }
-                    yield json.dumps(error_obj) + "\n"
-            except Exception as e:
-                logger.error(f"Error processing article PMCID: {row['PMCID']}: {str(e)}")
-                yield json.dumps({
-                    "type": "error",
-                    "data": {
-                        "message": f"Error processing article PMCID: {row['PMCID']}: {str(e)}",
-                        "article_number": idx,
-                        "total_articles": total_articles
-                    }
-                }) + "\n"
+                    }) + "\n"
+        finally:
+            # Drop queued work if the client disconnected before all articles finished
+            executor.shutdown(wait=False, cancel_futures=True)
 
         # Send completion message as complete JSON object
         completion_obj = {
@@ -494,6 +966,8 @@ def stream_response(events_text, methodology_content=None, disease=None, num_art
                 "status": "complete"
             }
         }
+        if stopped_early:
+            completion_obj["data"].update({"total_articles": completed, "current_article": completed, "stopped_early": True})
         yield json.dumps(completion_obj) + "\n"
 
     except Exception as e:
@@ -505,22 +979,115 @@ def stream_response(events_text, methodology_content=None, disease=None, num_art
             }
         }) + "\n"
 
+def rerank_cached_analyses(session_id=None, pmcids=None, disease=None, events_text=None, methodology_content=None,
+                           scoring_profile=None, limit=None):
+    """Rescore cached analyses with a scoring profile and return them best first, without calling Gemini.
+
+    Articles come from a previous retrieval's session_id, or from PMCIDs analyzed with the same
+    disease, events_text and methodology_content. Year points are recomputed against the current year
+    and journal points against the installed journal index.
+    """
+    start = time.perf_counter()
+    if session_id:
+        entries = get_session(session_id)
+        if entries is None:
+            raise LookupError(f"Unknown or expired session: {session_id}")
+    else:
+        entries = [(pmcid, analysis_cache_key(pmcid, disease, events_text, methodology_content)) for pmcid in pmcids]
+    entries = list(dict.fromkeys(entries))
+
+    found = get_cached_analyses([cache_key for _, cache_key in entries])
+    analyses = []
+    missing = []
+    for pmcid, cache_key in entries:
+        analysis = found.get(cache_key)
+        if analysis and 'article_metadata' in analysis:
+            resolve_journal_sjr(analysis['article_metadata'])
+            analyses.append(analysis)
+        else:
+            missing.append(pmcid)
+
+    totals, breakdowns = score_batch([analysis['article_metadata'] for analysis in analyses], scoring_profile)
+    for analysis, total, breakdown in zip(analyses, totals, breakdowns):
+        analysis['article_metadata']['overall_points'] = total
+        analysis['article_metadata']['point_breakdown'] = breakdown
+    # Stable sort: ties keep their retrieval order
+    order = sorted(range(len(analyses)), key=lambda index: totals[index], reverse=True)
+    ranked = [analyses[index] for index in order]
+    if limit:
+        ranked = ranked[:limit]
+
+    return {
+        "articles": ranked,
+        "missing_pmcids": missing,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2)
+    }
+
+def handle_rerank(request_json, headers):
+    """POST /rerank: re-rank a previous session's (or a PMCID list's) cached analyses with another scoring profile."""
+    if analysis_cache is None:
+        return jsonify({'error': 'Re-ranking needs an analysis cache (ANALYSIS_CACHE_BACKEND is none)'}), 503, headers
+    session_id = request_json.get('session_id')
+    pmcids = request_json.get('pmcids')
+    if not session_id and not pmcids:
+        return jsonify({'error': 'Provide session_id or pmcids'}), 400, headers
+    if pmcids is not None and (not isinstance(pmcids, list) or not all(isinstance(pmcid, str) for pmcid in pmcids)):
+        return jsonify({'error': 'pmcids must be a list of strings'}), 400, headers
+
+    limit = request_json.get('limit')
+    if limit is not None and (isinstance(limit, bool) or not isinstance(limit, int) or limit < 1):
+        return jsonify({'error': 'limit must be a positive integer'}), 400, headers
+
+    scoring_profile = request_json.get('scoring_profile', SCORING_PROFILE)
+    try:
+        resolve_scoring_profile(scoring_profile)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400, headers
+
+    try:
+        result = rerank_cached_analyses(
+            session_id=session_id,
+            pmcids=pmcids,
+            disease=request_json.get('disease'),
+            events_text=request_json.get('events_text'),
+            methodology_content=request_json.get('methodology_content'),
+            scoring_profile=scoring_profile,
+            limit=limit,
+        )
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404, headers
+    except Exception as e:
+        logger.error(f"Error re-ranking cached analyses: {str(e)}")
+        return jsonify({'error': str(e)}), 500, headers
+    logger.info(f"Re-ranked {len(result['articles'])} cached analyses in {result['elapsed_ms']} ms "
+                f"({len(result['missing_pmcids'])} not cached)")
+    return jsonify(result), 200, headers
+
 @functions_framework.http
 def retrieve_full_articles(request):
     # Enable CORS
     if request.method == 'OPTIONS':
         headers = {
             'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Methods': 'POST',
+            'Access-Control-Allow-Methods': 'GET, POST',
             'Access-Control-Allow-Headers': 'Content-Type',
             'Access-Control-Max-Age': '3600'
         }
         return ('', 204, headers)
-    
-    # Fetch journal impact data on first request if not already loaded
-    if not journal_impact_data:
-        fetch_journal_impact_data()
 
+    # GET exposes cache counters for monitoring
+    if request.method == 'GET':
+        return jsonify({
+            'query_embedding_cache': query_embedding_cache.stats()
+        }), 200, {'Access-Control-Allow-Origin': '*'}
+
+    # Re-ranking is served by this service so it can read the in-process memory analysis cache
+    if request.path.rstrip('/').endswith('/rerank'):
+        request_json = request.get_json(silent=True)
+        if not request_json:
+            return jsonify({'error': 'No JSON data received'}), 400, {'Access-Control-Allow-Origin': '*'}
+        return handle_rerank(request_json, {'Access-Control-Allow-Origin': '*'})
+    
     headers = {
         'Access-Control-Allow-Origin': '*',
         'Content-Type': 'text/event-stream',
@@ -541,9 +1108,24 @@ def retrieve_full_articles(request):
         methodology_content = request_json.get('methodology_content')
         disease = request_json.get('disease')
         num_articles = request_json.get('num_articles', 15)  # Default to 15 if not provided
+        max_workers = request_json.get('max_workers')  # Defaults to ANALYSIS_MAX_WORKERS
+        if max_workers is not None:
+            if isinstance(max_workers, bool) or not isinstance(max_workers, int) or max_workers < 1:
+                return jsonify({'error': 'max_workers must be a positive integer'}), 400, headers
+            max_workers = min(max_workers, ANALYSIS_MAX_WORKERS_LIMIT)
+        retrieval_backend = request_json.get('retrieval_backend')  # 'bigquery' or 'local', defaults to RETRIEVAL_BACKEND
+        scoring_profile = request_json.get('scoring_profile', SCORING_PROFILE)  # Specialty name or dict of weight overrides
+        try:
+            resolve_scoring_profile(scoring_profile)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400, headers
+        candidate_articles = request_json.get('candidate_articles', PRESCREEN_CANDIDATES)  # Vector hits to prescreen
+        target_articles = request_json.get('target_articles', PRESCREEN_TARGET_ARTICLES)  # Stop after this many strong articles
+        min_points = request_json.get('min_points', PRESCREEN_MIN_POINTS)  # Points that count as a strong article
 
         return Response(
-            stream_response(events_text, methodology_content, disease, num_articles),
+            stream_response(events_text, methodology_content, disease, num_articles, max_workers, retrieval_backend,
+                            scoring_profile, candidate_articles, target_articles, min_points),
             headers=headers,
             mimetype='text/event-stream'
         )
@@ -553,5 +1135,11 @@ def retrieve_full_articles(request):
         return jsonify({"error": str(e)}), 500, headers
 
 if __name__ == "__main__":
+    # `python main.py export-journal-snapshot` writes a snapshot to bundle with the deployment
+    if sys.argv[1:] == ['export-journal-snapshot']:
+        records = query_journal_records()
+        write_journal_snapshot(JOURNAL_SNAPSHOT_BUNDLED, records)
+        print(f"Wrote {len(records)} journal records to {JOURNAL_SNAPSHOT_BUNDLED}")
+        sys.exit(0)
     app = functions_framework.create_app(target="retrieve_full_articles")
     app.run(host="0.0.0.0", port=8080, debug=True)
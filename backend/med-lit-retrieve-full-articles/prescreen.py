@@ -0,0 +1,136 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Cheap first-stage ranking of vector search candidates before full-text analysis.
+
+Each candidate gets an estimate of the points calculate_points would give it,
+from signals that need no Gemini call:
+  - vector distance, scaled across the candidate set
+  - journal SJR, from a header line that exactly matches a known journal
+  - publication year, the latest plausible year in the header
+  - patient events and disease found in the abstract (the start of the
+    text), with partial credit for events found only in the body
+
+The estimate uses the same weight profile as the final score, so the
+candidates most likely to score well are analyzed first.
+"""
+
+import re
+from datetime import datetime
+
+from scoring import normalize_journal_score
+
+# Characters at the start of an article treated as its header and abstract
+ABSTRACT_CHARS = 3000
+HEADER_CHARS = 1000
+
+# Share of an event's points given when it only appears outside the abstract
+BODY_MATCH_SHARE = 1 / 3
+
+YEAR_PATTERN = re.compile(r'(?<!\d)(19[5-9]\d|20\d\d)(?!\d)')
+TOKEN_PATTERN = re.compile(r'[A-Za-z0-9][A-Za-z0-9\-]*')
+
+def word_pattern(term):
+    return re.compile(r'(?<![A-Za-z0-9])' + re.escape(term) + r'(?![A-Za-z0-9])', re.IGNORECASE)
+
+def distinctive_tokens(phrase):
+    """Gene, marker and drug-like tokens (containing a digit, or written in capitals) that identify a phrase."""
+    return [token for token in TOKEN_PATTERN.findall(phrase)
+            if len(token) >= 3 and (any(char.isdigit() for char in token) or token.isupper())]
+
+class TermMatcher:
+    """Matches a phrase by its exact text or, failing that, by all of its distinctive tokens."""
+
+    def __init__(self, phrase):
+        self.phrase = phrase
+        self.exact = word_pattern(phrase)
+        self.tokens = [word_pattern(token) for token in distinctive_tokens(phrase)]
+
+    def search(self, text):
+        if self.exact.search(text):
+            return True
+        return bool(self.tokens) and all(token.search(text) for token in self.tokens)
+
+def event_matchers(events_text):
+    events = [line.strip(' "\'\t') for line in (events_text or '').splitlines()]
+    return [TermMatcher(event) for event in dict.fromkeys(event for event in events if event)]
+
+def header_year(header, current_year):
+    years = [int(year) for year in YEAR_PATTERN.findall(header) if int(year) <= current_year]
+    return max(years) if years else None
+
+def header_sjr(header, journal_sjr):
+    """Best SJR among header lines (or their sentence-like parts) that exactly match a known journal title."""
+    best = 0
+    for line in header.splitlines():
+        line = line.strip()
+        if not line or len(line) > 150:
+            continue
+        for candidate in [line] + [part for part in re.split(r'[.;,|]\s+', line) if part != line]:
+            best = max(best, journal_sjr(candidate) or 0)
+    return best
+
+def prescreen_candidates(rows, events_text, disease, weights, journal_sjr, distance_weight=50, current_year=None):
+    """Estimate the final score of each vector search row.
+
+    rows need 'PMCID', 'content' and, if known, 'distance'. journal_sjr(title)
+    returns a journal's SJR for an exact title match, else 0. Every row is
+    estimated the same way, even when its real points are already known, so
+    the estimates are comparable. Returns one (estimate, signals) pair per
+    row, in row order.
+    """
+    current_year = current_year or datetime.now().year
+    matchers = event_matchers(events_text)
+    disease_matcher = TermMatcher(disease.strip()) if disease and disease.strip() else None
+
+    distances = [row.get('distance') for row in rows]
+    known = [distance for distance in distances if distance is not None]
+    nearest, farthest = (min(known), max(known)) if known else (0, 0)
+
+    estimates = []
+    for row, distance in zip(rows, distances):
+        content = row['content'] or ''
+        abstract = content[:ABSTRACT_CHARS]
+        header = content[:HEADER_CHARS]
+
+        signals = {}
+        points = 0
+        if distance is not None:
+            closeness = (farthest - distance) / (farthest - nearest) if farthest > nearest else 1
+            signals['distance'] = distance
+            points += distance_weight * closeness
+
+        abstract_events = sum(1 for matcher in matchers if matcher.search(abstract))
+        body_events = sum(1 for matcher in matchers if not matcher.search(abstract) and matcher.search(content))
+        if abstract_events or body_events:
+            signals['events_in_abstract'] = abstract_events
+            signals['events_in_body'] = body_events
+            points += weights['actionable_events'] * (abstract_events + BODY_MATCH_SHARE * body_events)
+
+        if disease_matcher and disease_matcher.search(abstract):
+            signals['disease_in_abstract'] = True
+            points += weights['disease_match']
+
+        sjr = header_sjr(header, journal_sjr)
+        if sjr:
+            signals['journal_sjr'] = sjr
+            points += normalize_journal_score(sjr) * weights['journal_impact']
+
+        year = header_year(header, current_year)
+        if year:
+            signals['year'] = year
+            points += weights['year'] * (current_year - year)
+
+        estimates.append((points, signals))
+    return estimates
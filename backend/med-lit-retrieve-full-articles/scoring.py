@@ -0,0 +1,244 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Article relevance scoring from extracted article metadata.
+
+calculate_points scores one metadata dict. score_batch scores many at once:
+ScoringColumns turns the analyses into a boolean feature matrix plus year,
+SJR and matched-event vectors, and a weight profile is applied to all of
+them with one broadcast product. Totals are accumulated column by column
+in the same order as calculate_points, so both return identical values
+(including int versus float totals) for the same profile and year.
+
+Weight profiles are keyed by specialty; a dict of overrides can be passed
+instead of a name to try other weights on top of the default profile.
+"""
+
+import math
+from datetime import datetime
+
+import numpy as np
+
+# Score columns in the order calculate_points adds them
+COLUMNS = [
+    'journal_impact', 'year', 'disease_match', 'pediatric_focus', 'clinical_trial', 'review',
+    'actionable_events', 'drugs_tested', 'treatment_shown', 'cell_studies', 'mice_studies',
+    'case_report', 'series_of_case_reports', 'clinical_study', 'clinical_study_on_children', 'novelty',
+]
+
+# Columns set from a truthy metadata field of the same name
+FLAG_COLUMNS = [
+    'disease_match', 'pediatric_focus', 'drugs_tested', 'treatment_shown', 'cell_studies', 'mice_studies',
+    'case_report', 'series_of_case_reports', 'clinical_study', 'clinical_study_on_children', 'novelty',
+]
+
+# Both paper type columns report under one breakdown key
+BREAKDOWN_KEYS = {'clinical_trial': 'paper_type', 'review': 'paper_type'}
+
+# journal_impact scales the normalized SJR points, year is points per year of age and
+# actionable_events is points per event matching the query; the rest are awarded once
+DEFAULT_WEIGHTS = {
+    'journal_impact': 1,
+    'year': -5,
+    'disease_match': 50,
+    'pediatric_focus': 20,
+    'clinical_trial': 40,
+    'review': -5,
+    'actionable_events': 15,
+    'drugs_tested': 5,
+    'treatment_shown': 50,
+    'cell_studies': 5,
+    'mice_studies': 10,
+    'case_report': 5,
+    'series_of_case_reports': 10,
+    'clinical_study': 15,
+    'clinical_study_on_children': 20,
+    'novelty': 10,
+}
+
+ADULT_WEIGHTS = {**DEFAULT_WEIGHTS, 'pediatric_focus': 0, 'clinical_study_on_children': 0}
+
+SCORING_PROFILES = {
+    'default': DEFAULT_WEIGHTS,
+    'oncology': DEFAULT_WEIGHTS,
+    'general_pediatrics': DEFAULT_WEIGHTS,
+    'adult_oncology': ADULT_WEIGHTS,
+    'neurology': ADULT_WEIGHTS,
+}
+
+def resolve_scoring_profile(profile=None):
+    """Return the weights for a profile name, or for a dict of overrides on top of the default profile."""
+    if profile is None:
+        return DEFAULT_WEIGHTS
+    if isinstance(profile, str):
+        if profile not in SCORING_PROFILES:
+            raise ValueError(f"Unknown scoring profile: {profile}")
+        return SCORING_PROFILES[profile]
+    if isinstance(profile, dict):
+        base = resolve_scoring_profile(profile.get('base', 'default'))
+        weights = {name: value for name, value in profile.items() if name != 'base'}
+        unknown = set(weights) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown scoring weights: {', '.join(sorted(unknown))}")
+        if any(isinstance(value, bool) or not isinstance(value, (int, float)) for value in weights.values()):
+            raise ValueError("Scoring weights must be numbers")
+        return {**base, **weights}
+    raise ValueError("Scoring profile must be a profile name or a dict of weights")
+
+def normalize_journal_score(sjr):
+    """Normalize journal SJR score to points between 0-25 to align with other scoring metrics."""
+    if not sjr:
+        return 0
+    # Use log scale to handle large range of SJR values (0 to 106094)
+    # Add 1 to avoid log(0)
+    # Multiply by 5 to align with other point values (5, 10, 15, 25)
+    normalized = math.log(sjr + 1) * 5
+    # Cap at 25 points to match the scale of other point calculations
+    return min(normalized, 25)
+
+def journal_sjr(metadata):
+    """The SJR score that earns journal points, or 0."""
+    if metadata.get('journal_title') and metadata.get('journal_sjr'):
+        sjr = float(metadata['journal_sjr'])
+        if sjr > 0:
+            return sjr
+    return 0
+
+def article_year(metadata):
+    """The publication year as an int, or None when missing or not a valid integer."""
+    if metadata.get('year'):
+        try:
+            return int(metadata.get('year'))
+        except (ValueError, TypeError):
+            pass
+    return None
+
+def matched_event_count(metadata):
+    return sum(1 for event in metadata.get('actionable_events', []) if event.get('matches_query', False))
+
+def calculate_points(metadata, query_disease=None, profile=None, current_year=None):
+    """Calculate points based on article metadata and return both total and breakdown."""
+    weights = resolve_scoring_profile(profile)
+    points = 0
+    breakdown = {}
+
+    # Journal impact points
+    sjr = journal_sjr(metadata)
+    if sjr:
+        impact_points = normalize_journal_score(sjr) * weights['journal_impact']
+        points += impact_points
+        breakdown['journal_impact'] = impact_points
+
+    # Year-based points: -5 points per year difference from current year
+    year = article_year(metadata)
+    if year is not None:
+        year_points = weights['year'] * ((current_year or datetime.now().year) - year)
+        points += year_points
+        breakdown['year'] = year_points
+
+    for column in ['disease_match', 'pediatric_focus']:
+        if metadata.get(column):
+            points += weights[column]
+            breakdown[column] = weights[column]
+
+    # Paper Type: clinical trial bonus, review penalty
+    paper_type = (metadata.get('paper_type') or '').lower()
+    if 'clinical trial' in paper_type:
+        points += weights['clinical_trial']
+        breakdown['paper_type'] = weights['clinical_trial']
+    elif 'review' in paper_type:
+        points += weights['review']
+        breakdown['paper_type'] = weights['review']
+
+    # Actionable Events: points per matched event
+    matched_events = matched_event_count(metadata)
+    if matched_events > 0:
+        event_points = matched_events * weights['actionable_events']
+        points += event_points
+        breakdown['actionable_events'] = event_points
+
+    for column in FLAG_COLUMNS[2:]:
+        if metadata.get(column):
+            points += weights[column]
+            breakdown[column] = weights[column]
+
+    return points, breakdown
+
+class ScoringColumns:
+    """Columnar view of many article metadata dicts: feature matrix plus year and SJR vectors."""
+
+    def __init__(self, metadatas):
+        self.flags = np.array([[bool(metadata.get(column)) for column in FLAG_COLUMNS] for metadata in metadatas],
+                              dtype=bool).reshape(len(metadatas), len(FLAG_COLUMNS))
+        paper_types = [(metadata.get('paper_type') or '').lower() for metadata in metadatas]
+        self.clinical_trial = np.array(['clinical trial' in paper_type for paper_type in paper_types], dtype=bool)
+        self.review = np.array(['review' in paper_type for paper_type in paper_types], dtype=bool) & ~self.clinical_trial
+        self.matched_events = np.array([matched_event_count(metadata) for metadata in metadatas], dtype=np.int64)
+        years = [article_year(metadata) for metadata in metadatas]
+        self.year = np.array([np.nan if year is None else year for year in years], dtype=float)
+        self.sjr = np.array([journal_sjr(metadata) for metadata in metadatas], dtype=float)
+        # Normalized with math.log per article so the points are bit-identical to calculate_points;
+        # normalize_journal_score returns the int 25 when it caps, which journal_capped records
+        journal_points = [normalize_journal_score(sjr) if sjr else 0 for sjr in self.sjr.tolist()]
+        self.journal_points = np.array(journal_points, dtype=float)
+        self.journal_capped = np.array([type(points) is int and points > 0 for points in journal_points], dtype=bool)
+
+    def __len__(self):
+        return len(self.sjr)
+
+    def feature_matrix(self, current_year):
+        """Return (values, present): per-column feature values and whether each column applies, in COLUMNS order."""
+        has_year = ~np.isnan(self.year)
+        values = np.zeros((len(self), len(COLUMNS)))
+        present = np.zeros((len(self), len(COLUMNS)), dtype=bool)
+        values[:, 0], present[:, 0] = self.journal_points, self.sjr > 0
+        values[:, 1], present[:, 1] = np.where(has_year, current_year - np.nan_to_num(self.year), 0), has_year
+        values[:, 4], present[:, 4] = self.clinical_trial, self.clinical_trial
+        values[:, 5], present[:, 5] = self.review, self.review
+        values[:, 6], present[:, 6] = self.matched_events, self.matched_events > 0
+        flag_indices = [COLUMNS.index(column) for column in FLAG_COLUMNS]
+        values[:, flag_indices], present[:, flag_indices] = self.flags, self.flags
+        return values, present
+
+def score_columns(columns, profile=None, current_year=None, breakdowns=True):
+    """Score a ScoringColumns; returns (totals, breakdowns) as Python numbers and dicts per article."""
+    weights = resolve_scoring_profile(profile)
+    current_year = current_year or datetime.now().year
+    values, present = columns.feature_matrix(current_year)
+    weight_vector = np.array([weights[column] for column in COLUMNS], dtype=float)
+    contributions = values * weight_vector
+    # Left-to-right accumulation (not a pairwise sum) keeps float totals identical to calculate_points
+    totals = np.cumsum(contributions, axis=1)[:, -1] if len(columns) else np.zeros(0)
+
+    # calculate_points returns ints unless a float weight or uncapped journal points take part
+    float_weights = np.array([isinstance(weights[column], float) for column in COLUMNS])
+    float_cells = present & float_weights
+    float_cells[:, 0] |= present[:, 0] & ~columns.journal_capped
+    float_rows = float_cells.any(axis=1)
+    total_list = [float(total) if is_float else int(total) for total, is_float in zip(totals.tolist(), float_rows.tolist())]
+    if not breakdowns:
+        return total_list, None
+
+    breakdown_list = [{} for _ in range(len(columns))]
+    rows, column_indices = np.nonzero(present)
+    cells = zip(rows.tolist(), column_indices.tolist(), contributions[rows, column_indices].tolist(),
+                float_cells[rows, column_indices].tolist())
+    for row, index, value, is_float in cells:
+        column = COLUMNS[index]
+        breakdown_list[row][BREAKDOWN_KEYS.get(column, column)] = value if is_float else int(value)
+    return total_list, breakdown_list
+
+def score_batch(metadatas, profile=None, current_year=None, breakdowns=True):
+    """Score many article metadata dicts at once; equivalent to calculate_points on each."""
+    return score_columns(ScoringColumns(metadatas), profile, current_year, breakdowns)
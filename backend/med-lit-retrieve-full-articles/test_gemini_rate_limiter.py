@@ -0,0 +1,85 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+import gemini_rate_limiter
+from gemini_rate_limiter import GeminiRateLimiter, RateLimitExceeded, is_rate_limit_error
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+class ApiError(Exception):
+    def __init__(self, code, status=None):
+        super().__init__(f"{code} {status}")
+        self.code = code
+        self.status = status
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(gemini_rate_limiter.time, 'sleep', sleeps.append)
+    return sleeps
+
+def limiter(**kwargs):
+    return GeminiRateLimiter(requests_per_minute=600, tokens_per_minute=100000, **kwargs)
+
+def test_copies_are_identical():
+    source = (BACKEND / 'med-lit-retrieve-full-articles' / 'gemini_rate_limiter.py').read_text()
+    for function in ('medical-lit-final-analysis', 'extract-medical-info'):
+        assert (BACKEND / function / 'gemini_rate_limiter.py').read_text() == source
+
+def test_is_rate_limit_error():
+    assert is_rate_limit_error(ApiError(429))
+    assert is_rate_limit_error(ApiError(None, 'RESOURCE_EXHAUSTED'))
+    assert is_rate_limit_error(ApiError(lambda: SimpleNamespace(name='RESOURCE_EXHAUSTED')))
+    assert not is_rate_limit_error(ApiError(500, 'INTERNAL'))
+    assert not is_rate_limit_error(ValueError('429 in the message text only'))
+
+def test_rate_limited_calls_are_retried_and_refunded(no_sleep):
+    gemini = limiter()
+    responses = iter([ApiError(429), ApiError(429), SimpleNamespace(text='ok', usage_metadata=None)])
+
+    def call():
+        response = next(responses)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    assert gemini.call(call, estimated_tokens=100).text == 'ok'
+    assert len(no_sleep) == 2
+    # Only the successful attempt stays charged against the buckets
+    assert gemini.tokens.tokens == pytest.approx(100000 - 100, abs=1)
+
+def test_usage_settles_the_token_estimate():
+    gemini = limiter()
+    gemini.call(lambda: SimpleNamespace(usage_metadata=SimpleNamespace(total_token_count=500)), estimated_tokens=100)
+    assert gemini.tokens.tokens == pytest.approx(100000 - 500, abs=1)
+
+def test_other_errors_are_raised_at_once(no_sleep):
+    def call():
+        raise ApiError(400, 'INVALID_ARGUMENT')
+
+    with pytest.raises(ApiError):
+        limiter().call(call)
+    assert no_sleep == []
+
+def test_gives_up_at_the_retry_deadline():
+    def call():
+        raise ApiError(429)
+
+    with pytest.raises(RateLimitExceeded):
+        limiter(retry_deadline=0).call(call)
@@ -0,0 +1,109 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from journals import (JOURNAL_SNAPSHOT_HEADER, JournalIndex, JournalSnapshot, encode_journal_snapshot,
+                      normalize_issn, normalize_journal_title, write_journal_snapshot)
+
+# BigQuery order: descending SJR
+RECORDS = [
+    ("CA: A Cancer Journal for Clinicians", 106.1, ["0007-9235", "1542-4863"]),
+    ("The Lancet Oncology", 13.2, ["1470-2045"]),
+    ("Journal of Clinical Oncology", 10.1, ["0732-183X", "1527-7755"]),
+    ("Journal of Clinical Oncology", 2.0, []),
+    ("Journal of Cellular Oncology", 1.1, ["1111-2222"]),
+    ("Blood", 5.0, ["0006-4971"]),
+    ("Leukemia", 3.4, ["0887-6924", "0732-183X"]),
+    ("Pédiatric Blood & Cancer", 1.2, ["1545-5009"]),
+]
+
+@pytest.fixture
+def index():
+    return JournalIndex.from_records(RECORDS)
+
+def test_normalize_journal_title():
+    assert normalize_journal_title("The Lancet  Oncology.") == "lancet oncology"
+    assert normalize_journal_title("Pédiatric Blood & Cancer") == "pediatric blood and cancer"
+    assert normalize_journal_title(None) == ""
+
+def test_normalize_issn():
+    assert normalize_issn("1527-7755") == "15277755"
+    assert normalize_issn("0732-183x") == "0732183X"
+    assert normalize_issn("123") is None
+
+def test_exact_match(index):
+    assert index.resolve("the lancet oncology") == (13.2, "The Lancet Oncology", "exact")
+    assert index.exact_sjr("Pediatric Blood and Cancer") == 1.2
+    assert index.exact_sjr("Unknown Journal") == 0
+    assert index.exact_sjr("") == 0
+
+def test_duplicate_titles_keep_the_highest_score(index):
+    assert len(index) == len(RECORDS) - 1
+    assert index.exact_sjr("Journal of Clinical Oncology") == 10.1
+
+def test_issn_match_prefers_the_highest_score(index):
+    assert index.resolve("Some Other Name", "1470-2045") == (13.2, "The Lancet Oncology", "issn")
+    # 0732-183X is listed by both journals; the higher-ranked one wins, as in BigQuery order
+    assert index.resolve("", "0732183X") == (10.1, "Journal of Clinical Oncology", "issn")
+
+def test_abbreviation_ties_keep_sjr_precedence(index):
+    # "J C Oncol" abbreviates both "Journal of Clinical Oncology" and "Journal of Cellular Oncology";
+    # the snapshot sorts Cellular first, but the higher-ranked Clinical must win
+    assert index.resolve("J C Oncol") == (10.1, "Journal of Clinical Oncology", "abbreviation")
+    assert index.resolve("J Cell Oncol") == (1.1, "Journal of Cellular Oncology", "abbreviation")
+
+def test_fuzzy_match(index):
+    sjr, title, method = index.resolve("Journal of Clinical Oncolgy")
+    assert (sjr, title, method) == (10.1, "Journal of Clinical Oncology", "fuzzy")
+    assert index.resolve("Completely Unrelated Periodical") == (0, None, None)
+
+def test_empty_index_resolves_nothing():
+    index = JournalIndex()
+    assert len(index) == 0
+    assert index.resolve("Blood", "0006-4971") == (0, None, None)
+
+def test_snapshot_round_trip_through_a_memory_map(tmp_path):
+    path = str(tmp_path / "journals.bin")
+    created_at = write_journal_snapshot(path, RECORDS, 1700000000)
+    snapshot = JournalSnapshot.open(path)
+    assert created_at == snapshot.created_at == 1700000000
+    assert len(snapshot) == len(RECORDS) - 1
+    normalized_titles = [snapshot.record(idx)[1] for idx in range(len(snapshot))]
+    assert normalized_titles == sorted(normalized_titles)
+    index = JournalIndex(snapshot)
+    assert index.resolve("Leukemia") == (3.4, "Leukemia", "exact")
+    assert snapshot.record(snapshot.find("blood")) == ("Blood", "blood", 5.0, ["0006-4971"])
+
+def test_opening_a_snapshot_decodes_no_records(monkeypatch):
+    data = encode_journal_snapshot(RECORDS, 1)
+    decoded = []
+    original = JournalSnapshot.record
+
+    def counting_record(self, idx):
+        decoded.append(idx)
+        return original(self, idx)
+    monkeypatch.setattr(JournalSnapshot, "record", counting_record)
+    index = JournalIndex(JournalSnapshot(data))
+    assert decoded == []
+    index.exact_sjr("Blood")
+    assert 0 < len(decoded) <= 4
+
+def test_unsupported_snapshot_is_rejected():
+    data = bytearray(encode_journal_snapshot(RECORDS, 1))
+    data[0:7] = b"NOTSNAP"
+    with pytest.raises(ValueError):
+        JournalSnapshot(bytes(data))
+    with pytest.raises(ValueError):
+        JournalSnapshot(encode_journal_snapshot(RECORDS, 1)[:JOURNAL_SNAPSHOT_HEADER.size + 4])
@@ -0,0 +1,90 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+
+import pytest
+
+from benchmark_scoring import synthetic_metadata
+from scoring import (DEFAULT_WEIGHTS, SCORING_PROFILES, ScoringColumns, calculate_points, normalize_journal_score,
+                     resolve_scoring_profile, score_batch, score_columns)
+
+CURRENT_YEAR = 2025
+
+METADATAS = [synthetic_metadata(random.Random(seed)) for seed in range(500)]
+
+PROFILES = list(SCORING_PROFILES) + [
+    None,
+    {'journal_impact': 1.5, 'year': -2.5},
+    {'base': 'adult_oncology', 'disease_match': 60, 'novelty': 0.5},
+]
+
+def assert_identical(batch, single):
+    # Equal values of the same type, with breakdown keys in the same order
+    assert batch == single
+    assert type(batch) is type(single)
+
+@pytest.mark.parametrize("profile", PROFILES, ids=str)
+def test_score_batch_matches_calculate_points(profile):
+    totals, breakdowns = score_batch(METADATAS, profile, CURRENT_YEAR)
+    for metadata, total, breakdown in zip(METADATAS, totals, breakdowns):
+        expected_total, expected_breakdown = calculate_points(metadata, profile=profile, current_year=CURRENT_YEAR)
+        assert_identical(total, expected_total)
+        assert list(breakdown.items()) == list(expected_breakdown.items())
+        for key, value in breakdown.items():
+            assert_identical(value, expected_breakdown[key])
+
+def test_columns_can_be_rescored_with_other_profiles():
+    columns = ScoringColumns(METADATAS)
+    for profile in PROFILES:
+        assert score_columns(columns, profile, CURRENT_YEAR) == score_batch(METADATAS, profile, CURRENT_YEAR)
+
+def test_totals_without_breakdowns():
+    totals, breakdowns = score_batch(METADATAS, current_year=CURRENT_YEAR, breakdowns=False)
+    assert breakdowns is None
+    assert totals == score_batch(METADATAS, current_year=CURRENT_YEAR)[0]
+
+def test_empty_batch():
+    assert score_batch([], current_year=CURRENT_YEAR) == ([], [])
+
+def test_review_and_clinical_trial_share_the_paper_type_key():
+    totals, breakdowns = score_batch([{'paper_type': 'Review'}, {'paper_type': 'Clinical Trial review'}],
+                                     current_year=CURRENT_YEAR)
+    assert totals == [-5, 40]
+    assert breakdowns == [{'paper_type': -5}, {'paper_type': 40}]
+
+def test_resolve_scoring_profile():
+    assert resolve_scoring_profile() is DEFAULT_WEIGHTS
+    assert resolve_scoring_profile('neurology')['pediatric_focus'] == 0
+    overrides = resolve_scoring_profile({'base': 'neurology', 'novelty': 3})
+    assert overrides['novelty'] == 3 and overrides['pediatric_focus'] == 0
+
+@pytest.mark.parametrize("profile", [
+    'cardiology',
+    {'impact': 1},
+    {'novelty': True},
+    {'novelty': '10'},
+    {'base': 'cardiology'},
+    ['default'],
+])
+def test_invalid_scoring_profiles_are_rejected(profile):
+    with pytest.raises(ValueError):
+        resolve_scoring_profile(profile)
+
+def test_normalize_journal_score():
+    assert normalize_journal_score(0) == 0
+    assert normalize_journal_score(None) == 0
+    assert 0 < normalize_journal_score(2.917) < 25
+    assert normalize_journal_score(106094.0) == 25
+    assert type(normalize_journal_score(106094.0)) is int
@@ -13,15 +13,24 @@
 # limitations under the License.
 
 import functions_framework
-from flask import jsonify, request
+from flask import jsonify, request, Response, stream_with_context
 import vertexai
 from google import genai
 from google.genai import types
 from google.cloud import bigquery
+import hashlib
 import json
 import logging
 import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from itertools import chain
+
+from gemini_rate_limiter import estimate_tokens, gemini_rate_limiter
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -36,67 +45,140 @@ genai_client = genai.Client(
 )
 bq_client = bigquery.Client(project=os.environ.get('BIGQUERY_PROJECT_ID', 'wz-data-catalog-demo'))
 
-def get_full_articles(analyzed_articles):
-    """Retrieve full article content from BigQuery using PMCIDs."""
-    # Extract PMCIDs from articles (using pmcid or PMCID field)
-    pmcids = []
-    for article in analyzed_articles:
-        pmcid = article.get('pmcid') or article.get('PMCID')
-        if pmcid:
-            pmcids.append(pmcid)
-    
-    if not pmcids:
-        logger.error("No PMCIDs found in analyzed articles")
-        return []
-    
-    # Query to get full articles directly from the pre-joined table using PMCIDs
+GEMINI_MODEL = "gemini-2.0-flash-001"
+
+# Map-reduce settings: in auto mode, selections whose full texts exceed the character budget are
+# condensed into per-article evidence digests before the final report is written
+MAP_REDUCE_CHAR_THRESHOLD = int(os.environ.get('MAP_REDUCE_CHAR_THRESHOLD', '600000'))
+MAP_MAX_WORKERS = int(os.environ.get('MAP_MAX_WORKERS', '8'))
+DIGEST_MAX_WORDS = 300
+# Stands in for the digest of an article Gemini could not digest
+UNDIGESTED_NOTE = "UNAVAILABLE - this article could not be digested; do not cite findings from it."
+
+# Batches of more PMCIDs than this are streamed through the BigQuery Storage Read API
+STORAGE_READ_THRESHOLD = int(os.environ.get('STORAGE_READ_THRESHOLD', '50'))
+
+class ArticleContentCache:
+    """In-process LRU of full article content and PMID keyed by PMCID."""
+
+    def __init__(self, max_entries=500):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, pmcid):
+        with self.lock:
+            entry = self.entries.get(pmcid)
+            if entry is not None:
+                self.entries.move_to_end(pmcid)
+            return entry
+
+    def set(self, pmcid, content, pmid=None):
+        with self.lock:
+            self.entries[pmcid] = {'content': content, 'PMID': pmid}
+            self.entries.move_to_end(pmcid)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+article_content_cache = ArticleContentCache(int(os.environ.get('ARTICLE_CONTENT_CACHE_SIZE', '500')))
+
+# Evidence digests keyed by digest_cache_key; reuses the LRU with the digest stored as content
+digest_cache = ArticleContentCache(int(os.environ.get('DIGEST_CACHE_SIZE', '2000')))
+
+def fetch_article_contents(pmcids):
+    """Fetch content and PMID for the given PMCIDs from BigQuery in one parameterized query."""
     project_id = os.environ.get('BIGQUERY_PROJECT_ID', 'wz-data-catalog-demo')
     pmid_dataset = os.environ.get('PMID_DATASET', 'pubmed')
-    pmcids_str = ', '.join([f"'{pmcid}'" for pmcid in pmcids])
-    
     query = f"""
     SELECT 
         name as PMCID,
         content,
         PMID
     FROM `{project_id}.{pmid_dataset}.pmid_embed_nonzero_metadata`
-    WHERE name IN ({pmcids_str})
+    WHERE name IN UNNEST(@pmcids)
     """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ArrayQueryParameter('pmcids', 'STRING', pmcids)]
+    )
+    query_job = bq_client.query(query, job_config=job_config)
+
+    rows = None
+    if len(pmcids) > STORAGE_READ_THRESHOLD:
+        try:
+            # Large result sets stream faster through the Storage Read API than REST pagination
+            rows = query_job.result().to_arrow(create_bqstorage_client=True).to_pylist()
+        except Exception as e:
+            logger.warning(f"Storage Read API unavailable, falling back to paged results: {str(e)}")
+    if rows is None:
+        rows = query_job.result()
+    return {row['PMCID']: {'content': row['content'], 'PMID': row['PMID']} for row in rows}
+
+def get_full_articles(analyzed_articles):
+    """Attach full article content to analyzed articles.
+
+    Content already sent by the client (the retrieval step streams it as
+    full_article_text) or held in the local cache is reused; only the
+    remaining PMCIDs are fetched from BigQuery.
+    """
+    content_map = {}
+    missing = []
+    for article in analyzed_articles:
+        pmcid = article.get('pmcid') or article.get('PMCID')
+        if not pmcid or pmcid in content_map:
+            continue
+        if article.get('content'):
+            content_map[pmcid] = {'content': article['content'], 'PMID': article.get('pmid')}
+            article_content_cache.set(pmcid, article['content'], article.get('pmid'))
+            continue
+        cached = article_content_cache.get(pmcid)
+        if cached:
+            content_map[pmcid] = cached
+        elif pmcid not in missing:
+            missing.append(pmcid)
     
-    try:
-        query_job = bq_client.query(query)
-        results = list(query_job.result())
+    if not content_map and not missing:
+        logger.error("No PMCIDs found in analyzed articles")
+        return []
+    
+    logger.info(f"Article content: {len(content_map)} reused, {len(missing)} fetched from BigQuery")
+    if missing:
+        try:
+            fetched = fetch_article_contents(missing)
+        except Exception as e:
+            logger.error(f"Error retrieving articles: {str(e)}")
+            fetched = {}
+        for pmcid, entry in fetched.items():
+            article_content_cache.set(pmcid, entry['content'], entry['PMID'])
+        content_map.update(fetched)
+
+    if not content_map:
+        logger.error(f"No articles found for PMCIDs: {missing}")
+        return []
         
-        if not results:
-            logger.error(f"No articles found for PMCIDs: {pmcids}")
-            return []
+    # Update analyzed articles with full content
+    articles_with_content = []
+    for article in analyzed_articles:
+        pmcid = article.get('pmcid') or article.get('PMCID')
+        if pmcid and pmcid in content_map:
+            # Preserve all metadata and add full content
+            article_with_content = article.copy()
+            article_with_content['content'] = content_map[pmcid]['content']
+            # Add PMID from BigQuery if we don't have it
+            if not article.get('pmid') and content_map[pmcid]['PMID']:
+                article_with_content['pmid'] = content_map[pmcid]['PMID']
+            articles_with_content.append(article_with_content)
+        else:
+            logger.warning(f"No content found for PMCID: {pmcid}")
             
-        # Create mapping of PMCID to content and PMID
-        content_map = {row['PMCID']: {'content': row['content'], 'PMID': row['PMID']} for row in results}
-        
-        # Update analyzed articles with full content
-        articles_with_content = []
-        for article in analyzed_articles:
-            pmcid = article.get('pmcid') or article.get('PMCID')
-            if pmcid and pmcid in content_map:
-                # Preserve all metadata and add full content
-                article_with_content = article.copy()
-                article_with_content['content'] = content_map[pmcid]['content']
-                # Add PMID from BigQuery if we don't have it
-                if not article.get('pmid') and content_map[pmcid]['PMID']:
-                    article_with_content['pmid'] = content_map[pmcid]['PMID']
-                articles_with_content.append(article_with_content)
-            else:
-                logger.warning(f"No content found for PMCID: {pmcid}")
-                
-        return articles_with_content
-        
-    except Exception as e:
-        logger.error(f"Error retrieving articles: {str(e)}")
-        return []
+    return articles_with_content
+
+def create_medical_lit_analysis_prompt(case_notes, disease, events, articles, use_digests=False):
+    """Create a generalized prompt for medical literature analysis, applicable to any specialty.
 
-def create_medical_lit_analysis_prompt(case_notes, disease, events, articles):
-    """Create a generalized prompt for medical literature analysis, applicable to any specialty."""
+    With use_digests, each article contributes its evidence digest (the reduce
+    step of map-reduce mode) instead of its full text; an article whose digest
+    could not be generated is listed with its evidence marked unavailable.
+    """
     
     # Create a table of analyzed articles
     articles_table = []
@@ -130,11 +212,16 @@ Type: {article.get('paper_type', 'N/A')}
 Drug Results: {drug_results}
 Points: {article.get('overall_points', 0)}
 PMCID: {article.get('pmcid', 'N/A')}
-Full Text:
-{article.get('content', 'N/A')}
-{'='*80}
 """
+        if use_digests and article.get('digest') is None:
+            article_summary += f"Evidence Digest: {UNDIGESTED_NOTE}\n"
+        elif use_digests:
+            article_summary += f"Evidence Digest:\n{article['digest']}\n"
+        else:
+            article_summary += f"Full Text:\n{article.get('content', 'N/A')}\n"
+        article_summary += f"{'='*80}\n"
         articles_table.append(article_summary)
+    articles_text = '\n'.join(articles_table)
 
     prompt = f"""You are a medical specialist evaluating a complex case. Your goal is to find the best treatment approach for the patient, considering their actionable events (genetic, molecular, physiological, or other).
 
@@ -146,7 +233,7 @@ Actionable Events: {', '.join(events)}
 
 ANALYZED ARTICLES:
 {'='*80}
-{'\n'.join(articles_table)}
+{articles_text}
 {'='*80}
 
 Based on the clinical input, actionable events, and the analyzed articles above, please provide a comprehensive analysis in markdown format with the following sections:
@@ -218,13 +305,36 @@ IMPORTANT: Return the analysis in markdown format with the specified table struc
 
     return prompt
 
-def analyze_with_gemini(prompt):
-    """Analyze the case and articles using Gemini."""
-    model = "gemini-2.0-flash-001"
-    generate_content_config = types.GenerateContentConfig(
+def digest_cache_key(article, disease, events):
+    """Key an evidence digest by article and patient context."""
+    payload = json.dumps([article.get('pmcid') or article.get('PMCID'), disease, sorted(events), GEMINI_MODEL])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def create_article_digest_prompt(disease, events, article):
+    """Create the map-step prompt that condenses one article into a bounded evidence digest."""
+    return f"""You are a medical specialist preparing evidence for a case review. Condense the article below into an evidence digest of at most {DIGEST_MAX_WORDS} words, focused on the patient's disease and actionable events.
+
+Disease: {disease}
+Actionable Events: {', '.join(events)}
+
+Include, as concise bullet points:
+* Study design, population and size (note if pediatric)
+* Findings relevant to each of the patient's actionable events
+* Treatments tested, with outcomes and response rates
+* Safety warnings, adverse events and resistance mechanisms
+* Key limitations
+
+Only use information stated in the article. If the article has nothing relevant to the patient's events, say so in one line.
+
+<Article PMCID="{article.get('pmcid', 'N/A')}" year="{article.get('year', 'N/A')}">
+{article.get('content', 'N/A')}
+</Article>"""
+
+def create_generate_content_config(max_output_tokens=8192):
+    return types.GenerateContentConfig(
         temperature=0,
         top_p=0.95,
-        max_output_tokens=8192,
+        max_output_tokens=max_output_tokens,
         response_modalities=["TEXT"],
         safety_settings=[
             types.SafetySetting(category=cat, threshold="OFF")
@@ -232,15 +342,61 @@ def analyze_with_gemini(prompt):
                       "HARM_CATEGORY_SEXUALLY_EXPLICIT", "HARM_CATEGORY_HARASSMENT"]
         ]
     )
-    
+
+def digest_article(article, disease, events):
+    """Map step: return a copy of the article with a cached or freshly generated evidence digest.
+
+    The digest is None when Gemini still fails after the rate limiter's
+    retries, so the report marks the article as undigested rather than
+    passing off an excerpt of its text as a digest.
+    """
+    key = digest_cache_key(article, disease, events)
+    cached = digest_cache.get(key)
+    digested = article.copy()
+    if cached:
+        digested['digest'] = cached['content']
+        return digested
+
+    prompt = create_article_digest_prompt(disease, events, article)
+    try:
+        response = gemini_rate_limiter.call(lambda: genai_client.models.generate_content(
+            model=GEMINI_MODEL,
+            contents=[types.Content(role="user", parts=[{"text": prompt}])],
+            config=create_generate_content_config(max_output_tokens=1024),
+        ), estimate_tokens(prompt))
+        digested['digest'] = response.text.strip()
+        digest_cache.set(key, digested['digest'])
+    except Exception as e:
+        logger.error(f"Error digesting article {article.get('pmcid')}: {str(e)}")
+        digested['digest'] = None
+    return digested
+
+def undigested_pmcids(articles):
+    """PMCIDs of the digested articles whose digest could not be generated."""
+    return [article.get('pmcid') for article in articles if article.get('digest') is None]
+
+def digest_articles(articles, disease, events):
+    """Run the map step over all articles in parallel, preserving their order."""
+    with ThreadPoolExecutor(max_workers=max(1, min(MAP_MAX_WORKERS, len(articles)))) as executor:
+        return list(executor.map(lambda article: digest_article(article, disease, events), articles))
+
+def resolve_analysis_mode(analysis_mode, articles):
+    """Pick 'single' or 'map_reduce'; 'auto' switches to map-reduce for large selections."""
+    if analysis_mode in ('single', 'map_reduce'):
+        return analysis_mode
+    total_chars = sum(len(article.get('content') or '') for article in articles)
+    return 'map_reduce' if total_chars > MAP_REDUCE_CHAR_THRESHOLD else 'single'
+
+def analyze_with_gemini(prompt):
+    """Analyze the case and articles using Gemini."""
     contents = [types.Content(role="user", parts=[{"text": prompt}])]
     
     try:
-        response = genai_client.models.generate_content(
-            model=model,
+        response = gemini_rate_limiter.call(lambda: genai_client.models.generate_content(
+            model=GEMINI_MODEL,
             contents=contents,
-            config=generate_content_config,
-        )
+            config=create_generate_content_config(),
+        ), estimate_tokens(prompt))
         
         # Return the markdown text directly
         return {"markdown_content": response.text.strip()}
@@ -249,6 +405,127 @@ def analyze_with_gemini(prompt):
         logger.error(f"Error in analyze_with_gemini: {str(e)}")
         return None
 
+def open_analysis_stream(prompt):
+    """Start a streamed analysis through the rate limiter.
+
+    The request is only sent when the first chunk is read, so that read
+    happens inside the limiter for a 429 to be retried. Returns the stream
+    and an iterator over all its chunks.
+    """
+    def start():
+        stream = genai_client.models.generate_content_stream(
+            model=GEMINI_MODEL,
+            contents=[types.Content(role="user", parts=[{"text": prompt}])],
+            config=create_generate_content_config(),
+        )
+        return stream, next(stream, None)
+
+    stream, first_chunk = gemini_rate_limiter.call(start, estimate_tokens(prompt))
+    return stream, chain([first_chunk] if first_chunk is not None else [], stream)
+
+def split_completed_sections(markdown):
+    """Split streamed markdown into (completed sections, remainder) at the last heading seen so far."""
+    headings = [match.start() for match in re.finditer(r'(?m)^#{1,6} ', markdown)]
+    if not headings or headings[-1] == 0:
+        return '', markdown
+    return markdown[:headings[-1]], markdown[headings[-1]:]
+
+def sse_event(payload):
+    return f"data: {json.dumps(payload)}\n\n"
+
+def stream_medical_lit_analysis(case_notes, disease, events, analyzed_articles, analysis_mode='auto'):
+    """Run the analysis pipeline as server-sent events.
+
+    Progress events for the article fetch and prompt build come first, then
+    one `section` event per completed markdown section as Gemini generates
+    it, then a `summary` event with the full report, token counts and the
+    PMCIDs of any articles that could not be digested. If the client disconnects, queued digests are cancelled and the Gemini stream
+    is closed rather than run to completion.
+    """
+    start = time.monotonic()
+    try:
+        yield sse_event({"type": "progress", "stage": "fetch_articles", "status": "started",
+                         "total_articles": len(analyzed_articles)})
+        articles_with_content = get_full_articles(analyzed_articles)
+        if not articles_with_content:
+            logger.error("Failed to retrieve any articles from BigQuery")
+            yield sse_event({"type": "error", "message": "Failed to retrieve articles from BigQuery"})
+            yield "data: [DONE]\n\n"
+            return
+        yield sse_event({"type": "progress", "stage": "fetch_articles", "status": "complete",
+                         "articles_with_content": len(articles_with_content)})
+
+        analysis_mode = resolve_analysis_mode(analysis_mode, articles_with_content)
+        if analysis_mode == 'map_reduce':
+            yield sse_event({"type": "progress", "stage": "digest_articles", "status": "started"})
+            digested = list(articles_with_content)
+            executor = ThreadPoolExecutor(max_workers=max(1, min(MAP_MAX_WORKERS, len(articles_with_content))))
+            try:
+                futures = {executor.submit(digest_article, article, disease, events): index
+                           for index, article in enumerate(articles_with_content)}
+                undigested = []
+                for completed, future in enumerate(as_completed(futures), 1):
+                    article = digested[futures[future]] = future.result()
+                    if article['digest'] is None:
+                        undigested.append(article.get('pmcid'))
+                    yield sse_event({"type": "progress", "stage": "digest_articles", "status": "running",
+                                     "completed": completed, "total": len(futures),
+                                     "pmcid": article.get('pmcid'), "digested": article['digest'] is not None,
+                                     "undigested": len(undigested)})
+            finally:
+                # On a client disconnect, drop queued digests instead of waiting for them
+                executor.shutdown(wait=False, cancel_futures=True)
+            articles_with_content = digested
+            yield sse_event({"type": "progress", "stage": "digest_articles", "status": "complete",
+                             "undigested": undigested_pmcids(articles_with_content)})
+
+        yield sse_event({"type": "progress", "stage": "build_prompt", "status": "started", "analysis_mode": analysis_mode})
+        prompt = create_medical_lit_analysis_prompt(case_notes, disease, events, articles_with_content,
+                                                    use_digests=analysis_mode == 'map_reduce')
+        yield sse_event({"type": "progress", "stage": "build_prompt", "status": "complete", "prompt_chars": len(prompt)})
+
+        yield sse_event({"type": "progress", "stage": "generate", "status": "started"})
+        response, chunks = open_analysis_stream(prompt)
+        markdown = ''
+        pending = ''
+        usage = None
+        try:
+            for chunk in chunks:
+                if chunk.usage_metadata:
+                    usage = chunk.usage_metadata
+                if not chunk.text:
+                    continue
+                markdown += chunk.text
+                section, pending = split_completed_sections(pending + chunk.text)
+                if section.strip():
+                    yield sse_event({"type": "section", "markdown": section})
+        finally:
+            # Stop reading the Gemini stream if the client went away mid-report
+            if hasattr(response, 'close'):
+                response.close()
+        if pending.strip():
+            yield sse_event({"type": "section", "markdown": pending})
+
+        yield sse_event({
+            "type": "summary",
+            "analysis_mode": analysis_mode,
+            "undigested": undigested_pmcids(articles_with_content) if analysis_mode == 'map_reduce' else [],
+            "markdown_content": markdown.strip(),
+            "elapsed_seconds": round(time.monotonic() - start, 2),
+            "usage": {
+                "prompt_tokens": getattr(usage, 'prompt_token_count', None),
+                "output_tokens": getattr(usage, 'candidates_token_count', None),
+                "total_tokens": getattr(usage, 'total_token_count', None)
+            }
+        })
+    except GeneratorExit:
+        logger.info(f"Client disconnected after {time.monotonic() - start:.1f} seconds; stopped the analysis stream")
+        raise
+    except Exception as e:
+        logger.error(f"Error in stream_medical_lit_analysis: {str(e)}")
+        yield sse_event({"type": "error", "message": str(e)})
+    yield "data: [DONE]\n\n"
+
 @functions_framework.http
 def medical_lit_analysis(request):
     """HTTP Cloud Function for medical literature analysis."""
@@ -300,7 +577,21 @@ def medical_lit_analysis(request):
         # Log analyzed articles before BigQuery
         logger.info(f"Analyzed articles before BigQuery: {json.dumps(analyzed_articles, indent=2)}")
 
-        # Get full articles from BigQuery while preserving metadata
+        # Opt-in streaming: the whole pipeline runs inside the event stream so progress arrives immediately
+        if request_json.get('stream'):
+            return Response(
+                stream_with_context(stream_medical_lit_analysis(
+                    case_notes, disease, events, analyzed_articles, request_json.get('analysis_mode', 'auto')
+                )),
+                headers={
+                    'Access-Control-Allow-Origin': '*',
+                    'Content-Type': 'text/event-stream',
+                    'Cache-Control': 'no-cache',
+                    'Connection': 'keep-alive'
+                }
+            )
+
+        # Get full article content (reusing what we already have) while preserving metadata
         articles_with_content = get_full_articles(analyzed_articles)
         
         # Log articles after BigQuery
@@ -310,8 +601,17 @@ def medical_lit_analysis(request):
             logger.error("Failed to retrieve any articles from BigQuery")
             return jsonify({'error': 'Failed to retrieve articles from BigQuery'}), 500, headers
 
-        # Create prompt and analyze
-        prompt = create_medical_lit_analysis_prompt(case_notes, disease, events, articles_with_content)
+        # Create prompt, condensing articles into evidence digests first in map-reduce mode
+        analysis_mode = resolve_analysis_mode(request_json.get('analysis_mode', 'auto'), articles_with_content)
+        logger.info(f"Analysis mode: {analysis_mode}")
+        undigested = []
+        if analysis_mode == 'map_reduce':
+            digested_articles = digest_articles(articles_with_content, disease, events)
+            undigested = undigested_pmcids(digested_articles)
+            prompt = create_medical_lit_analysis_prompt(case_notes, disease, events, digested_articles, use_digests=True)
+        else:
+            prompt = create_medical_lit_analysis_prompt(case_notes, disease, events, articles_with_content)
+
         analysis = analyze_with_gemini(prompt)
 
         if not analysis:
@@ -319,7 +619,8 @@ def medical_lit_analysis(request):
 
         return jsonify({
             'success': True,
-            'analysis': analysis
+            'analysis': analysis,
+            'undigested': undigested
         }), 200, headers
 
     except Exception as e:
@@ -30,7 +30,7 @@ import { useAuth } from './hooks/useAuth';
 import useChat from './hooks/useChat';
 
 // API
-import { generateSampleCase, extractMedicalInfo, retrieveAndAnalyzeArticles, generateFinalAnalysis, sendFeedback } from './utils/api';
+import { generateSampleCase, extractDiseaseAndEvents, retrieveAndAnalyzeArticles, generateFinalAnalysis, sendFeedback } from './utils/api';
 
 // Preset Data
 import { diseaseExtractionPrompts, eventExtractionPrompts, extractionPrompt, promptContents, promptContent, presetCaseNotes, presetLabResults } from './data/presetData';
@@ -38,6 +38,12 @@ import { diseaseExtractionPrompts, eventExtractionPrompts, extractionPrompt, pro
 // Utilities
 const createMessageId = (type) => `${Date.now()}-${type}-${Math.random().toString(36).substr(2, 9)}`;
 
+// Insert an article after every article of lower or equal retrieval rank, so the list stays in rank order
+const insertByRank = (articles, article) => {
+  const index = articles.findIndex(existing => existing.rank > article.rank);
+  return index === -1 ? [...articles, article] : [...articles.slice(0, index), article, ...articles.slice(index)];
+};
+
 const MedicalAssistantUI = () => {
   const [showIntendedUse, setShowIntendedUse] = useState(true);
   const [showUserMenu, setShowUserMenu] = useState(false);
@@ -211,11 +217,8 @@ const handleSpecialtySelected = async (specialty) => {
     let disease, events;
     
     try {
-      // Use the new unified function for both disease and events extraction
-      [disease, events] = await Promise.all([
-        extractMedicalInfo(combinedNotes, 'disease', specialty),
-        extractMedicalInfo(combinedNotes, 'events', specialty, eventExtractionPrompts[specialty])
-      ]);
+      // Extract disease and events together in one structured call
+      ({ disease, events } = await extractDiseaseAndEvents(combinedNotes, specialty));
       
       console.log(`[EXTRACTION_DEBUG] ${specialty} extraction results:`, { disease, events });
     } catch (error) {
@@ -409,18 +412,20 @@ const handleSpecialtySelected = async (specialty) => {
               events: analysis.actionable_events,
               drugs_tested: analysis.drugs_tested,
               drug_results: analysis.drug_results,
-              point_breakdown: analysis.point_breakdown
+              point_breakdown: analysis.point_breakdown,
+              rank: data.data.progress?.article_number || 0
             };
             
             // Set current article being processed
             setCurrentArticleData(articleData);
             
-            // Add to both state and local variable
-            setArticles(current => [...current, articleData]);
-            processedArticles.push(articleData);
+            // Articles finish out of order; keep both state and local variable in retrieval rank order
+            setArticles(current => insertByRank(current, articleData));
+            processedArticles = insertByRank(processedArticles, articleData);
             console.log('Added article to processed articles. Current count:', processedArticles.length);
 
-            const articleNumber = data.data.progress?.article_number || 0;
+            // Articles are analyzed concurrently, so count completions rather than using the rank
+            const articleNumber = data.data.progress?.completed_articles || data.data.progress?.article_number || 0;
             const totalArticles = data.data.progress?.total_articles || 0;
             console.log('Progress:', { articleNumber, totalArticles, processedArticlesLength: processedArticles.length });
             
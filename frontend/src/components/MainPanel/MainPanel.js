@@ -85,8 +85,9 @@ const MainPanel = ({
     
     const unsubscribe = onSnapshot(q, (querySnapshot) => {
       const hasAnalysis = querySnapshot.docs.some(doc => {
-        const messages = doc.data().messages || [];
-        return messages.some(message => message.type === 'analysis');
+        const data = doc.data();
+        const messages = data.messages || [];
+        return data.hasAnalysis || messages.some(message => message.type === 'analysis');
       });
       setHasAnalysisMessage(hasAnalysis);
     });
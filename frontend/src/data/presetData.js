@@ -293,12 +293,6 @@ The patient's disease is: {disease}
 
 The patient's actionable events are: {events}
 
-Journal Impact Data (SJR scores):
-The following is a list of journal titles and their SJR scores. When extracting the journal title from the article, find the best matching title from this list and use its SJR score. If no match is found, use 0 as the SJR score.
-
-Journal Titles and Scores:
-{journal_context}
-
 <Article>
 {article_text}
 </Article>
@@ -347,8 +341,9 @@ Please analyze the article and provide a JSON response with the following struct
 {
   "article_metadata": {
     "title": "...",
-    "journal_title": "...",  // Extract the journal title from the article
-    "journal_sjr": 0,        // Look up the SJR score from the provided list. Use the score of the best matching journal title, or 0 if no match found
+    "journal_title": "...",  // Extract the full journal title from the article, exactly as printed
+    "journal_issn": "...",   // ISSN printed on the article, or "" if none
+    "journal_sjr": 0,        // Always 0; the SJR score is looked up after extraction
     "year": "...",
     "disease_focus": true/false,
     "pediatric_focus": true/false,
@@ -381,12 +376,6 @@ The patient's disease is: {disease}
 
 The patient's actionable events are: {events}
 
-Journal Impact Data (SJR scores):
-The following is a list of journal titles and their SJR scores. When extracting the journal title from the article, find the best matching title from this list and use its SJR score. If no match is found, use 0 as the SJR score.
-
-Journal Titles and Scores:
-{journal_context}
-
 <Article>
 {article_text}
 </Article>
@@ -432,8 +421,9 @@ Please analyze the article and provide a JSON response with the following struct
 {
   "article_metadata": {
     "title": "...",
-    "journal_title": "...",  // Extract the journal title from the article
-    "journal_sjr": 0,        // Look up the SJR score from the provided list. Use the score of the best matching journal title, or 0 if no match found
+    "journal_title": "...",  // Extract the full journal title from the article, exactly as printed
+    "journal_issn": "...",   // ISSN printed on the article, or "" if none
+    "journal_sjr": 0,        // Always 0; the SJR score is looked up after extraction
     "year": "...",
     "disease_focus": true/false,
     "type_of_disease": "...",
@@ -464,12 +454,6 @@ The patient's disease is: {disease}
 
 The patient's actionable features/events are: {events}
 
-Journal Impact Data (SJR scores):
-The following is a list of journal titles and their SJR scores. When extracting the journal title from the article, find the best matching title from this list and use its SJR score. If no match is found, use 0 as the SJR score.
-
-Journal Titles and Scores:
-{journal_context}
-
 <Article>
 {article_text}
 </Article>
@@ -496,7 +480,7 @@ Extract the following information and calculate points:
 
 1.  **Title:** The title of the paper. (0 Points)
 2.  **Journal Title:** Extract the journal title. (0 Points)
-3.  **Journal SJR:** Look up SJR score from the provided list (best match, 0 if none). (0 Points)
+3.  **Journal SJR:** Always 0; the SJR score is looked up after extraction. (0 Points)
 4.  **Year:** Publication year. (0 Points)
 5.  **Disease Focus:** Whether the article primarily relates to Parkinson's disease or related parkinsonism (Boolean, true or false). (0 Points, essential filter).
 6.  **Specific Disease Focus:** The specific condition discussed (e.g., "Idiopathic Parkinson's Disease", "LRRK2 Parkinson's", "Multiple System Atrophy", "Progressive Supranuclear Palsy"). (String).
@@ -551,12 +535,6 @@ The patient's disease is: {disease}
 
 The patient's actionable events are: {events}
 
-Journal Impact Data (SJR scores):
-The following is a list of journal titles and their SJR scores. When extracting the journal title from the article, find the best matching title from this list and use its SJR score. If no match is found, use 0 as the SJR score.
-
-Journal Titles and Scores:
-{journal_context}
-
 <Article>
 {article_text}
 </Article>
@@ -605,8 +583,9 @@ Please analyze the article and provide a JSON response with the following struct
 {
   "article_metadata": {
     "title": "...",
-    "journal_title": "...",  // Extract the journal title from the article
-    "journal_sjr": 0,        // Look up the SJR score from the provided list. Use the score of the best matching journal title, or 0 if no match found
+    "journal_title": "...",  // Extract the full journal title from the article, exactly as printed
+    "journal_issn": "...",   // ISSN printed on the article, or "" if none
+    "journal_sjr": 0,        // Always 0; the SJR score is looked up after extraction
     "year": "...",
     "disease_focus": true/false,
     "pediatric_focus": true/false,
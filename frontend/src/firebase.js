@@ -27,7 +27,9 @@ import {
   deleteDoc, 
   doc,
   getDoc,
-  onSnapshot
+  onSnapshot,
+  runTransaction,
+  writeBatch
 } from 'firebase/firestore';
 
 // Your Firebase configuration object
@@ -48,15 +50,61 @@ export const auth = getAuth(app);
 export const db = getFirestore(app);
 
 // Helper functions for chat operations
-// In firebase.js
+// Messages live in chats/{userId}/conversations/{chatId}/messages, one document per message,
+// ordered by a sequence number allocated on the conversation document. Contents larger than
+// INLINE_CONTENT_LIMIT are split into chunks under .../bodies so no document nears Firestore's 1 MiB limit.
+// That limit counts UTF-8 bytes, so chunks are sized in bytes: CJK or emoji text takes 3-4 bytes a character.
+const INLINE_CONTENT_LIMIT = 100000;
+const BODY_CHUNK_BYTES = 750000;
+
+// messageIds already written per chat, so callers can keep passing the full message list
+const persistedMessageIds = new Map();
+
+const chatPath = (userId, chatId) => `chats/${userId}/conversations/${chatId}`;
+const sequenceId = (seq) => String(seq).padStart(8, '0');
+
+const utf8Length = (codePoint) => (codePoint < 0x80 ? 1 : codePoint < 0x800 ? 2 : codePoint < 0x10000 ? 3 : 4);
+
+// Split text into pieces of at most BODY_CHUNK_BYTES of UTF-8, never inside a surrogate pair
+export const splitIntoBodyChunks = (text) => {
+  const chunks = [];
+  let start = 0;
+  let bytes = 0;
+  for (let i = 0; i < text.length;) {
+    const codePoint = text.codePointAt(i);
+    const size = utf8Length(codePoint);
+    if (bytes + size > BODY_CHUNK_BYTES) {
+      chunks.push(text.slice(start, i));
+      start = i;
+      bytes = 0;
+    }
+    bytes += size;
+    i += codePoint > 0xffff ? 2 : 1;
+  }
+  chunks.push(text.slice(start));
+  return chunks;
+};
+
+const getPersistedMessageIds = async (userId, chatId) => {
+  if (!persistedMessageIds.has(chatId)) {
+    const snapshot = await getDocs(collection(db, `${chatPath(userId, chatId)}/messages`));
+    persistedMessageIds.set(chatId, new Set(snapshot.docs.map(messageDoc => messageDoc.data().messageId)));
+  }
+  return persistedMessageIds.get(chatId);
+};
+
 export const createNewChat = async (userId, initialMessages) => {
   try {
     const chatRef = await addDoc(collection(db, `chats/${userId}/conversations`), {
       createdAt: new Date(),
       updatedAt: new Date(),
-      messages: initialMessages,
+      messageCount: 0,
       template: 'default'
     });
+    persistedMessageIds.set(chatRef.id, new Set());
+    if (initialMessages && initialMessages.length) {
+      await addMessageToChat(userId, chatRef.id, initialMessages);
+    }
     return chatRef.id;
   } catch (error) {
     console.error('Error creating new chat:', error);
@@ -66,11 +114,39 @@ export const createNewChat = async (userId, initialMessages) => {
 
 export const addMessageToChat = async (userId, chatId, message) => {
   try {
-    const chatRef = doc(db, `chats/${userId}/conversations/${chatId}`);
-    await updateDoc(chatRef, {
-      messages: [...message],  // Firestore will merge this with existing messages
-      updatedAt: new Date()
+    const persisted = await getPersistedMessageIds(userId, chatId);
+    const newMessages = message.filter(msg => !persisted.has(msg.messageId));
+    if (!newMessages.length) {
+      return;
+    }
+
+    const chatRef = doc(db, chatPath(userId, chatId));
+    await runTransaction(db, async (transaction) => {
+      const chatDoc = await transaction.get(chatRef);
+      let seq = chatDoc.exists() ? (chatDoc.data().messageCount || 0) : 0;
+      for (const msg of newMessages) {
+        const content = typeof msg.content === 'string' ? msg.content : JSON.stringify(msg.content ?? null);
+        const messageDoc = { ...msg, seq, contentIsJson: typeof msg.content !== 'string' };
+        if (content.length > INLINE_CONTENT_LIMIT) {
+          const chunks = splitIntoBodyChunks(content);
+          chunks.forEach((text, i) => {
+            transaction.set(doc(db, `${chatPath(userId, chatId)}/bodies/${sequenceId(seq)}-${i}`), { text });
+          });
+          delete messageDoc.content;
+          messageDoc.bodyChunks = chunks.length;
+        } else if (messageDoc.contentIsJson) {
+          messageDoc.content = msg.content ?? null;
+        }
+        transaction.set(doc(db, `${chatPath(userId, chatId)}/messages/${sequenceId(seq)}`), messageDoc);
+        seq += 1;
+      }
+      const summary = { messageCount: seq, updatedAt: new Date() };
+      if (newMessages.some(msg => msg.type === 'analysis')) {
+        summary.hasAnalysis = true;
+      }
+      transaction.set(chatRef, summary, { merge: true });
     });
+    newMessages.forEach(msg => persisted.add(msg.messageId));
   } catch (error) {
     console.error('Error adding message to chat:', error);
     throw error;
@@ -108,8 +184,17 @@ export const updateChatTitle = async (userId, chatId, newTitle) => {
 
 export const deleteChat = async (userId, chatId) => {
   try {
-    const chatRef = doc(db, `chats/${userId}/conversations/${chatId}`);
+    for (const subcollection of ['messages', 'bodies']) {
+      const snapshot = await getDocs(collection(db, `${chatPath(userId, chatId)}/${subcollection}`));
+      for (let i = 0; i < snapshot.docs.length; i += 500) {
+        const batch = writeBatch(db);
+        snapshot.docs.slice(i, i + 500).forEach(messageDoc => batch.delete(messageDoc.ref));
+        await batch.commit();
+      }
+    }
+    const chatRef = doc(db, chatPath(userId, chatId));
     await deleteDoc(chatRef);
+    persistedMessageIds.delete(chatId);
   } catch (error) {
     console.error('Error deleting chat:', error);
     throw error;
@@ -118,16 +203,32 @@ export const deleteChat = async (userId, chatId) => {
 
 export const getChatMessages = async (userId, chatId) => {
   try {
-    const chatRef = doc(db, `chats/${userId}/conversations/${chatId}`);
-    const chatDoc = await getDoc(chatRef);
-    
-    if (chatDoc.exists()) {
-      const chatData = chatDoc.data();
-      return chatData.messages || [];
-    } else {
-      console.error('Chat document does not exist');
-      return [];
+    const messagesRef = collection(db, `${chatPath(userId, chatId)}/messages`);
+    const snapshot = await getDocs(query(messagesRef, orderBy('seq')));
+
+    if (snapshot.empty) {
+      // Chats created before messages moved to a subcollection keep them in an array field
+      const chatDoc = await getDoc(doc(db, chatPath(userId, chatId)));
+      if (!chatDoc.exists()) {
+        console.error('Chat document does not exist');
+        return [];
+      }
+      return chatDoc.data().messages || [];
     }
+
+    const messages = await Promise.all(snapshot.docs.map(async (messageDoc) => {
+      const { seq, bodyChunks, contentIsJson, ...msg } = messageDoc.data();
+      if (bodyChunks) {
+        const chunks = await Promise.all(Array.from({ length: bodyChunks }, (_, i) =>
+          getDoc(doc(db, `${chatPath(userId, chatId)}/bodies/${sequenceId(seq)}-${i}`))
+        ));
+        const text = chunks.map(chunk => chunk.data().text).join('');
+        msg.content = contentIsJson ? JSON.parse(text) : text;
+      }
+      return msg;
+    }));
+    persistedMessageIds.set(chatId, new Set(messages.map(msg => msg.messageId)));
+    return messages;
   } catch (error) {
     console.error('Error getting chat messages:', error);
     throw error;
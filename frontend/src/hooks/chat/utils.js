@@ -12,8 +12,7 @@
 // See the License for the specific language governing permissions and
 // limitations under the License.
 
-import { doc, getDoc } from 'firebase/firestore';
-import { db } from '../../firebase';
+import { getChatMessages } from '../../firebase';
 
 export const getLatestMessages = async (userId, chatId) => {
   if (!userId || !chatId) {
@@ -21,12 +20,7 @@ export const getLatestMessages = async (userId, chatId) => {
     return [];
   }
   try {
-    const chatRef = doc(db, `chats/${userId}/conversations/${chatId}`);
-    const chatDoc = await getDoc(chatRef);
-    if (chatDoc.exists()) {
-      return chatDoc.data().messages || [];
-    }
-    return [];
+    return await getChatMessages(userId, chatId);
   } catch (error) {
     console.error('Error getting latest messages:', error);
     return [];
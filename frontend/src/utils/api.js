@@ -207,6 +207,51 @@ export const extractMedicalInfo = async (text, extractionType, specialty, prompt
   }
 };
 
+/**
+ * Extracts the disease and actionable events in a single structured call
+ * @param {string} text - The (redacted) case notes and lab results
+ * @param {string} specialty - The specialty whose extraction prompts to use
+ * @returns {Promise<{disease: string, events: string[], eventDetails: Object[]}>}
+ */
+export const extractDiseaseAndEvents = async (text, specialty) => {
+  try {
+    const { diseaseExtractionPrompts, eventExtractionPrompts } = await import('../data/presetData');
+    const diseasePrompt = diseaseExtractionPrompts[specialty];
+    const eventsPrompt = eventExtractionPrompts[specialty];
+    if (!diseasePrompt || !eventsPrompt) {
+      throw new Error(`No extraction prompts available for specialty: ${specialty}`);
+    }
+
+    const response = await fetch('https://extract-medical-info-934163632848.us-central1.run.app', {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({
+        text,
+        extraction_type: 'combined',
+        specialty,
+        disease_prompt_content: diseasePrompt,
+        events_prompt_content: eventsPrompt
+      }),
+    });
+
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
+    const data = await response.json();
+    return {
+      disease: data.result.disease.trim(),
+      events: data.result.events,
+      eventDetails: data.result.event_details || []
+    };
+  } catch (error) {
+    console.error(`Error extracting disease and events for ${specialty}:`, error);
+    throw error;
+  }
+};
+
 // Legacy API functions - maintained for backward compatibility
 export const extractDisease = async (text) => {
   return extractMedicalInfo(text, 'disease', 'oncology');